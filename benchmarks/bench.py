@@ -0,0 +1,432 @@
+"""
+Benchmarks for the proxy hot path.
+
+Each benchmark runs an operation repeatedly in a single event loop and reports
+throughput, latency percentiles and memory allocated per operation. Results are
+saved as JSON so that they can be compared between versions:
+
+    uv run python benchmarks/bench.py --output baseline.json
+    # ... make changes ...
+    uv run python benchmarks/bench.py --compare baseline.json
+
+The proxy benchmarks run requests through the complete ASGI app (middleware,
+routing, proxy handler and upstream client) against an in-process mock upstream,
+so no network is involved.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import AbstractAsyncContextManager, asynccontextmanager
+from datetime import UTC, datetime
+from fnmatch import fnmatch
+from functools import partial
+from io import BytesIO
+from pathlib import Path
+from typing import Any
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+
+import ibproxy.main as appmod
+import ibproxy.rate.limit as limitmod
+from ibproxy import rate
+from ibproxy.const import VERSION
+from ibproxy.journal import JournalEntry, JournalWriter
+from ibproxy.middleware.compress import CompressionMiddleware
+from ibproxy.middleware.request_id import RequestIdMiddleware
+from ibproxy.mock import MockAuth, MockUpstream, Profile, payload
+from ibproxy.rate import AdaptiveLimit, Client, Priority
+from ibproxy.rate.limit import LeakyBucket, Limit
+from ibproxy.util import percentile
+
+Operation = Callable[[], Awaitable[Any]]
+
+# Typical IBKR response sizes: order status, snapshot, positions and history.
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+BENCHMARKS: dict[str, Callable[[], AbstractAsyncContextManager[Operation]]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], AsyncIterator[Operation]]], Any]:
+    """
+    Register a benchmark. The decorated function yields the operation to time.
+    """
+
+    def register(function: Callable[[], AsyncIterator[Operation]]) -> Any:
+        BENCHMARKS[name] = asynccontextmanager(function)
+        return function
+
+    return register
+
+
+# HELPERS ======================================================================
+
+
+def _request(
+    path: str = "/v1/api/iserver/accounts", headers: list[tuple[bytes, bytes]] | None = None
+) -> dict[str, Any]:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"127.0.0.1:9000"), *(headers or [])],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 9000),
+    }
+
+
+async def _call(app: Any, scope: dict[str, Any]) -> None:
+    """
+    Call an ASGI app directly, discarding the response.
+    """
+
+    received = False
+    done = asyncio.Event()
+
+    async def receive() -> dict[str, Any]:
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Only reached when waiting for the client to disconnect.
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        if message["type"] == "http.response.body" and not message.get("more_body"):
+            done.set()
+
+    await app(scope, receive, send)
+
+
+@asynccontextmanager
+async def _proxy(
+    size: int, stream: bool = False, journal: bool = False, gzip: bool = False
+) -> AsyncIterator[Operation]:
+    mock = MockUpstream(profiles=[Profile(latency=0, size=size, gzip=gzip)])
+    gate = asyncio.Event()
+    gate.set()
+
+    state = appmod.app.state
+    state.gate = gate
+    state.auth = MockAuth()
+    state.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app()))
+    state.journal = None
+    # Measure the uncached path, including the upstream concurrency limit.
+    state.cache = None
+    state.coalescer = None
+    state.batcher = None
+    state.limiter = AdaptiveLimit()
+    # Only measure the cost of the limiter, not the waiting.
+    bucket, limitmod._bucket = limitmod._bucket, LeakyBucket(1e9, 1e9)
+    upstream, appmod.UPSTREAM = appmod.UPSTREAM, "http://mock/"
+    streaming, appmod.STREAM = appmod.STREAM, stream
+
+    with tempfile.TemporaryDirectory() as directory:
+        if journal:
+            state.journal = JournalWriter(Path(directory))
+            state.journal.start()
+
+        # Gzip compressed responses are requested by a client that accepts gzip.
+        scope = _request(headers=[(b"accept-encoding", b"gzip")] if gzip else None)
+        try:
+            yield lambda: _call(appmod.app, scope)
+        finally:
+            if journal:
+                await state.journal.stop()
+            await state.client.aclose()
+            limitmod._bucket = bucket
+            appmod.UPSTREAM = upstream
+            appmod.STREAM = streaming
+
+
+# PROXY ========================================================================
+
+
+for _label, _size in SIZES.items():
+    BENCHMARKS[f"proxy[{_label}]"] = partial(_proxy, _size)
+BENCHMARKS["proxy[10k,stream]"] = lambda: _proxy(SIZES["10k"], stream=True)
+BENCHMARKS["proxy[10k,journal]"] = lambda: _proxy(SIZES["10k"], journal=True)
+BENCHMARKS["proxy[100k,gzip]"] = lambda: _proxy(SIZES["100k"], gzip=True)
+
+
+# RATE =========================================================================
+
+
+@benchmark("bucket.acquire")
+async def _bucket() -> AsyncIterator[Operation]:
+    bucket = LeakyBucket(1e9, 1e9)
+    yield bucket.acquire
+
+
+@benchmark("bucket.slot")
+async def _slot() -> AsyncIterator[Operation]:
+    bucket = LeakyBucket(1e9, 1e9)
+    yield bucket.slot
+
+
+@benchmark("rate.enforce")
+async def _enforce() -> AsyncIterator[Operation]:
+    # Per-request cost of the rate limiter (endpoint and global buckets, client quota).
+    bucket, limitmod._bucket = limitmod._bucket, LeakyBucket(1e9, 1e9)
+    limits, limitmod._limits = limitmod._limits, [Limit.from_rule("/v1/api/iserver/account/orders", 1e9, 1e9, None)]
+    client = Client("bench", bucket=LeakyBucket(1e9, 1e9))
+    try:
+        yield lambda: limitmod.enforce_rate_limit("bench", "/v1/api/iserver/account/orders", Priority.NORMAL, client)
+    finally:
+        limitmod._bucket = bucket
+        limitmod._limits = limits
+
+
+@benchmark("rate.record")
+async def _record() -> AsyncIterator[Operation]:
+    yield lambda: rate.record("/v1/api/iserver/accounts")
+    rate.clear()
+
+
+@benchmark("rate.rate")
+async def _rate() -> AsyncIterator[Operation]:
+    # Populate the sliding window with a realistic mix of endpoints.
+    for i in range(10_000):
+        await rate.record(f"/v1/api/endpoint/{i % 200}")
+    yield rate.rate
+    rate.clear()
+
+
+# MIDDLEWARE ===================================================================
+
+
+def _endpoint(content: bytes) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/{path:path}")  # type: ignore[untyped-decorator, unused-ignore]
+    async def endpoint(path: str, request: Request) -> Response:
+        return Response(content=content, media_type="application/json")
+
+    return app
+
+
+@benchmark("middleware.none")
+async def _no_middleware() -> AsyncIterator[Operation]:
+    # Baseline for the middleware benchmarks.
+    app = _endpoint(payload(SIZES["1k"]))
+    scope = _request()
+    yield lambda: _call(app, scope)
+
+
+@benchmark("middleware.request_id")
+async def _request_id() -> AsyncIterator[Operation]:
+    app = _endpoint(payload(SIZES["1k"]))
+    app.add_middleware(RequestIdMiddleware)
+    scope = _request()
+    yield lambda: _call(app, scope)
+
+
+def _gzip(size: int) -> Callable[[], AbstractAsyncContextManager[Operation]]:
+    @asynccontextmanager
+    async def context() -> AsyncIterator[Operation]:
+        app = _endpoint(payload(size))
+        app.add_middleware(GZipMiddleware, minimum_size=100, compresslevel=5)
+        scope = _request(headers=[(b"accept-encoding", b"gzip")])
+        yield lambda: _call(app, scope)
+
+    return context
+
+
+def _compress(size: int) -> Callable[[], AbstractAsyncContextManager[Operation]]:
+    @asynccontextmanager
+    async def context() -> AsyncIterator[Operation]:
+        app = _endpoint(payload(size))
+        app.add_middleware(CompressionMiddleware)
+        scope = _request(headers=[(b"accept-encoding", b"gzip")])
+        yield lambda: _call(app, scope)
+
+    return context
+
+
+for _label, _size in SIZES.items():
+    BENCHMARKS[f"middleware.gzip[{_label}]"] = _gzip(_size)
+    BENCHMARKS[f"middleware.compress[{_label}]"] = _compress(_size)
+
+
+# JOURNAL ======================================================================
+
+
+def _entry(size: int) -> JournalEntry:
+    entry = JournalEntry(
+        {"id": "bench", "url": "http://mock/v1/api/iserver/accounts", "method": "GET", "params": {}, "body": None},
+        status_code=200,
+        content_type="application/json",
+        timestamp=datetime.now(UTC),
+    )
+    entry.write(payload(size))
+    entry.close(0.01)
+    return entry
+
+
+def _journal_entry(size: int) -> Callable[[], AbstractAsyncContextManager[Operation]]:
+    @asynccontextmanager
+    async def context() -> AsyncIterator[Operation]:
+        async def operation() -> None:
+            _entry(size).save(BytesIO())
+
+        yield operation
+
+    return context
+
+
+def _journal_writer(size: int) -> Callable[[], AbstractAsyncContextManager[Operation]]:
+    @asynccontextmanager
+    async def context() -> AsyncIterator[Operation]:
+        with tempfile.TemporaryDirectory() as directory:
+            writer = JournalWriter(Path(directory))
+            writer.start()
+            yield lambda: writer.submit(_entry(size))
+            await writer.stop()
+
+    return context
+
+
+for _label, _size in SIZES.items():
+    BENCHMARKS[f"journal.entry[{_label}]"] = _journal_entry(_size)
+BENCHMARKS["journal.writer[10k]"] = _journal_writer(SIZES["10k"])
+
+
+# RUNNER =======================================================================
+
+
+async def measure(context: Callable[[], AbstractAsyncContextManager[Operation]], number: int) -> dict[str, Any]:
+    """
+    Time an operation and measure the memory that it allocates.
+
+    Memory is measured in a separate pass because tracing slows everything down.
+    CPython doesn't expose a count of allocations, so the peak memory allocated
+    during each operation and the number of blocks retained afterwards are
+    reported instead.
+    """
+    async with context() as operation:
+        # Warm up caches, connection pools and lazily initialised state.
+        for _ in range(max(number // 10, 10)):
+            await operation()
+
+        gc.collect()
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(number):
+            start = time.perf_counter()
+            await operation()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+
+        samples = max(number // 10, 10)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            peak = 0
+            before = sys.getallocatedblocks()
+            for _ in range(samples):
+                current, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await operation()
+                peak += tracemalloc.get_traced_memory()[1] - current
+            retained = sys.getallocatedblocks() - before
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "number": number,
+        "ops": number / elapsed,
+        "latency": {
+            "mean": elapsed / number,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+        },
+        "memory": {
+            "peak": peak / samples,
+            "retained": retained / samples,
+        },
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any]) -> None:
+    print(f"Baseline: {baseline['version']} ({baseline['timestamp']})", file=sys.stderr)
+    print(f"{'':28} {'ops/s':>22} {'p50 (us)':>22} {'peak (kB)':>22}", file=sys.stderr)
+    for name, result in results.items():
+        if not (previous := baseline["results"].get(name)):
+            continue
+
+        def column(now: float, then: float) -> str:
+            change = f"{(now - then) / then:+.0%}" if then else ""
+            return f"{now:>14.1f} {change:>7}"
+
+        print(
+            f"{name:28}"
+            f" {column(result['ops'], previous['ops'])}"
+            f" {column(result['latency']['p50'] * 1e6, previous['latency']['p50'] * 1e6)}"
+            f" {column(result['memory']['peak'] / 1e3, previous['memory']['peak'] / 1e3)}",
+            file=sys.stderr,
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the proxy hot path.")
+    parser.add_argument("-n", "--number", type=int, default=1000, help="Operations per benchmark (default: 1000).")
+    parser.add_argument("-k", "--filter", default="*", help="Only run benchmarks matching this glob pattern.")
+    parser.add_argument("--list", action="store_true", help="List benchmarks and exit.")
+    parser.add_argument("--output", type=Path, help="Write results to this JSON file.")
+    parser.add_argument("--compare", type=Path, help="Compare against results in this JSON file.")
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if fnmatch(name, args.filter)]
+    if args.list:
+        print("\n".join(names))
+        return
+
+    # The proxy logs every request. Don't measure the cost of that.
+    logging.disable(logging.CRITICAL)
+
+    results = {}
+    for name in names:
+        results[name] = asyncio.run(measure(BENCHMARKS[name], args.number))
+        result = results[name]
+        print(
+            f"{name:28} {result['ops']:>10.1f} ops/s"
+            f"  p50 {result['latency']['p50'] * 1e6:>9.1f} us"
+            f"  p99 {result['latency']['p99'] * 1e6:>9.1f} us"
+            f"  peak {result['memory']['peak'] / 1e3:>8.1f} kB",
+            file=sys.stderr,
+        )
+
+    report = {
+        "version": VERSION,
+        "timestamp": datetime.now(UTC).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.compare:
+        compare(results, json.loads(args.compare.read_text()))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import httpx
+
+from .const import SNAPSHOT_BATCH_SIZE, SNAPSHOT_PATH
+from .models import BatchMetrics
+
+# Result of an upstream request: response, timestamp and duration.
+Result = tuple[httpx.Response, datetime, float]
+
+
+def _split(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+@dataclass
+class _Batch:
+    conids: set[str] = field(default_factory=set)
+    fields: set[str] = field(default_factory=set)
+    requests: int = 0
+    future: asyncio.Future[Result] = field(default_factory=lambda: asyncio.get_running_loop().create_future())
+
+    def params(self) -> dict[str, str]:
+        return {"conids": ",".join(sorted(self.conids)), "fields": ",".join(sorted(self.fields))}
+
+
+@dataclass
+class SnapshotBatcher:
+    """
+    Merge concurrent market data snapshot requests into a single upstream request.
+
+    The first request opens a batch and waits for the batch window. Requests that
+    arrive during the window add their conids and fields to the batch. The merged
+    request is then sent upstream (using a single rate limit token) and the JSON
+    array in the response is split back out to each request.
+    """
+
+    # Time (seconds) that a batch stays open.
+    window: float
+    # Maximum number of conids in a batch.
+    size: int = SNAPSHOT_BATCH_SIZE
+
+    def __post_init__(self) -> None:
+        self.pending: _Batch | None = None
+        self.requests = 0
+        self.batches = 0
+
+    @staticmethod
+    def match(method: str, path: str, params: dict[str, str]) -> tuple[list[str], list[str]] | None:
+        """
+        Get the conids and fields if a request can be batched.
+
+        Requests with other parameters aren't batched.
+        """
+        if method != "GET" or path != SNAPSHOT_PATH or set(params) != {"conids", "fields"}:
+            return None
+        conids, fields = _split(params["conids"]), _split(params["fields"])
+        if not conids or not fields:
+            return None
+        return conids, fields
+
+    async def run(
+        self,
+        conids: list[str],
+        fields: list[str],
+        send: Callable[[dict[str, str]], Awaitable[Result]],
+    ) -> Result:
+        """
+        Add a request to a batch and wait for its share of the merged response.
+
+        Args:
+            conids: Contract IDs.
+            fields: Field IDs.
+            send: Sends a request upstream with the given parameters.
+        """
+        self.requests += 1
+        batch = self.pending
+        if batch is None or len(batch.conids | set(conids)) > self.size:
+            # Open a new batch and send it once the window has elapsed.
+            batch = self.pending = _Batch()
+            batch.conids.update(conids)
+            batch.fields.update(fields)
+            batch.requests += 1
+            try:
+                await asyncio.sleep(self.window)
+            except asyncio.CancelledError:
+                # Requests that joined the batch send their own requests.
+                batch.future.cancel()
+                raise
+            finally:
+                if self.pending is batch:
+                    self.pending = None
+
+            params = batch.params()
+            logging.info(f"📦 Snapshot batch: {batch.requests} requests, {len(batch.conids)} conids.")
+            self.batches += 1
+            try:
+                result = await send(params)
+            except asyncio.CancelledError:
+                batch.future.cancel()
+                raise
+            except Exception as error:
+                batch.future.set_exception(error)
+                # Don't warn about an unretrieved exception if nobody else is waiting.
+                batch.future.exception()
+                raise
+            batch.future.set_result(result)
+        else:
+            batch.conids.update(conids)
+            batch.fields.update(fields)
+            batch.requests += 1
+            try:
+                # Shield so that this request disconnecting doesn't cancel the batch.
+                result = await asyncio.shield(batch.future)
+            except asyncio.CancelledError:
+                if not batch.future.cancelled():
+                    raise
+                # The request that opened the batch was cancelled. Send this one by itself.
+                self.batches += 1
+                return await send({"conids": ",".join(conids), "fields": ",".join(fields)})
+
+        return self.extract(result, conids, fields, batch.fields)
+
+    @staticmethod
+    def extract(result: Result, conids: list[str], fields: list[str], merged: set[str]) -> Result:
+        """
+        Extract the part of a merged response for a single request.
+
+        Only the requested conids (in the requested order) and fields are kept.
+        Error and unexpected responses are returned unchanged.
+        """
+        response, now, duration = result
+        if response.status_code != 200:
+            return result
+        try:
+            data = response.json()
+        except ValueError:
+            return result
+        if not isinstance(data, list):
+            return result
+
+        # Fields requested by other requests in the batch.
+        others = merged - set(fields)
+        items = {str(item.get("conid")): item for item in data if isinstance(item, dict)}
+        data = [{k: v for k, v in items[conid].items() if k not in others} for conid in conids if conid in items]
+
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in ("content-length", "content-encoding")}
+        response = httpx.Response(
+            response.status_code,
+            headers=headers,
+            content=json.dumps(data).encode("utf-8"),
+            request=response.request,
+        )
+        return response, now, duration
+
+    def metrics(self) -> BatchMetrics:
+        return BatchMetrics(
+            window=self.window,
+            requests=self.requests,
+            batches=self.batches,
+            pending=self.pending.requests if self.pending else 0,
+        )
@@ -0,0 +1,182 @@
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+
+from fastapi.responses import Response
+from starlette.background import BackgroundTask
+
+from .const import CACHE_RULES, CACHE_SIZE
+from .models import CacheMetrics
+from .util import request_key
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    # Glob pattern matched against the URL path.
+    pattern: str
+    # Time (seconds) that a response is fresh.
+    ttl: float
+    # Time (seconds) after expiry that a stale response can be returned while it's refreshed.
+    stale: float = 0.0
+
+
+@dataclass
+class CachedResponse:
+    content: bytes
+    status_code: int
+    headers: dict[str, str]
+    media_type: str | None
+    stored: float
+    rule: CacheRule
+
+    @property
+    def size(self) -> int:
+        return len(self.content) + sum(len(k) + len(v) for k, v in self.headers.items())
+
+    def age(self, now: float | None = None) -> float:
+        return (time.monotonic() if now is None else now) - self.stored
+
+    def fresh(self, now: float | None = None) -> bool:
+        return self.age(now) < self.rule.ttl
+
+    def usable(self, now: float | None = None) -> bool:
+        return self.age(now) < self.rule.ttl + self.rule.stale
+
+    def response(self, status: str, background: BackgroundTask | None = None) -> Response:
+        headers = {
+            **self.headers,
+            "content-length": str(len(self.content)),
+            "Age": str(int(self.age())),
+            "X-Cache": status,
+        }
+        return Response(
+            content=self.content,
+            status_code=self.status_code,
+            headers=headers,
+            media_type=self.media_type,
+            background=background,
+        )
+
+
+@dataclass
+class ResponseCache:
+    """
+    In-memory LRU cache for upstream responses.
+
+    Only GET requests to paths matching a rule are cached. The cache is bounded by
+    the total size (bytes) of the cached responses. Stale responses are served
+    while a single background refresh per key is in progress.
+    """
+
+    capacity: int = CACHE_SIZE
+    rules: list[CacheRule] = field(default_factory=lambda: [CacheRule(*rule) for rule in CACHE_RULES])
+
+    def __post_init__(self) -> None:
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.size = 0
+        self.refreshing: set[str] = set()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def rule(self, method: str, path: str) -> CacheRule | None:
+        if method != "GET":
+            return None
+        for rule in self.rules:
+            if fnmatch(path, rule.pattern):
+                return rule
+        return None
+
+    @staticmethod
+    def key(path: str, params: dict[str, str]) -> str:
+        """
+        Normalised cache key. Parameter order doesn't matter.
+        """
+        return request_key(path, params)
+
+    def get(self, key: str) -> CachedResponse | None:
+        """
+        Get a usable (fresh or stale) response.
+        """
+        cached = self.entries.get(key)
+        if cached is None or not cached.usable():
+            if cached is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        if cached.fresh():
+            self.hits += 1
+        else:
+            self.stale += 1
+        return cached
+
+    def put(
+        self,
+        key: str,
+        rule: CacheRule,
+        content: bytes,
+        status_code: int,
+        headers: dict[str, str],
+        media_type: str | None,
+    ) -> None:
+        if "no-store" in headers.get("cache-control", ""):
+            return
+        headers = {k: v for k, v in headers.items() if k.lower() not in ("content-length", "age", "x-cache")}
+        cached = CachedResponse(content, status_code, headers, media_type, time.monotonic(), rule)
+        if cached.size > self.capacity:
+            return
+
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = cached
+        self.size += cached.size
+
+        while self.size > self.capacity:
+            evicted, oldest = self.entries.popitem(last=False)
+            self.size -= oldest.size
+            self.evictions += 1
+            logging.debug(f"🗑️ Cache evict: {evicted}.")
+
+    async def revalidate(self, key: str, refresh: Callable[[], Awaitable[None]]) -> None:
+        """
+        Refresh a stale response (unless it's already being refreshed).
+
+        This is run as a background task after the stale response has been sent.
+        """
+        if key in self.refreshing:
+            return
+
+        self.refreshing.add(key)
+        self.refreshes += 1
+        try:
+            await refresh()
+        except Exception as error:
+            logging.warning(f"🚨 Cache refresh failed for {key}: {error}")
+        finally:
+            self.refreshing.discard(key)
+
+    def _remove(self, key: str) -> None:
+        self.size -= self.entries.pop(key).size
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+
+    def metrics(self) -> CacheMetrics:
+        return CacheMetrics(
+            entries=len(self.entries),
+            size=self.size,
+            capacity=self.capacity,
+            hits=self.hits,
+            stale=self.stale,
+            misses=self.misses,
+            evictions=self.evictions,
+            refreshes=self.refreshes,
+        )
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+from typing import Any, TypeVar
+
+from .const import COALESCE_RULES
+from .models import CoalesceMetrics
+from .util import request_key
+
+T = TypeVar("T")
+
+
+@dataclass
+class Coalescer:
+    """
+    Single-flight coalescing of identical concurrent requests.
+
+    The first request for a key (the leader) is sent upstream. Identical requests
+    that arrive while it's in flight (followers) wait for and share its result,
+    so they don't use rate limit tokens or upstream connections.
+
+    Only GET requests to paths matching one of the patterns are coalesced.
+    """
+
+    patterns: list[str] = field(default_factory=lambda: list(COALESCE_RULES))
+
+    def __post_init__(self) -> None:
+        self.inflight: dict[str, asyncio.Future[Any]] = {}
+        self.requests = 0
+        self.coalesced: Counter[str] = Counter()
+
+    def match(self, method: str, path: str) -> str | None:
+        """
+        Get the pattern matching a request (if it can be coalesced).
+        """
+        if method != "GET":
+            return None
+        for pattern in self.patterns:
+            if fnmatch(path, pattern):
+                return pattern
+        return None
+
+    @staticmethod
+    def key(method: str, path: str, params: dict[str, str]) -> str:
+        return f"{method} {request_key(path, params)}"
+
+    async def run(self, key: str, pattern: str, send: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """
+        Send a request or wait for an identical request that's already in flight.
+
+        Returns:
+            Tuple of (result, shared) where shared is True if the result came from
+            another request.
+        """
+        self.requests += 1
+        # Loop because if the leader is cancelled the first follower to resume takes over
+        # as leader and the remaining followers wait for it.
+        while (future := self.inflight.get(key)) is not None:
+            try:
+                # Shield so that a follower disconnecting doesn't cancel the leader.
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled. Send the request (unless another follower already is).
+                logging.debug(f"🔀 Coalesce leader cancelled: {key}.")
+            else:
+                self.coalesced[pattern] += 1
+                return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        try:
+            result = await send()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # Don't warn about an unretrieved exception if there are no followers.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    def metrics(self) -> CoalesceMetrics:
+        return CoalesceMetrics(
+            requests=self.requests,
+            coalesced=sum(self.coalesced.values()),
+            inflight=len(self.inflight),
+            routes=dict(self.coalesced),
+        )
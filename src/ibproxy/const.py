@@ -7,16 +7,188 @@ VERSION = "0.2.0"
 #
 API_HOST = "127.0.0.1"
 API_PORT = 9000
+# Port for local mock upstream (ibproxy-mock).
+MOCK_PORT = 9001
 
 HEADERS: dict[str, str] = {}
 
 JOURNAL_DIR = Path("./journal/")
+# Compression level (1-9) for journal records.
+JOURNAL_COMPRESSLEVEL: int = 5
+# Journal data (raw and compressed) held in memory per request before spilling to disk.
+JOURNAL_SPOOL_SIZE: int = 1024 * 1024
+# Size (bytes) of the chunks in which journal bodies are compressed.
+JOURNAL_CHUNK_SIZE: int = 64 * 1024
+# Start a new journal segment after this many seconds or bytes.
+JOURNAL_SEGMENT_INTERVAL: float = 60
+JOURNAL_SEGMENT_SIZE: int = 64 * 1024 * 1024
+# Journal records are written in batches of up to JOURNAL_BATCH_SIZE records. A
+# record waits at most JOURNAL_FLUSH_INTERVAL seconds before being written.
+JOURNAL_BATCH_SIZE: int = 100
+JOURNAL_FLUSH_INTERVAL: float = 1.0
+# Maximum number of journal records waiting to be written.
+JOURNAL_QUEUE_SIZE: int = 1000
+# What to do when the journal queue is full: "block", "drop-oldest", "drop-newest" or "sample".
+JOURNAL_OVERFLOW: str = "block"
+# When sampling, keep one in this many records.
+JOURNAL_SAMPLE_RATE: int = 10
+# SQLite index of journal records (in JOURNAL_DIR).
+JOURNAL_INDEX: bool = True
+JOURNAL_INDEX_FILE = "index.sqlite"
+
+# Responses cached in memory. Each rule is (path pattern, TTL, stale) where a response is fresh
+# for TTL seconds and then returned (while being refreshed in the background) for a further
+# stale seconds. Cache hits don't count towards the rate limit.
+CACHE_RULES: list[tuple[str, float, float]] = [
+    ("/v1/api/trsrv/stocks", 3600, 86400),
+    ("/v1/api/trsrv/futures", 3600, 86400),
+    ("/v1/api/trsrv/secdef", 3600, 86400),
+    ("/v1/api/iserver/secdef/search", 3600, 86400),
+    ("/v1/api/iserver/secdef/info", 3600, 86400),
+    ("/v1/api/iserver/contract/*/info", 3600, 86400),
+]
+# Maximum total size (bytes) of cached responses.
+CACHE_SIZE: int = 64 * 1024 * 1024
+
+# Identical concurrent GET requests to paths matching these patterns share a single
+# upstream request (and rate limit token). Coalesced responses are buffered, so they
+# aren't streamed or forwarded compressed. Endpoints with large responses (market
+# data history and position pages) are left out for that reason.
+COALESCE_RULES: list[str] = [
+    "/v1/api/iserver/accounts",
+    "/v1/api/portfolio/accounts",
+    "/v1/api/portfolio/subaccounts",
+    "/v1/api/portfolio/*/position/*",
+    "/v1/api/portfolio/*/summary",
+    "/v1/api/portfolio/*/ledger",
+    "/v1/api/portfolio/*/allocation",
+    "/v1/api/iserver/account/orders",
+    "/v1/api/iserver/account/trades",
+    "/v1/api/iserver/account/pnl/partitioned",
+    "/v1/api/trsrv/*",
+    "/v1/api/iserver/secdef/*",
+    "/v1/api/iserver/contract/*/info",
+]
+
+# Market data snapshot requests can be merged into batches (see --snapshot-batch).
+SNAPSHOT_PATH = "/v1/api/iserver/marketdata/snapshot"
+# Maximum number of conids in a batch.
+SNAPSHOT_BATCH_SIZE: int = 100
+
+# Response compression. Bodies smaller than COMPRESSION_MINIMUM_SIZE bytes aren't
+# compressed. Bodies of at least COMPRESSION_THREAD_SIZE bytes are compressed in a pool
+# of COMPRESSION_WORKERS threads rather than on the event loop.
+COMPRESSION_MINIMUM_SIZE: int = 100
+COMPRESSION_THREAD_SIZE: int = 64 * 1024
+COMPRESSION_WORKERS: int = 4
+# Encodings in order of preference. The br and zstd encodings are only used if the
+# brotli and zstandard packages are installed.
+COMPRESSION_ENCODINGS: list[str] = ["zstd", "br", "gzip"]
+# Compression level for each encoding by body size. Each tier is (maximum size, level).
+# The first tier that fits applies. The last tier is also used for streamed bodies.
+COMPRESSION_LEVELS: dict[str, list[tuple[int | None, int]]] = {
+    "gzip": [(64 * 1024, 1), (None, 5)],
+    "br": [(64 * 1024, 1), (None, 4)],
+    "zstd": [(64 * 1024, 1), (None, 3)],
+}
+
+# Idle upstream connections are kept open for UPSTREAM_KEEPALIVE seconds.
+UPSTREAM_KEEPALIVE: float = 60.0
+# Number of upstream connections opened at startup and after a reset (see --prewarm)
+# and the timeout (seconds) for opening each of them. Prewarm requests count against
+# the global rate limit, so at most PREWARM_MAXIMUM connections (well below
+# RATE_LIMIT_BURST) are opened.
+PREWARM_CONNECTIONS: int = 4
+PREWARM_MAXIMUM: int = 5
+PREWARM_TIMEOUT: float = 5.0
 
 DATETIME_FMT = "%Y-%m-%d %H:%M:%S"
 
 STATUS_URL = "https://www.interactivebrokers.com/en/software/systemStatus.php"
 
 RATE_LOG_INTERVAL: float = 10.0
+# Request rates are tracked in slots of RATE_RESOLUTION seconds covering the last
+# RATE_HISTORY seconds (the longest window that rates can be calculated over).
+RATE_RESOLUTION: float = 1.0
+RATE_HISTORY: float = 120.0
+# Time constant (seconds) for the exponentially weighted moving average rate.
+RATE_EWMA: float = 30.0
 
 RATE_LIMIT: float = 10
 RATE_LIMIT_BURST: float = 10
+
+# Endpoint limits, applied in addition to the global rate limit. Each rule is (path
+# pattern, rate, burst, concurrency) where rate is requests per second and
+# concurrency is the maximum number of requests in flight. The first matching rule
+# applies. Based on the documented IBKR pacing limits:
+#
+# https://www.interactivebrokers.com/campus/ibkr-api-page/web-api-trading/#pacing-limitations-8
+#
+RATE_RULES: list[tuple[str, float | None, float | None, int | None]] = [
+    ("/v1/api/iserver/marketdata/snapshot", 10, 10, None),
+    ("/v1/api/iserver/marketdata/history", None, None, 5),
+    ("/v1/api/iserver/account/orders", 1 / 5, 1, None),
+    ("/v1/api/iserver/account/pnl/partitioned", 1 / 5, 1, None),
+    ("/v1/api/iserver/account/trades", 1 / 5, 1, None),
+    ("/v1/api/iserver/trades", 1 / 5, 1, None),
+    ("/v1/api/iserver/scanner/params", 1 / 900, 1, None),
+    ("/v1/api/iserver/scanner/run", 1, 1, None),
+    ("/v1/api/portfolio/accounts", 1 / 5, 1, None),
+    ("/v1/api/portfolio/subaccounts", 1 / 5, 1, None),
+    ("/v1/api/pa/*", 1 / 900, 1, None),
+    ("/v1/api/sso/validate", 1 / 60, 1, None),
+    ("/v1/api/tickle", 1, 1, None),
+    ("/v1/api/fyi/*", 1, 1, None),
+]
+
+# Adaptive rate limits. When upstream throttles requests (429) the rate of the
+# endpoint bucket (or the global bucket) is cut by RATE_DECREASE, at most once per
+# RATE_COOLDOWN seconds, but not below RATE_FLOOR times the configured rate. Each
+# successful response adds RATE_INCREASE times the configured rate, up to the
+# configured rate.
+RATE_DECREASE = 0.5
+RATE_INCREASE = 0.01
+RATE_FLOOR = 0.1
+RATE_COOLDOWN = 1.0
+
+# Adaptive limit on concurrent upstream requests: initial, minimum and maximum
+# limit. The maximum matches the connection pool size.
+CONCURRENCY_INITIAL = 20
+CONCURRENCY_MIN = 4
+CONCURRENCY_MAX = 200
+# Ratio of recent to long term upstream latency tolerated before the limit shrinks.
+CONCURRENCY_TOLERANCE = 1.5
+# Weight of each new limit estimate.
+CONCURRENCY_SMOOTHING = 0.2
+# Number of requests in the long term latency average.
+CONCURRENCY_WINDOW = 100
+
+# Priority classes ("high", "normal" or "low") for rate limit slots. Requests can
+# set their priority with the PRIORITY_HEADER header. Otherwise the first matching
+# rule applies (default: "normal").
+PRIORITY_HEADER = "X-Priority"
+PRIORITY_RULES: list[tuple[str, str]] = [
+    ("/v1/api/iserver/account/*/orders", "high"),
+    ("/v1/api/iserver/account/*/order/*", "high"),
+    ("/v1/api/iserver/account/*/orders/whatif", "high"),
+    ("/v1/api/iserver/reply/*", "high"),
+    ("/v1/api/iserver/marketdata/*", "low"),
+    ("/v1/api/iserver/scanner/*", "low"),
+    ("/v1/api/hmds/*", "low"),
+]
+# Minimum share of recent rate limit slots for lower priority classes while they
+# have requests waiting, so that they aren't starved by higher priority traffic.
+PRIORITY_SHARES: dict[str, float] = {"normal": 0.2, "low": 0.1}
+# Number of recent slots used to calculate shares.
+PRIORITY_WINDOW: int = 50
+
+# Clients are identified by the CLIENT_HEADER header, then by the CLIENT_KEY_HEADER
+# header (API key) and finally by source address.
+CLIENT_HEADER = "X-Client-ID"
+CLIENT_KEY_HEADER = "X-API-Key"
+# Client rules: (client name pattern, weight, rate, burst). Weight is the share of
+# rate limit slots when clients are competing. Rate and burst are an optional quota
+# (requests per second). First matching rule applies.
+CLIENT_RULES: list[tuple[str, float, float | None, float | None]] = [
+    ("*", 1.0, None, None),
+]
@@ -0,0 +1,18 @@
+from .entry import JournalEntry
+from .index import IndexRecord, JournalIndex
+from .reader import iter_journal, iter_records, read_record, segments
+from .segment import SegmentWriter
+from .writer import JournalWriter, Overflow
+
+__all__ = [
+    "IndexRecord",
+    "iter_journal",
+    "iter_records",
+    "JournalEntry",
+    "JournalIndex",
+    "JournalWriter",
+    "Overflow",
+    "read_record",
+    "segments",
+    "SegmentWriter",
+]
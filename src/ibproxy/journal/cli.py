@@ -0,0 +1,109 @@
+import argparse
+import json
+import re
+import sys
+from datetime import UTC, datetime
+from pathlib import Path
+
+from ..const import JOURNAL_DIR, JOURNAL_INDEX_FILE
+from .index import IndexRecord, JournalIndex
+
+
+def status_range(value: str) -> tuple[int, int]:
+    """
+    Parse a status code (for example "404") or class (for example "5xx").
+    """
+    if match := re.fullmatch(r"([1-5])xx", value.lower()):
+        low = int(match.group(1)) * 100
+        return low, low + 99
+    try:
+        return int(value), int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid status: {value}.")
+
+
+def timestamp(value: str) -> datetime:
+    """
+    Parse an ISO date or datetime. Naive values are taken to be UTC.
+    """
+    try:
+        result = datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid timestamp: {value}.")
+    return result if result.tzinfo else result.replace(tzinfo=UTC)
+
+
+def format(record: IndexRecord) -> str:
+    when = (
+        datetime.fromtimestamp(record.timestamp, tz=UTC).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        if record.timestamp
+        else "-" * 23
+    )
+    duration = f"{record.duration:7.3f}" if record.duration is not None else "-------"
+    return (
+        f"{when} {record.id:>8} {record.method:<6} {record.status_code} {duration} s {record.size:>9} B {record.path}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query the ibproxy request/response journal.")
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=JOURNAL_DIR,
+        help=f"Journal directory (default: {JOURNAL_DIR}).",
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Rebuild the index from the journal segments before querying.",
+    )
+    parser.add_argument("--id", help="Request ID.")
+    parser.add_argument("--method", help="HTTP method (for example POST).")
+    parser.add_argument(
+        "--path",
+        help="URL path. Supports glob wildcards (for example '/v1/api/iserver/account/*/orders').",
+    )
+    parser.add_argument(
+        "--status",
+        type=status_range,
+        help="Upstream status code (for example 404) or class (for example 5xx).",
+    )
+    parser.add_argument("--since", type=timestamp, help="Earliest time (ISO format, UTC unless specified).")
+    parser.add_argument("--until", type=timestamp, help="Latest time (ISO format, UTC unless specified).")
+    parser.add_argument("--min-duration", type=float, help="Minimum duration (seconds).")
+    parser.add_argument("--limit", type=int, help="Maximum number of records.")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Print full records (one JSON document per line) rather than a summary.",
+    )
+    args = parser.parse_args()
+
+    if not args.reindex and not (args.journal / JOURNAL_INDEX_FILE).exists():
+        sys.exit(f"No index in {args.journal}. Use --reindex to build it.")
+
+    index = JournalIndex(args.journal)
+    try:
+        if args.reindex:
+            count = index.rebuild()
+            print(f"Indexed {count} records.", file=sys.stderr)
+
+        records = index.query(
+            id=args.id,
+            method=args.method,
+            path=args.path,
+            status=args.status,
+            since=args.since,
+            until=args.until,
+            duration=args.min_duration,
+            limit=args.limit,
+        )
+        for record in records:
+            print(json.dumps(index.read(record)) if args.full else format(record))
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,150 @@
+import gzip
+import json
+import logging
+import shutil
+import zlib
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO
+
+from ..const import JOURNAL_CHUNK_SIZE, JOURNAL_COMPRESSLEVEL, JOURNAL_SPOOL_SIZE
+
+
+class JournalEntry:
+    """
+    Compressed journal record for a single request/response.
+
+    The response body is fed in as raw chunks while it's being forwarded to the
+    client. The chunks are spooled without compression (so the event loop isn't
+    blocked) and compressed when the entry is closed, which happens on the
+    journal thread (see JournalWriter.complete()). The body is never parsed.
+
+    A record is stored as two consecutive gzip members:
+
+    1. a JSON header with the request details, response status, body size and
+       the compressed length of the body member; and
+    2. the raw response body.
+
+    Since the header records the length of the body member, a reader can skip
+    over bodies without decompressing them.
+
+    Bodies that are forwarded with their upstream content encoding are journaled
+    without decoding them. A gzip body is already a gzip member, so it's stored
+    as it is. Other encodings are wrapped in an uncompressed gzip member. They
+    are only decoded when the record is read.
+    """
+
+    def __init__(
+        self,
+        request: dict[str, Any],
+        status_code: int,
+        content_type: str | None,
+        encoding: str | None = None,
+        timestamp: datetime | None = None,
+        content_encoding: str | None = None,
+    ):
+        """
+        Initialize the journal entry.
+
+        Args:
+            request: Details of the upstream request (id, url, method, headers, params and body).
+            status_code: Upstream response status code.
+            content_type: Upstream response content type.
+            encoding: Character encoding for non-JSON response bodies.
+            timestamp: When the request was sent upstream.
+            content_encoding: Content encoding of the body chunks (None if they have been decoded).
+        """
+        if not content_type:
+            logging.warning("🚨 No content type in response!")
+
+        self.request = request
+        self.status_code = status_code
+        self.content_type = content_type
+        self.encoding = encoding
+        self.timestamp = timestamp
+        self.content_encoding = content_encoding
+        self.duration: float | None = None
+        self.phases: dict[str, float] | None = None
+
+        # Encoded bodies are already compressed, so they aren't compressed again.
+        self.compressor = (
+            None
+            if content_encoding == "gzip"
+            else zlib.compressobj(0 if content_encoding else JOURNAL_COMPRESSLEVEL, wbits=31)
+        )
+        # Compressed data is held in memory up to JOURNAL_SPOOL_SIZE, then spilled to disk.
+        self.buffer = SpooledTemporaryFile(max_size=JOURNAL_SPOOL_SIZE)
+        # Raw chunks waiting to be compressed (spooled in the same way).
+        self.raw = SpooledTemporaryFile(max_size=JOURNAL_SPOOL_SIZE) if self.compressor is not None else None
+        # Size of the body (as received) before and after compression.
+        self.size = 0
+        self.stored = 0
+
+    @property
+    def id(self) -> str:
+        return str(self.request["id"])
+
+    def write(self, chunk: bytes) -> None:
+        """
+        Add a chunk of the response body.
+        """
+        self.size += len(chunk)
+        (self.buffer if self.raw is None else self.raw).write(chunk)
+
+    def close(self, duration: float, phases: dict[str, float] | None = None) -> None:
+        """
+        Finish the record, compressing the body.
+
+        This is a blocking function so it should be run in a separate thread.
+
+        Args:
+            duration: Duration (seconds) of the upstream request.
+            phases: Duration (seconds) of each phase of the upstream request.
+        """
+        self.duration = duration
+        self.phases = phases
+        if self.compressor is not None and self.raw is not None:
+            self.raw.seek(0)
+            while chunk := self.raw.read(JOURNAL_CHUNK_SIZE):
+                self.buffer.write(self.compressor.compress(chunk))
+            self.buffer.write(self.compressor.flush())
+            self.raw.close()
+            self.raw = None
+        self.stored = self.buffer.tell()
+
+    def header(self) -> dict[str, Any]:
+        return {
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "request": self.request,
+            "response": {
+                "status_code": self.status_code,
+                "content_type": self.content_type,
+                "encoding": self.encoding,
+                "content_encoding": self.content_encoding,
+                "size": self.size,
+                "stored": self.stored,
+            },
+            "duration": self.duration,
+            "phases": self.phases,
+        }
+
+    def save(self, file: BinaryIO) -> int:
+        """
+        Append the compressed record to a file.
+
+        This is a blocking function so it needs to be run in a separate thread.
+
+        Returns:
+            The number of bytes written.
+        """
+        header = gzip.compress(json.dumps(self.header()).encode("utf-8"), compresslevel=JOURNAL_COMPRESSLEVEL)
+        file.write(header)
+        self.buffer.seek(0)
+        shutil.copyfileobj(self.buffer, file)
+        self.buffer.close()
+        return len(header) + self.stored
+
+    def discard(self) -> None:
+        if self.raw is not None:
+            self.raw.close()
+        self.buffer.close()
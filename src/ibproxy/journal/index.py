@@ -0,0 +1,184 @@
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+from ..const import JOURNAL_INDEX_FILE
+from .entry import JournalEntry
+from .reader import iter_records, read_record, segments
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id TEXT NOT NULL,
+    timestamp REAL,
+    method TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    duration REAL,
+    size INTEGER NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    PRIMARY KEY (segment, offset)
+);
+CREATE INDEX IF NOT EXISTS records_timestamp ON records (timestamp);
+CREATE INDEX IF NOT EXISTS records_path ON records (path, timestamp);
+CREATE INDEX IF NOT EXISTS records_status_code ON records (status_code, timestamp);
+CREATE INDEX IF NOT EXISTS records_id ON records (id);
+"""
+
+
+@dataclass
+class IndexRecord:
+    id: str
+    timestamp: float | None
+    method: str
+    path: str
+    status_code: int
+    duration: float | None
+    size: int
+    segment: str
+    offset: int
+
+
+class JournalIndex:
+    """
+    SQLite index over journal records.
+
+    Stores the key fields of each record along with the location of the record
+    (segment and byte offset). Queries run against the index and full records
+    are only read from the segments for the matches.
+
+    The connection isn't bound to a thread, but it should only be used from
+    one thread at a time.
+    """
+
+    def __init__(self, directory: Path):
+        """
+        Open (or create) the index for a journal.
+
+        Args:
+            directory: Root directory for the journal.
+        """
+        self.directory = directory
+        directory.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(directory / JOURNAL_INDEX_FILE, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def add(self, record: dict[str, Any] | JournalEntry, segment: Path, offset: int) -> None:
+        """
+        Add a record to the index. Changes are only saved by commit().
+
+        Args:
+            record: Journal entry or record header.
+            segment: Path to journal segment.
+            offset: Byte offset of the record within the segment.
+        """
+        header = record.header() if isinstance(record, JournalEntry) else record
+        timestamp = header["timestamp"]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                header["request"]["id"],
+                datetime.fromisoformat(timestamp).timestamp() if timestamp else None,
+                header["request"]["method"],
+                urlsplit(header["request"]["url"]).path,
+                header["response"]["status_code"],
+                header["duration"],
+                header["response"]["size"],
+                str(segment.relative_to(self.directory)),
+                offset,
+            ),
+        )
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def rebuild(self) -> int:
+        """
+        Rebuild the index from the journal segments.
+
+        Response bodies are skipped without being decompressed.
+
+        Returns:
+            The number of records indexed.
+        """
+        self.connection.execute("DELETE FROM records")
+        count = 0
+        for path in segments(self.directory):
+            for offset, record in iter_records(path, data=False):
+                self.add(record, path, offset)
+                count += 1
+        self.commit()
+        return count
+
+    def query(
+        self,
+        id: str | None = None,
+        method: str | None = None,
+        path: str | None = None,
+        status: tuple[int, int] | None = None,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        duration: float | None = None,
+        limit: int | None = None,
+    ) -> list[IndexRecord]:
+        """
+        Find matching records.
+
+        Args:
+            id: Request ID.
+            method: HTTP method.
+            path: URL path. May include glob wildcards (for example "/v1/api/iserver/account/*/orders").
+            status: Range (inclusive) of status codes.
+            since: Earliest timestamp.
+            until: Latest timestamp.
+            duration: Minimum duration (seconds).
+            limit: Maximum number of records.
+
+        Returns:
+            Matching records in chronological order.
+        """
+        conditions = []
+        params: list[Any] = []
+        if id is not None:
+            conditions.append("id = ?")
+            params.append(id)
+        if method is not None:
+            conditions.append("method = ?")
+            params.append(method.upper())
+        if path is not None:
+            conditions.append("path GLOB ?")
+            params.append(path)
+        if status is not None:
+            conditions.append("status_code BETWEEN ? AND ?")
+            params.extend(status)
+        if since is not None:
+            conditions.append("timestamp >= ?")
+            params.append(since.timestamp())
+        if until is not None:
+            conditions.append("timestamp < ?")
+            params.append(until.timestamp())
+        if duration is not None:
+            conditions.append("duration >= ?")
+            params.append(duration)
+
+        sql = "SELECT * FROM records"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY timestamp, segment, offset"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return [IndexRecord(*row) for row in self.connection.execute(sql, params)]
+
+    def read(self, record: IndexRecord) -> dict[str, Any]:
+        """
+        Read the full journal record for an index entry.
+        """
+        return read_record(self.directory / record.segment, record.offset)
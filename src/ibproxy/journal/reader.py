@@ -0,0 +1,162 @@
+import gzip
+import json
+import re
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, BinaryIO
+
+CHUNK_SIZE = 64 * 1024
+
+# Segment names: interval start and sequence number within the interval.
+SEGMENT_NAME = re.compile(r"(\d{8}-\d{6})(?:-(\d+))?\.json\.gz")
+
+
+def _member(file: BinaryIO) -> bytes | None:
+    """
+    Decompress a single gzip member starting at the current file position.
+
+    The file is left positioned at the start of the next member.
+
+    Returns:
+        The decompressed data or None at the end of the file.
+    """
+    decompressor = zlib.decompressobj(wbits=31)
+    data: list[bytes] = []
+    while not decompressor.eof:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            if data:
+                raise EOFError("Truncated journal record.")
+            return None
+        data.append(decompressor.decompress(chunk))
+    # Rewind to the end of the member.
+    file.seek(-len(decompressor.unused_data), 1)
+    return b"".join(data)
+
+
+def decompress(body: bytes, encoding: str | None) -> bytes:
+    """
+    Undo an HTTP content encoding.
+    """
+    if encoding in (None, "identity"):
+        return body
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        # Usually zlib wrapped, but some servers send raw deflate data.
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    if encoding == "br":
+        import brotli
+
+        return bytes(brotli.decompress(body))
+    if encoding == "zstd":
+        import zstandard
+
+        return bytes(zstandard.ZstdDecompressor().decompressobj().decompress(body))
+    raise ValueError(f"Unsupported content encoding: {encoding}.")
+
+
+def _body(file: BinaryIO, header: dict[str, Any]) -> bytes:
+    """
+    Read and decompress the body member of a record.
+    """
+    stored = header["response"]["stored"]
+    data = file.read(stored)
+    if len(data) < stored:
+        raise EOFError("Truncated journal record.")
+    # Bodies journaled with gzip encoding are the upstream data, which can have
+    # several gzip members.
+    body = gzip.decompress(data) if data else b""
+    if (encoding := header["response"].get("content_encoding")) != "gzip":
+        body = decompress(body, encoding)
+    return body
+
+
+def decode(header: dict[str, Any], body: bytes) -> Any:
+    """
+    Decode a response body. JSON bodies are parsed, others are returned as text.
+    """
+    content_type = header["response"]["content_type"]
+    if content_type and content_type.startswith("application/json"):
+        return json.loads(body) if body else None
+    return body.decode(header["response"]["encoding"] or "utf-8", errors="replace")
+
+
+def read(file: BinaryIO, data: bool = True) -> dict[str, Any] | None:
+    """
+    Read the record at the current file position.
+
+    Args:
+        file: Journal segment opened in binary mode.
+        data: Whether to decompress and decode the response body. If False, the
+              body is skipped without being decompressed.
+
+    Returns:
+        The record or None at the end of the file.
+    """
+    if (header := _member(file)) is None:
+        return None
+
+    record: dict[str, Any] = json.loads(header)
+    if data:
+        record["response"]["data"] = decode(record, _body(file, record))
+    else:
+        file.seek(record["response"]["stored"], 1)
+    return record
+
+
+def read_record(path: Path, offset: int) -> dict[str, Any]:
+    """
+    Read a single record from a journal segment.
+
+    Args:
+        path: Path to journal segment.
+        offset: Byte offset of the record within the segment.
+    """
+    with open(path, "rb") as file:
+        file.seek(offset)
+        if (record := read(file)) is None:
+            raise EOFError(f"No journal record at {path}:{offset}.")
+        return record
+
+
+def iter_records(path: Path, data: bool = True) -> Iterator[tuple[int, dict[str, Any]]]:
+    """
+    Iterate over the records in a journal segment.
+
+    Yields:
+        Tuple of (offset, record).
+    """
+    with open(path, "rb") as file:
+        while True:
+            offset = file.tell()
+            if (record := read(file, data)) is None:
+                return
+            yield offset, record
+
+
+def segments(directory: Path) -> list[Path]:
+    """
+    List journal segments in chronological order.
+    """
+    return sorted(directory.glob("*/*.json.gz"), key=_segment_order)
+
+
+def _segment_order(path: Path) -> tuple[str, str, int]:
+    # Sequence numbers are compared as numbers (they can have more than two digits).
+    if match := SEGMENT_NAME.fullmatch(path.name):
+        return path.parent.name, match.group(1), int(match.group(2) or 0)
+    return path.parent.name, path.name, 0
+
+
+def iter_journal(directory: Path, data: bool = True) -> Iterator[dict[str, Any]]:
+    """
+    Iterate over all records in a journal in chronological order.
+    """
+    for path in segments(directory):
+        for _, record in iter_records(path, data):
+            yield record
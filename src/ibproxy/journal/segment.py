@@ -0,0 +1,93 @@
+import logging
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import BinaryIO
+
+from ..const import JOURNAL_SEGMENT_INTERVAL, JOURNAL_SEGMENT_SIZE
+from .entry import JournalEntry
+
+
+class SegmentWriter:
+    """
+    Append journal records to rolling segment files.
+
+    Segments are named for the start of their interval and a sequence number
+    (for example 20250822/20250822-123400-00.json.gz for one minute segments).
+    A new segment is started when the interval elapses or the segment exceeds
+    its maximum size (the next segment in the same interval has the next
+    sequence number).
+
+    Each record is a sequence of complete gzip members, so a segment can be read
+    with any gzip tool and a record can be decompressed starting from its offset.
+
+    This is not thread-safe. It should only be used by a single writer.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        interval: float = JOURNAL_SEGMENT_INTERVAL,
+        size: int = JOURNAL_SEGMENT_SIZE,
+    ):
+        """
+        Initialize the segment writer.
+
+        Args:
+            directory: Root directory for the journal.
+            interval: Maximum duration (seconds) covered by a segment.
+            size: Maximum size (bytes) of a segment.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.size = size
+
+        self.path: Path | None = None
+        self.file: BinaryIO | None = None
+        self.expires: float = 0
+        self.sequence = 0
+
+    def _roll(self, now: float) -> None:
+        self.close()
+
+        if now >= self.expires:
+            start = now - now % self.interval
+            self.expires = start + self.interval
+            self.sequence = 0
+        name = datetime.fromtimestamp(self.expires - self.interval, tz=UTC).strftime("%Y%m%d/%Y%m%d-%H%M%S")
+        # Segments are append-only, so it's safe to reopen an existing segment (for example
+        # after a restart) unless it's full.
+        while True:
+            self.path = self.directory / f"{name}-{self.sequence:02d}.json.gz"
+            if not self.path.exists() or self.path.stat().st_size < self.size:
+                break
+            self.sequence += 1
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        logging.debug(f"💾 Journal segment: {self.path}.")
+        self.file = open(self.path, "ab")
+
+    def write(self, entry: JournalEntry) -> tuple[Path, int]:
+        """
+        Append a record to the current segment.
+
+        Returns:
+            Tuple of (segment, offset) giving the location of the record.
+        """
+        now = time.time()
+        if self.file is None or now >= self.expires or self.file.tell() >= self.size:
+            self._roll(now)
+        assert self.file is not None and self.path is not None
+
+        offset = self.file.tell()
+        entry.save(self.file)
+
+        return self.path, offset
+
+    def flush(self) -> None:
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
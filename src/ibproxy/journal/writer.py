@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+
+from ..const import (
+    JOURNAL_BATCH_SIZE,
+    JOURNAL_FLUSH_INTERVAL,
+    JOURNAL_INDEX,
+    JOURNAL_OVERFLOW,
+    JOURNAL_QUEUE_SIZE,
+    JOURNAL_SAMPLE_RATE,
+)
+from ..models import JournalMetrics
+from .entry import JournalEntry
+from .index import JournalIndex
+from .segment import SegmentWriter
+
+
+class Overflow(str, Enum):
+    """
+    What to do with new entries when the journal queue is full.
+    """
+
+    BLOCK = "block"  # Wait for space in the queue.
+    DROP_OLDEST = "drop-oldest"  # Discard the oldest queued entry.
+    DROP_NEWEST = "drop-newest"  # Discard the new entry.
+    SAMPLE = "sample"  # Only keep one in JOURNAL_SAMPLE_RATE entries once the queue is half full.
+
+
+class JournalWriter:
+    """
+    Background journal writer.
+
+    Completed journal entries are submitted to a bounded queue. A single
+    background task takes entries off the queue in batches and appends them to
+    rolling segment files, flushing once per batch.
+
+    Disk I/O runs on a dedicated thread, so it doesn't compete with other work
+    in the default executor. When the queue is full, the overflow policy decides
+    whether new entries wait or are dropped.
+
+    Optionally each record is also added to a SQLite index, which is committed
+    once per batch.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        queue_size: int = JOURNAL_QUEUE_SIZE,
+        batch_size: int = JOURNAL_BATCH_SIZE,
+        flush_interval: float = JOURNAL_FLUSH_INTERVAL,
+        overflow: Overflow = Overflow(JOURNAL_OVERFLOW),
+        sample_rate: int = JOURNAL_SAMPLE_RATE,
+        index: bool = JOURNAL_INDEX,
+    ):
+        """
+        Initialize the journal writer.
+
+        Args:
+            directory: Root directory for the journal.
+            queue_size: Maximum number of entries waiting to be written.
+            batch_size: Maximum number of entries written per batch.
+            flush_interval: Maximum time (seconds) that an entry waits before being written.
+            overflow: Policy applied when the queue is full.
+            sample_rate: Keep one in this many entries when sampling.
+            index: Whether to maintain a SQLite index of records.
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.sample_rate = sample_rate
+
+        self.queue: asyncio.Queue[JournalEntry | None] = asyncio.Queue(maxsize=queue_size)
+        self.segments = SegmentWriter(directory)
+        self.index = JournalIndex(directory) if index else None
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+        self.task: asyncio.Task[None] | None = None
+
+        # Counters.
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.sampled = 0
+        # Batch write latency (seconds).
+        self.batches = 0
+        self.latency_last = 0.0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def start(self) -> None:
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Write any outstanding entries and close the current segment.
+        """
+        if self.task is not None:
+            # Sentinel tells the background task to finish after the current batch.
+            await self.queue.put(None)
+            await self.task
+            self.task = None
+
+        batch = []
+        while not self.queue.empty():
+            if (entry := self.queue.get_nowait()) is not None:
+                batch.append(entry)
+        self._write(batch)
+        self.segments.close()
+        if self.index is not None:
+            self.index.close()
+        self.executor.shutdown()
+
+    async def complete(self, entry: JournalEntry, duration: float, phases: dict[str, float] | None = None) -> None:
+        """
+        Close an entry and queue it for writing.
+
+        The body is compressed on the journal thread, so it doesn't block the event loop.
+        """
+        await asyncio.get_running_loop().run_in_executor(self.executor, entry.close, duration, phases)
+        await self.submit(entry)
+
+    def _drop(self, entry: JournalEntry) -> None:
+        logging.warning(f"🚨 [{entry.id}] Journal queue full ({self.overflow.value}): drop entry.")
+        self.dropped += 1
+        entry.discard()
+
+    async def submit(self, entry: JournalEntry) -> None:
+        """
+        Queue an entry for writing.
+
+        This only waits if the overflow policy is BLOCK and the queue is full.
+        """
+        self.submitted += 1
+
+        if self.overflow == Overflow.BLOCK:
+            await self.queue.put(entry)
+            return
+
+        if self.overflow == Overflow.SAMPLE and self.queue.qsize() >= self.queue.maxsize // 2:
+            self.sampled += 1
+            if self.sampled % self.sample_rate:
+                self._drop(entry)
+                return
+
+        if self.queue.full():
+            if self.overflow == Overflow.DROP_OLDEST:
+                oldest = self.queue.get_nowait()
+                # Never drop the sentinel.
+                if oldest is None:
+                    self.queue.put_nowait(oldest)
+                    self._drop(entry)
+                    return
+                self._drop(oldest)
+            else:
+                self._drop(entry)
+                return
+
+        self.queue.put_nowait(entry)
+
+    def metrics(self) -> JournalMetrics:
+        return JournalMetrics(
+            overflow=self.overflow.value,
+            queued=self.queue.qsize(),
+            capacity=self.queue.maxsize,
+            submitted=self.submitted,
+            written=self.written,
+            dropped=self.dropped,
+            failed=self.failed,
+            latency_last=self.latency_last,
+            latency_mean=self.latency_total / self.batches if self.batches else 0.0,
+            latency_max=self.latency_max,
+        )
+
+    async def _batch(self) -> tuple[list[JournalEntry], bool]:
+        """
+        Collect a batch of entries.
+
+        Waits for the first entry, then keeps collecting until the batch is full
+        or the flush interval has elapsed.
+
+        Returns:
+            Tuple of (batch, done) where done indicates that the writer has been stopped.
+        """
+        loop = asyncio.get_running_loop()
+
+        batch: list[JournalEntry] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                entry = await self.queue.get()
+                deadline = loop.time() + self.flush_interval
+            else:
+                try:
+                    entry = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except TimeoutError:
+                    break
+            if entry is None:
+                return batch, True
+            batch.append(entry)
+
+        return batch, False
+
+    def _write(self, batch: list[JournalEntry]) -> None:
+        """
+        Append a batch of entries to the journal.
+
+        This is a blocking function so it needs to be run in a separate thread.
+        """
+        if not batch:
+            return
+        start = time.perf_counter()
+        for entry in batch:
+            try:
+                path, offset = self.segments.write(entry)
+                logging.debug(f"💾 [{entry.id}] Journal: {path.name} @ {offset}.")
+                self.written += 1
+            except OSError as error:
+                logging.error(f"🚨 [{entry.id}] Failed to write journal: {error}")
+                self.failed += 1
+                entry.discard()
+                continue
+            if self.index is not None:
+                try:
+                    self.index.add(entry, path, offset)
+                except sqlite3.Error as error:
+                    logging.error(f"🚨 [{entry.id}] Failed to index journal: {error}")
+        self.segments.flush()
+        if self.index is not None:
+            self.index.commit()
+
+        latency = time.perf_counter() - start
+        self.batches += 1
+        self.latency_last = latency
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        done = False
+        while not done:
+            batch, done = await self._batch()
+            try:
+                await loop.run_in_executor(self.executor, self._write, batch)
+            except Exception:
+                # Don't let a failure kill the writer, otherwise the queue will fill up.
+                logging.exception("🚨 Failed to write journal batch.")
@@ -1,13 +1,14 @@
 import argparse
 import asyncio
-import bz2
 import json
 import logging
 import logging.config
 from collections.abc import AsyncIterator
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import UTC, datetime
+from functools import partial
 from pathlib import Path
+from typing import Any
 from urllib.parse import urljoin
 
 import httpx
@@ -15,17 +16,51 @@ import ibauth
 import uvicorn
 import yaml
 from fastapi import FastAPI, Request
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from ibauth.timing import AsyncTimer
-
-from . import rate
-from .const import API_HOST, API_PORT, HEADERS, JOURNAL_DIR, VERSION
+from starlette.background import BackgroundTask
+from starlette.types import Receive, Scope, Send
+
+from . import pool, rate
+from .batch import SnapshotBatcher
+from .cache import CacheRule, ResponseCache
+from .coalesce import Coalescer
+from .const import (
+    API_HOST,
+    API_PORT,
+    CLIENT_HEADER,
+    CLIENT_KEY_HEADER,
+    HEADERS,
+    JOURNAL_DIR,
+    JOURNAL_OVERFLOW,
+    MOCK_PORT,
+    PREWARM_CONNECTIONS,
+    PREWARM_MAXIMUM,
+    PRIORITY_HEADER,
+    UPSTREAM_KEEPALIVE,
+    VERSION,
+)
+from .journal import JournalEntry, JournalWriter, Overflow
+from .middleware.compress import CompressionMiddleware
 from .middleware.request_id import RequestIdMiddleware
-from .rate import enforce_rate_limit, rate_loop
+from .mock import MockAuth
+from .pool import Trace, prewarm
+from .rate import (
+    AdaptiveLimit,
+    Client,
+    Priority,
+    adapt,
+    concurrency_limit,
+    enforce_rate_limit,
+    get_client,
+    identify,
+    priority,
+    rate_loop,
+)
+from .routes import load_routes, template
 from .system import router as system_router
 from .tickle import TICKLE_INTERVAL, TickleMode, tickle_loop
-from .util import logging_level
+from .util import accepts, logging_level
 
 LOGGING_CONFIG_PATH = Path(__file__).parent / "logging" / "logging.yaml"
 
@@ -46,6 +81,10 @@ warnings.filterwarnings(
 #
 tickle = None
 TICKLE_MODE: TickleMode = TickleMode.ALWAYS
+# Stream upstream response bodies to the client rather than buffering them.
+STREAM: bool = False
+# Base URL for upstream requests. Defaults to https://{auth.domain}/.
+UPSTREAM: str | None = None
 
 # ==============================================================================
 
@@ -73,21 +112,49 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         if error:
             logging.exception("Tickle task terminated with exception: %s", error)
 
-    app.state.auth = ibauth.auth_from_yaml(app.state.args.config)
+    app.state.journal = None
+    if JOURNAL_DIR:
+        app.state.journal = JournalWriter(
+            JOURNAL_DIR,
+            overflow=Overflow(app.state.args.journal_overflow),
+            index=not app.state.args.disable_journal_index,
+        )
+    if app.state.journal:
+        app.state.journal.start()
+
+    app.state.cache = None if app.state.args.disable_cache else ResponseCache()
+    app.state.coalescer = None if app.state.args.disable_coalesce else Coalescer()
+    app.state.batcher = SnapshotBatcher(app.state.args.snapshot_batch) if app.state.args.snapshot_batch else None
+    app.state.limiter = None if app.state.args.disable_concurrency_limit else AdaptiveLimit()
+
+    if app.state.args.mock_auth:
+        app.state.auth = MockAuth()
+    else:
+        app.state.auth = ibauth.auth_from_yaml(app.state.args.config)
     app.state.client = httpx.AsyncClient(
         timeout=30.0,
-        # TODO: Tune the connection limits for traffic profile.
-        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
+        # With HTTP/2, requests are multiplexed over a single connection.
+        http2=app.state.args.http2,
+        # Hard limits. The number of requests in flight is normally kept lower by the
+        # adaptive concurrency limit.
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=UPSTREAM_KEEPALIVE),
     )
     try:
         await app.state.auth.connect()
     except Exception:
         logging.error("🚨 Authentication failed!")
 
+    # Open upstream connections before requests arrive (repeated after a reset).
+    app.state.prewarm = None
+    if app.state.args.prewarm:
+        connections = 1 if app.state.args.http2 else app.state.args.prewarm
+        app.state.prewarm = partial(prewarm, app.state.client, _base(app), connections)
+        await app.state.prewarm()
+
     tickle = asyncio.create_task(tickle_loop(app))
     tickle.add_done_callback(_tickle_done)
 
-    rate = asyncio.create_task(rate_loop())
+    rate = asyncio.create_task(rate_loop(pool.prune))
 
     yield
     tickle.cancel()
@@ -106,6 +173,9 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     except:
         pass
 
+    if app.state.journal:
+        await app.state.journal.stop()
+
     await app.state.client.aclose()
     await app.state.auth.logout()
 
@@ -117,25 +187,168 @@ app = FastAPI(title="IBKR Proxy Service", version=VERSION, lifespan=lifespan)
 app.include_router(system_router)
 
 app.add_middleware(RequestIdMiddleware)
-app.add_middleware(GZipMiddleware, minimum_size=100, compresslevel=5)
+app.add_middleware(CompressionMiddleware)
+
+
+def _base(app: FastAPI) -> str:
+    """
+    Upstream base URL.
+    """
+    return UPSTREAM or f"https://{app.state.auth.domain}/"
+
+
+def _url(request: Request, path: str) -> str:
+    return urljoin(_base(request.app), path)
+
+
+def _upstream(
+    request: Request, path: str, body: bytes, params: dict[str, str], headers: dict[str, str]
+) -> dict[str, Any]:
+    """
+    Arguments for the upstream request.
+    """
+    return {
+        "method": request.method,
+        "url": _url(request, path),
+        "content": body,
+        "headers": {**headers, "Authorization": f"Bearer {request.app.state.auth.bearer_token}", **HEADERS},
+        "params": params,
+    }
+
+
+def _store(cache: ResponseCache, key: str, rule: CacheRule, response: httpx.Response) -> bool:
+    """
+    Cache a successful response. Returns whether the response was stored.
+    """
+    if response.status_code != 200:
+        return False
+    headers = dict(response.headers)
+    headers.pop("content-encoding", None)
+    cache.put(key, rule, response.content, response.status_code, headers, headers.get("content-type"))
+    return True
+
+
+def _request_body(body: bytes) -> Any:
+    """
+    Request body for the journal: parsed JSON or text if it isn't JSON (for example a form).
+    """
+    if not body:
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body.decode("utf-8", errors="replace")
+
+
+class _UpstreamStreamingResponse(StreamingResponse):  # type: ignore[misc, unused-ignore]
+    """
+    Streaming response that holds an open upstream response.
+
+    The stack (the upstream response and the concurrency slots held for it) is
+    closed however the response ends, even if the body iterator is never started
+    (for example if sending the response headers fails).
+    """
+
+    def __init__(self, *args: Any, stack: AsyncExitStack, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.stack = stack
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.stack.aclose()
+
+
+def _client(request: Request, headers: dict[str, str]) -> Client:
+    """
+    Identify the client sending a request. The identifying headers aren't forwarded.
+    """
+    name = identify(headers, request.client.host if request.client else None)
+    headers.pop(CLIENT_HEADER.lower(), None)
+    headers.pop(CLIENT_KEY_HEADER.lower(), None)
+    return get_client(name)
+
+
+async def _revalidate(request: Request, id: str, path: str, key: str, rule: CacheRule) -> None:
+    """
+    Refresh a stale cached response. This goes through the rate limit (at low
+    priority because a stale response has already been sent).
+    """
+    headers = dict(request.headers)
+    headers.pop("host")
+    consumer = _client(request, headers)
+    headers.pop(PRIORITY_HEADER.lower(), None)
+    upstream = _upstream(request, path, b"", dict(request.query_params), headers)
+    route = template("/" + path)
+
+    limiter: AdaptiveLimit | None = request.app.state.limiter
+    async with AsyncExitStack() as stack:
+        await stack.enter_async_context(concurrency_limit(route))
+        await enforce_rate_limit(id, route, Priority.LOW, consumer)
+        await request.app.state.gate.wait()
+        if limiter:
+            await limiter.acquire()
+            stack.callback(limiter.release)
+
+        logging.info(f"🔄 [{id}] Refresh: {upstream['method']} {upstream['url']}")
+        await rate.record(route)
+        trace = Trace(route)
+        stack.callback(trace.close)
+        async with AsyncTimer() as timer:
+            response = await request.app.state.client.request(**upstream, extensions={"trace": trace})
+        if limiter:
+            limiter.sample(timer.duration)
+    adapt(route, response.status_code, response.headers)
+    _store(request.app.state.cache, key, rule, response)
 
 
 @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])  # type: ignore[untyped-decorator]
 async def proxy(path: str, request: Request) -> Response:
     id: str = request.state.request_id
 
-    # Enforce rate limit.
+    # Answer from the cache if possible. Cache hits don't count towards the rate
+    # limit. Stale responses are refreshed after they have been sent.
     #
-    await enforce_rate_limit(id)
+    cache: ResponseCache | None = request.app.state.cache
+    rule = cache.rule(request.method, "/" + path) if cache else None
+    if cache and rule:
+        key = cache.key("/" + path, dict(request.query_params))
+        if cached := cache.get(key):
+            if cached.fresh():
+                logging.info(f"✅ [{id}] Cache hit: {key}")
+                return cached.response("HIT")
+            logging.info(f"✅ [{id}] Cache hit (stale): {key}")
+            return cached.response(
+                "STALE",
+                background=BackgroundTask(cache.revalidate, key, partial(_revalidate, request, id, path, key, rule)),
+            )
 
-    # Check if the gate is open. If it is then this will return immediately. If not then
-    # it will wait until the gate is opened again.
+    method = request.method
+    url = _url(request, path)
+    # Route template (for example /v1/api/iserver/contract/{conid}/info) used as the
+    # key for rates, limits and metrics.
+    route = template("/" + path)
+
+    # Identical concurrent requests can share a single upstream request.
     #
-    await request.app.state.gate.wait()
+    coalescer: Coalescer | None = request.app.state.coalescer
+    pattern = coalescer.match(method, "/" + path) if coalescer else None
 
-    method = request.method
-    url = urljoin(f"https://{request.app.state.auth.domain}/", path)
-    logging.info(f"🔵 [{id}] Request: {method} {url}")
+    # Market data snapshot requests can be merged into batches.
+    #
+    batcher: SnapshotBatcher | None = request.app.state.batcher
+    batch = batcher.match(method, "/" + path, dict(request.query_params)) if batcher else None
+
+    # Adaptive limit on concurrent upstream requests.
+    #
+    limiter: AdaptiveLimit | None = request.app.state.limiter
+
+    # Cached, coalesced and batched responses are always buffered and decoded. Other
+    # responses are sent straight back to the client, so the body can be forwarded
+    # as it was encoded upstream.
+    direct = rule is None and pattern is None and batch is None
+    stream = STREAM and direct
 
     try:
         # Get body, parameters and headers from request.
@@ -147,6 +360,12 @@ async def proxy(path: str, request: Request) -> Response:
         # the target site.
         #
         headers.pop("host")
+        # Priority class for the rate limiter. The header isn't forwarded.
+        #
+        level = priority(route, headers.pop(PRIORITY_HEADER.lower(), None))
+        # Client for fair queueing and quotas.
+        #
+        consumer = _client(request, headers)
 
         if body:
             logging.debug(f"- Body:    {body}")
@@ -160,98 +379,214 @@ async def proxy(path: str, request: Request) -> Response:
                 for k, v in params.items():
                     logging.debug(f"  - {k}: {v}")
 
-        headers["Authorization"] = f"Bearer {request.app.state.auth.bearer_token}"
-
         # Forward request.
-        now = await rate.record(path)
-        async with AsyncTimer() as duration:
-            response = await request.app.state.client.request(
-                method=method,
-                url=url,
-                content=body,
-                headers={**headers, **HEADERS},
-                params=params,
-            )
-        logging.info(f"⏳ [{id}] Duration: {duration.duration:.3f} s")
-
-        headers = dict(response.headers)
-        # Remove headers from response. These will be replaced with correct values.
-        headers.pop("content-length", None)
-        headers.pop("content-encoding", None)
-
-        # TODO: Could try to infer content type if header is missing.
-        content_type = headers.get("content-type")
-
-        # Ensure a content-length header is present if upstream didn't supply one.
-        # This keeps tests and some clients happy when we strip upstream headers.
-        if "content-length" not in headers:
-            headers["content-length"] = str(len(response.content))
-
-        def _write_journal() -> None:
-            """
-            Write request/response journal to a compressed JSON file.
-
-            This is a blocking function so it needs to be run in a separate thread.
-            """
-            json_path = JOURNAL_DIR / (
-                filename := now.strftime(f"%Y%m%d/%Y%m%d-%H%M%S-{request.state.request_id}.json.bz2")
-            )
+        upstream = _upstream(request, path, body, params, headers)
+        # Holds the open upstream response for direct requests.
+        stack = AsyncExitStack()
+        # Phase timings of the upstream request (not set if it's shared with another request).
+        trace: Trace | None = None
+
+        async def _send(override: dict[str, str] | None = None) -> tuple[httpx.Response, datetime, float]:
+            nonlocal trace
+            # Parameters can be overridden (for example when requests are batched).
+            arguments = upstream if override is None else {**upstream, "params": override}
+
+            # Wait for a slot if the endpoint has a concurrency limit. For direct requests
+            # the slot is held until the response body has been read.
             #
-            json_path.parent.mkdir(parents=True, exist_ok=True)
-
-            if not content_type:
-                logging.warning("🚨 No content type in response!")
-            if content_type and content_type.startswith("application/json"):
-                data = response.json()
-            else:
-                data = response.text
+            await stack.enter_async_context(concurrency_limit(route))
+            try:
+                # Enforce global and endpoint rate limits.
+                #
+                await enforce_rate_limit(id, route, level, consumer)
+
+                # Check if the gate is open. If it is then this will return immediately. If not then
+                # it will wait until the gate is opened again.
+                #
+                await request.app.state.gate.wait()
+
+                # Wait if the adaptive limit on concurrent upstream requests has been
+                # reached. For direct requests the slot is held until the response body
+                # has been read.
+                #
+                if limiter:
+                    await limiter.acquire()
+                    stack.callback(limiter.release)
+
+                logging.info(f"🔵 [{id}] Request: {method} {url}")
+                now = await rate.record(route)
+                # The trace is finished when the response has been read.
+                trace = Trace(route)
+                stack.callback(trace.close)
+                extensions = {"trace": trace}
+                async with AsyncTimer() as timer:
+                    if direct:
+                        # Only the status and headers have been received at this point. The body is
+                        # read (raw or decoded) once the encoding is known.
+                        response = await stack.enter_async_context(
+                            request.app.state.client.stream(**arguments, extensions=extensions)
+                        )
+                    else:
+                        response = await request.app.state.client.request(**arguments, extensions=extensions)
+                # Adapt the rate limits to upstream throttling and the concurrency limit to
+                # upstream latency (time to response headers for direct requests).
+                adapt(route, response.status_code, response.headers)
+                if limiter:
+                    limiter.sample(timer.duration)
+            except BaseException:
+                await stack.aclose()
+                raise
+            if not direct:
+                await stack.aclose()
+            return response, now, timer.duration
+
+        if batcher and batch:
+            response, now, duration = await batcher.run(*batch, _send)
+        elif coalescer and pattern:
+            (response, now, duration), shared = await coalescer.run(
+                coalescer.key(method, "/" + path, params), pattern, _send
+            )
+            if shared:
+                logging.info(f"🔀 [{id}] Coalesced: {method} {url}")
+        else:
+            response, now, duration = await _send()
 
-            with bz2.open(json_path, "wt", encoding="utf-8") as f:
-                logging.info(f"💾 [{id}] Dump: {filename}.")
-                dump = {
-                    "request": {
-                        "id": request.state.request_id,
+        # The stack holds the upstream response and concurrency slots for direct requests.
+        # It must be closed if anything fails before the response takes it over.
+        #
+        try:
+            logging.info(f"⏳ [{id}] Duration: {duration:.3f} s")
+
+            headers = dict(response.headers)
+            # Remove headers from response. These will be replaced with correct values.
+            length = headers.pop("content-length", None)
+            encoding = headers.pop("content-encoding", None)
+
+            # If the client accepts the upstream content encoding then the body is forwarded
+            # without being decoded (and isn't compressed again by CompressionMiddleware).
+            passthrough = False
+            if (
+                direct
+                and encoding is not None
+                and not response.is_error
+                and accepts(request.headers.get("accept-encoding"), encoding)
+            ):
+                passthrough = True
+                headers["content-encoding"] = encoding
+
+            # TODO: Could try to infer content type if header is missing.
+            content_type = headers.get("content-type")
+
+            journal = request.app.state.journal
+            entry = None
+            if journal:
+                entry = JournalEntry(
+                    request={
+                        "id": id,
                         "url": url,
                         "method": method,
                         "headers": dict(response.request.headers),
                         "params": params,
-                        "body": json.loads(body.decode("utf-8")) if body else None,
+                        "body": _request_body(body),
                     },
-                    "response": {
-                        "status_code": response.status_code,
-                        "data": data,
+                    status_code=response.status_code,
+                    content_type=content_type,
+                    encoding=response.encoding,
+                    timestamp=now,
+                    content_encoding=encoding if passthrough else None,
+                )
+
+            # The journal entry is submitted after the response has been sent.
+            async def _journal() -> None:
+                # Release the upstream response if the body wasn't read (for example if the
+                # client disconnected before the stream started).
+                await stack.aclose()
+                if entry is not None:
+                    await journal.complete(entry, duration, trace.close() if trace is not None else None)
+
+            # Read the body of a direct response unless it's streamed. Error responses are
+            # buffered, even in streaming mode, because the body is needed for the error
+            # envelope.
+            if direct and (not stream or response.is_error):
+                try:
+                    if passthrough:
+                        content = b"".join([chunk async for chunk in response.aiter_raw()])
+                    else:
+                        content = await response.aread()
+                finally:
+                    await stack.aclose()
+            elif not direct:
+                content = response.content
+
+            if entry is not None and (not stream or response.is_error):
+                entry.write(content)
+
+            if response.is_error:
+                # Upstream responded with 4xx/5xx status.
+                upstream_status = response.status_code
+                logging.error(f"🚨 [{id}] Upstream API error {upstream_status}: {method} {url}.")
+                # Pass on upstream advice about when to retry.
+                retry = {"Retry-After": response.headers["retry-after"]} if "retry-after" in response.headers else None
+                # Return a proxied error to caller (don't leak stack trace).
+                return JSONResponse(
+                    content={
+                        "error": "Upstream service error.",
+                        "upstream_status": upstream_status,
+                        "detail": response.text,
                     },
-                    "duration": duration.duration,
-                }
-                json.dump(dump, f, indent=2)
-
-        if JOURNAL_DIR:
-            await asyncio.to_thread(_write_journal)
-
-        if response.is_error:
-            # Upstream responded with 4xx/5xx status.
-            upstream_status = response.status_code
-            logging.error(f"🚨 [{id}] Upstream API error {upstream_status}: {method} {url}.")
-            # Return a proxied error to caller (don't leak stack trace).
-            return JSONResponse(
-                content={
-                    "error": "Upstream service error.",
-                    "upstream_status": upstream_status,
-                    "detail": response.text,
-                },
-                # HTTP 502 Bad Gateway error indicates a server-side
-                # communication issue where a gateway or proxy received an
-                # invalid response from an upstream server
-                status_code=502,
-            )
-        else:
-            logging.info(f"✅ [{id}] Return response.")
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=headers,
-                media_type=content_type,
-            )
+                    # HTTP 502 Bad Gateway error indicates a server-side
+                    # communication issue where a gateway or proxy received an
+                    # invalid response from an upstream server
+                    status_code=502,
+                    headers=retry,
+                    background=BackgroundTask(_journal),
+                )
+            elif stream:
+
+                async def _body() -> AsyncIterator[bytes]:
+                    try:
+                        async for chunk in response.aiter_raw() if passthrough else response.aiter_bytes():
+                            if entry is not None:
+                                # Tee into the journal.
+                                entry.write(chunk)
+                            yield chunk
+                    finally:
+                        # Release the upstream connection even if the client disconnects.
+                        await stack.aclose()
+
+                logging.info(f"✅ [{id}] Stream response.")
+                # The upstream content-length is only correct if the body isn't decoded. Otherwise
+                # the body is sent with chunked transfer encoding.
+                if passthrough and length is not None:
+                    headers["content-length"] = length
+                return _UpstreamStreamingResponse(
+                    _body(),
+                    stack=stack,
+                    status_code=response.status_code,
+                    headers=headers,
+                    media_type=content_type,
+                    background=BackgroundTask(_journal),
+                )
+            else:
+                # Ensure a content-length header is present if upstream didn't supply one.
+                # This keeps tests and some clients happy when we strip upstream headers.
+                headers["content-length"] = str(len(content))
+
+                if cache and rule:
+                    # Only 200 responses are stored, others bypass the cache.
+                    headers["X-Cache"] = "MISS" if _store(cache, key, rule, response) else "BYPASS"
+
+                logging.info(f"✅ [{id}] Return response.")
+                return Response(
+                    content=content,
+                    status_code=response.status_code,
+                    headers=headers,
+                    media_type=content_type,
+                    background=BackgroundTask(_journal),
+                )
+        except BaseException:
+            await stack.aclose()
+            raise
     except httpx.RequestError as error:
         return JSONResponse(status_code=502, content={"error": f"Proxy error: {str(error)}"})
 
@@ -292,19 +627,110 @@ def main() -> None:
         default=TICKLE_INTERVAL,
         help=f"Interval (seconds) between tickles (default: {TICKLE_INTERVAL}).",
     )
+    parser.add_argument(
+        "--upstream",
+        type=str,
+        default=None,
+        help="Base URL for upstream requests, for example a local stand-in for the IBKR API "
+        "(default: https://{domain}/ from the configuration file).",
+    )
+    parser.add_argument(
+        "--mock-auth",
+        action="store_true",
+        help="Use dummy authentication rather than connecting to IBKR. For use with a local upstream "
+        f"(default upstream: http://{API_HOST}:{MOCK_PORT}/, as started by ibproxy-mock).",
+    )
+    parser.add_argument(
+        "--routes",
+        type=Path,
+        default=None,
+        help="YAML file with a list of additional route templates (for example /v1/api/iserver/contract/{conid}/info) "
+        "used to group requests for rates and limits.",
+    )
+    parser.add_argument(
+        "--http2",
+        action="store_true",
+        help="Use HTTP/2 for upstream requests (needs the http2 extra: pip install ibproxy[http2]).",
+    )
+    parser.add_argument(
+        "--prewarm",
+        type=int,
+        default=PREWARM_CONNECTIONS,
+        help="Number of upstream connections opened at startup and after /reset, before requests arrive "
+        f"(default: {PREWARM_CONNECTIONS}, at most {PREWARM_MAXIMUM}, 0 to disable). Only one connection is "
+        "needed with --http2.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream upstream responses to the client instead of buffering them.",
+    )
+    parser.add_argument(
+        "--disable-cache",
+        action="store_true",
+        help="Disable caching of reference data responses.",
+    )
+    parser.add_argument(
+        "--disable-coalesce",
+        action="store_true",
+        help="Disable sharing of upstream responses between identical concurrent requests.",
+    )
+    parser.add_argument(
+        "--snapshot-batch",
+        type=float,
+        default=None,
+        metavar="WINDOW",
+        help="Merge market data snapshot requests that arrive within WINDOW seconds into a single upstream "
+        "request (default: disabled).",
+    )
+    parser.add_argument(
+        "--disable-concurrency-limit",
+        action="store_true",
+        help="Disable the adaptive limit on concurrent upstream requests.",
+    )
     parser.add_argument(
         "--disable-journal",
         action="store_true",
         help="Disable writing details of each request/response to a compressed JSON file.",
     )
+    parser.add_argument(
+        "--disable-journal-index",
+        action="store_true",
+        help="Disable the SQLite index of journal records.",
+    )
+    parser.add_argument(
+        "--journal-overflow",
+        choices=[policy.value for policy in Overflow],
+        default=JOURNAL_OVERFLOW,
+        help="What to do when the journal queue is full: "
+        "'block' = wait for space (default), "
+        "'drop-oldest' = discard the oldest queued record, "
+        "'drop-newest' = discard the new record, "
+        "'sample' = keep a sample of records once the queue is half full.",
+    )
     args = parser.parse_args()
 
     app.state.args = args
 
+    if args.http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            parser.error("--http2 needs the h2 package (pip install ibproxy[http2]).")
+
     if args.debug:
         LOGGING_CONFIG["root"]["level"] = "DEBUG"  # pragma: no cover
         LOGGING_CONFIG["loggers"]["ibauth"]["level"] = "DEBUG"  # pragma: no cover
 
+    global STREAM, UPSTREAM
+    STREAM = args.stream
+    UPSTREAM = args.upstream
+    if args.mock_auth and not UPSTREAM:
+        UPSTREAM = f"http://{API_HOST}:{MOCK_PORT}/"
+
+    if args.routes:
+        load_routes(args.routes)
+
     if args.disable_journal:
         global JOURNAL_DIR
         JOURNAL_DIR = None  # type: ignore[assignment]
@@ -0,0 +1,241 @@
+import asyncio
+import zlib
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Protocol
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..const import (
+    COMPRESSION_ENCODINGS,
+    COMPRESSION_LEVELS,
+    COMPRESSION_MINIMUM_SIZE,
+    COMPRESSION_THREAD_SIZE,
+    COMPRESSION_WORKERS,
+)
+from ..util import accepts
+
+# Optional codecs.
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+# Content types that are never compressed.
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+class Encoder(Protocol):
+    """
+    Incremental compressor for streamed responses.
+
+    Each chunk is flushed, so that the client can decode it without waiting for
+    the rest of the stream.
+    """
+
+    def compress(self, data: bytes) -> bytes: ...
+
+    def finish(self) -> bytes: ...
+
+
+class _Gzip:
+    def __init__(self, level: int):
+        self.compressor = zlib.compressobj(level, wbits=31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self.compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, level: int):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self.compressor.process(data) + self.compressor.flush())
+
+    def finish(self) -> bytes:
+        return bytes(self.compressor.finish())
+
+
+class _Zstd:
+    def __init__(self, level: int):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return bytes(self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK))
+
+    def finish(self) -> bytes:
+        return bytes(self.compressor.flush())
+
+
+@dataclass(frozen=True)
+class Codec:
+    """
+    A content encoding.
+    """
+
+    name: str
+    # Compress a complete body at a level.
+    compress: Callable[[bytes, int], bytes]
+    # Create an incremental compressor at a level.
+    encoder: Callable[[int], Encoder]
+
+
+# Available codecs.
+CODECS: dict[str, Codec] = {
+    "gzip": Codec(
+        "gzip",
+        lambda data, level: zlib.compress(data, level, wbits=31),
+        _Gzip,
+    ),
+}
+if brotli is not None:
+    CODECS["br"] = Codec("br", lambda data, level: bytes(brotli.compress(data, quality=level)), _Brotli)
+if zstandard is not None:
+    CODECS["zstd"] = Codec(
+        "zstd",
+        lambda data, level: bytes(zstandard.ZstdCompressor(level=level).compress(data)),
+        _Zstd,
+    )
+
+
+class CompressionMiddleware:
+    """
+    Compress responses for clients that accept compression.
+
+    The encoding is the first of COMPRESSION_ENCODINGS that the client accepts
+    and is available (br and zstd are optional). The level depends on the size
+    of the body (COMPRESSION_LEVELS), so small bodies are compressed quickly.
+    Large bodies are compressed in a thread pool (the codecs release the GIL)
+    so they don't stall other requests on the event loop.
+
+    Responses that already have a content encoding (for example compressed
+    upstream responses that are passed through) are sent as they are.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        thread_size: int = COMPRESSION_THREAD_SIZE,
+        encodings: list[str] | None = None,
+        levels: dict[str, list[tuple[int | None, int]]] | None = None,
+        workers: int = COMPRESSION_WORKERS,
+    ) -> None:
+        """
+        Args:
+            app: ASGI app.
+            minimum_size: Bodies smaller than this (bytes) aren't compressed.
+            thread_size: Bodies (or chunks of streamed bodies) of at least this size (bytes)
+                         are compressed in the thread pool.
+            encodings: Encodings in order of preference.
+            levels: Levels for each encoding as a list of (maximum size, level).
+            workers: Number of compression threads.
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_size = thread_size
+        self.encodings = [name for name in encodings or COMPRESSION_ENCODINGS if name in CODECS]
+        self.levels = levels or COMPRESSION_LEVELS
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="compress")
+
+    def negotiate(self, accept_encoding: str | None) -> Codec | None:
+        """
+        Choose an encoding that the client accepts.
+        """
+        for name in self.encodings:
+            if accepts(accept_encoding, name):
+                return CODECS[name]
+        return None
+
+    def level(self, codec: Codec, size: int | None) -> int:
+        """
+        Compression level for a body. Streamed bodies (unknown size) use the last tier.
+        """
+        tiers = self.levels[codec.name]
+        for limit, level in tiers:
+            if limit is None or (size is not None and size <= limit):
+                return level
+        return tiers[-1][1]
+
+    async def _run(self, function: Callable[..., bytes], *args: Any) -> bytes:
+        """
+        Compress inline or in the thread pool, depending on the size of the data.
+        """
+        if len(args[0]) < self.thread_size:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, partial(function, *args))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codec = self.negotiate(Headers(scope=scope).get("accept-encoding"))
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+
+        # The start message is held until the first body message, when it's known
+        # whether the body will be compressed.
+        start: Message | None = None
+        encoder: Encoder | None = None
+
+        async def _send(message: Message) -> None:
+            nonlocal start, encoder
+
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body: bytes = message.get("body", b"")
+            more: bool = message.get("more_body", False)
+
+            if start is not None:
+                first, start = start, None
+                headers = MutableHeaders(scope=first)
+                if (
+                    "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)
+                    or (not more and len(body) < self.minimum_size)
+                ):
+                    await send(first)
+                    await send(message)
+                    return
+
+                headers["Content-Encoding"] = codec.name
+                headers.add_vary_header("Accept-Encoding")
+                if not more:
+                    # Complete body.
+                    body = await self._run(codec.compress, body, self.level(codec, len(body)))
+                    headers["Content-Length"] = str(len(body))
+                    await send(first)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+
+                # Streamed body.
+                del headers["Content-Length"]
+                encoder = codec.encoder(self.level(codec, None))
+                await send(first)
+
+            if encoder is not None:
+                body = await self._run(encoder.compress, body)
+                if not more:
+                    body += encoder.finish()
+                message = {"type": "http.response.body", "body": body, "more_body": more}
+            await send(message)
+
+        await self.app(scope, receive, _send)
@@ -1,18 +1,64 @@
-import uuid
-from typing import Awaitable, Callable
+import os
+import time
 
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+# Crockford base32. Characters are in ASCII order, so IDs sort as strings.
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
 
-class RequestIdMiddleware(BaseHTTPMiddleware):  # type: ignore[misc]
-    async def dispatch(self, request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
-        # Generate a unique request ID. Don't truncate if longer ID required.
-        # TODO: Use UUID v6, v7 (might be best?) or v8. These are sortable.
-        request_id = str(uuid.uuid4())[:8]
-        request.state.request_id = request_id
+# Bits for the sequence number within a millisecond.
+SEQUENCE_BITS = 16
 
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = request_id
+_last = 0
 
-        return response
+
+def request_id() -> str:
+    """
+    Generate a request ID.
+
+    IDs are 13 characters: a millisecond timestamp and a sequence number (like
+    UUIDv7 but shorter), so they are unique within the process, increase
+    monotonically and sort in the order that requests arrived. The sequence
+    starts at a random value each millisecond so that IDs from separate
+    processes are unlikely to collide.
+    """
+    global _last
+    value = (time.time_ns() // 1_000_000) << SEQUENCE_BITS | int.from_bytes(os.urandom(1)) << (SEQUENCE_BITS - 8)
+    # Never go backwards (several requests in a millisecond or the clock stepping back).
+    value = _last = max(value, _last + 1)
+
+    chars = []
+    for _ in range(13):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+class RequestIdMiddleware:
+    """
+    Assign an ID to each request and return it in the X-Request-ID header.
+
+    This is raw ASGI middleware. It adds the header by wrapping send(), so it
+    doesn't add tasks or buffer the response (streaming responses are passed
+    straight through).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        id = request_id()
+        # Available as request.state.request_id.
+        scope.setdefault("state", {})["request_id"] = id
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Request-ID", id)
+            await send(message)
+
+        await self.app(scope, receive, _send)
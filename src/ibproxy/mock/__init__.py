@@ -0,0 +1,11 @@
+from .auth import MockAuth
+from .upstream import DEFAULT_PROFILES, MockUpstream, Profile, load_profiles, payload
+
+__all__ = [
+    "DEFAULT_PROFILES",
+    "load_profiles",
+    "MockAuth",
+    "MockUpstream",
+    "payload",
+    "Profile",
+]
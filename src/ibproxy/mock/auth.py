@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from ..const import API_HOST, MOCK_PORT
+
+
+class MockAuth:
+    """
+    Stand-in for ibauth.IBAuth.
+
+    Always authenticated and never talks to IBKR. For use with a local upstream
+    like the one from ibproxy-mock.
+    """
+
+    def __init__(self, domain: str = f"{API_HOST}:{MOCK_PORT}"):
+        self.domain = domain
+        self.bearer_token = "mock-bearer-token"
+        self.authenticated = False
+        self.tickles = 0
+
+    async def connect(self) -> None:
+        self.authenticated = True
+
+    async def logout(self) -> None:
+        self.authenticated = False
+
+    async def tickle(self) -> None:
+        self.tickles += 1
+
+    async def status(self) -> SimpleNamespace:
+        return SimpleNamespace(connected=self.authenticated, authenticated=self.authenticated)
+
+    def is_connected(self) -> bool:
+        return self.authenticated
@@ -0,0 +1,34 @@
+import argparse
+from pathlib import Path
+
+import uvicorn
+
+from ..const import API_HOST, MOCK_PORT
+from .upstream import DEFAULT_PROFILES, MockUpstream, load_profiles
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Mock IBKR upstream for benchmarking and tests. "
+        f"Run the proxy against it with: ibproxy --mock-auth --upstream http://{API_HOST}:{MOCK_PORT}/"
+    )
+    parser.add_argument("--port", type=int, default=MOCK_PORT, help=f"Port (default: {MOCK_PORT}).")
+    parser.add_argument(
+        "--profiles",
+        type=Path,
+        default=None,
+        help="YAML file with a list of endpoint profiles (pattern, latency, jitter, error_rate, rate, burst, "
+        "concurrency, penalty, size, gzip). Defaults roughly follow the IBKR pacing limits.",
+    )
+    parser.add_argument("--rate", type=float, default=None, help="Global pacing limit (requests per second).")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for latency and errors.")
+    args = parser.parse_args()
+
+    profiles = load_profiles(args.profiles) if args.profiles else list(DEFAULT_PROFILES)
+    mock = MockUpstream(profiles=profiles, rate=args.rate, seed=args.seed)
+
+    uvicorn.run(mock.app(), host=API_HOST, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
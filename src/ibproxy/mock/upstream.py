@@ -0,0 +1,223 @@
+import asyncio
+import gzip
+import json
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+from fnmatch import fnmatch
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+import yaml
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+
+@dataclass
+class Profile:
+    """
+    Behaviour of the mock upstream for endpoints matching a path pattern.
+    """
+
+    # Glob pattern matched against the URL path.
+    pattern: str = "*"
+    # Latency (seconds) is log-normal with this median and shape.
+    latency: float = 0.02
+    jitter: float = 0.5
+    # Probability of responding with a 503 error.
+    error_rate: float = 0.0
+    # Pacing limit (requests per second) and burst. Excess requests get a 429.
+    rate: float | None = None
+    burst: float = 1
+    # Maximum number of concurrent requests. Excess requests get a 429.
+    concurrency: int | None = None
+    # Time (seconds) that the endpoint keeps responding with 429 after the pacing limit is hit.
+    penalty: float = 0.0
+    # Approximate size (bytes) of the response body.
+    size: int = 256
+    # Compress response bodies (like the real API).
+    gzip: bool = False
+
+    def delay(self, rng: random.Random) -> float:
+        if self.latency <= 0:
+            return 0.0
+        return self.latency * math.exp(rng.gauss(0, self.jitter)) if self.jitter else self.latency
+
+
+# Roughly follows the documented IBKR pacing limits.
+#
+# https://www.interactivebrokers.com/campus/ibkr-api-page/web-api-trading/#pacing-limitations-8
+#
+DEFAULT_PROFILES: list[Profile] = [
+    Profile("/v1/api/iserver/marketdata/history", latency=0.3, concurrency=5, size=200_000),
+    Profile("/v1/api/iserver/marketdata/snapshot", latency=0.05, rate=10, burst=10, size=2_000),
+    Profile("/v1/api/iserver/account/orders", rate=0.2),
+    Profile("/v1/api/iserver/account/pnl/partitioned", rate=0.2),
+    Profile("/v1/api/iserver/trades", rate=0.2),
+    Profile("/v1/api/iserver/scanner/run", rate=1, size=20_000),
+    Profile("/v1/api/portfolio/accounts", rate=0.2),
+    Profile("/v1/api/portfolio/subaccounts", rate=0.2),
+    Profile("/v1/api/portfolio/*/positions/*", latency=0.1, size=50_000),
+    Profile("/v1/api/trsrv/*", latency=0.05, size=5_000),
+    Profile("/v1/api/tickle", rate=1, burst=1),
+    Profile("/v1/api/fyi/*", rate=1),
+    Profile("*"),
+]
+
+
+def load_profiles(path: Path) -> list[Profile]:
+    """
+    Load profiles from a YAML file containing a list of Profile fields.
+
+    A catch-all profile is appended if there isn't one.
+    """
+    with open(path) as f:
+        items = yaml.safe_load(f) or []
+    names = {f.name for f in fields(Profile)}
+    profiles = [Profile(**{k: v for k, v in item.items() if k in names}) for item in items]
+    if not any(profile.pattern == "*" for profile in profiles):
+        profiles.append(Profile())
+    return profiles
+
+
+@lru_cache(maxsize=32)
+def payload(size: int) -> bytes:
+    """
+    Synthetic JSON payload of approximately the given size.
+    """
+    items = []
+    total = 2
+    i = 0
+    while total < size:
+        item = json.dumps({"conid": 265598 + i, "symbol": f"SYM{i}", "price": 100 + i / 100, "size": 100})
+        items.append(item)
+        total += len(item) + 1
+        i += 1
+    return ("[" + ",".join(items) + "]").encode("utf-8")
+
+
+@lru_cache(maxsize=32)
+def compressed(size: int) -> bytes:
+    """
+    Gzip compressed synthetic JSON payload.
+    """
+    return gzip.compress(payload(size), compresslevel=5)
+
+
+@dataclass
+class _State:
+    tokens: float = 0.0
+    updated: float = 0.0
+    active: int = 0
+    blocked_until: float = 0.0
+    requests: int = 0
+    throttled: int = 0
+    errors: int = 0
+
+
+@dataclass
+class MockUpstream:
+    """
+    Mock IBKR upstream.
+
+    Each request is matched to the first profile with a matching pattern. The
+    profile determines the latency, error rate, pacing and response size.
+    """
+
+    profiles: list[Profile] = field(default_factory=lambda: list(DEFAULT_PROFILES))
+    # Global pacing limit (requests per second) across all endpoints.
+    rate: float | None = None
+    seed: int | None = None
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+        self.states: dict[str, _State] = defaultdict(_State)
+        self.glob = _State()
+
+    def match(self, path: str) -> Profile:
+        for profile in self.profiles:
+            if fnmatch(path, profile.pattern):
+                return profile
+        return Profile()
+
+    @staticmethod
+    def _pace(state: _State, rate: float, burst: float, now: float) -> bool:
+        """
+        Token bucket check. Returns True if the request is allowed.
+        """
+        if state.updated == 0:
+            state.tokens = burst
+        state.tokens = min(burst, state.tokens + (now - state.updated) * rate)
+        state.updated = now
+        if state.tokens >= 1:
+            state.tokens -= 1
+            return True
+        return False
+
+    def _throttle(self, profile: Profile, state: _State, now: float) -> Response:
+        state.throttled += 1
+        if profile.penalty:
+            state.blocked_until = max(state.blocked_until, now + profile.penalty)
+        retry_after = max(state.blocked_until - now, 1 / profile.rate if profile.rate else 1)
+        return JSONResponse(
+            {"error": "Too many requests"},
+            status_code=429,
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+    async def handle(self, method: str, path: str) -> Response:
+        profile = self.match(path)
+        state = self.states[profile.pattern]
+        state.requests += 1
+        now = time.monotonic()
+
+        if now < state.blocked_until:
+            return self._throttle(profile, state, now)
+        if self.rate and not self._pace(self.glob, self.rate, self.rate, now):
+            return self._throttle(profile, state, now)
+        if profile.rate and not self._pace(state, profile.rate, profile.burst, now):
+            return self._throttle(profile, state, now)
+        if profile.concurrency is not None and state.active >= profile.concurrency:
+            return self._throttle(profile, state, now)
+
+        state.active += 1
+        try:
+            await asyncio.sleep(profile.delay(self.rng))
+        finally:
+            state.active -= 1
+
+        if self.rng.random() < profile.error_rate:
+            state.errors += 1
+            return JSONResponse({"error": "Service Unavailable", "statusCode": 503}, status_code=503)
+
+        if profile.gzip:
+            return Response(
+                content=compressed(profile.size),
+                media_type="application/json",
+                headers={"Content-Encoding": "gzip"},
+            )
+        return Response(content=payload(profile.size), media_type="application/json")
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            pattern: {"requests": state.requests, "throttled": state.throttled, "errors": state.errors}
+            for pattern, state in self.states.items()
+        }
+
+    def app(self) -> FastAPI:
+        app = FastAPI(title="IBKR Mock Upstream")
+
+        @app.get("/mock/stats")  # type: ignore[untyped-decorator, unused-ignore]
+        async def stats() -> dict[str, Any]:
+            return self.stats()
+
+        @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])  # type: ignore[untyped-decorator, unused-ignore]
+        async def upstream(path: str, request: Request) -> Response:
+            logging.debug(f"Mock: {request.method} /{path}")
+            return await self.handle(request.method, "/" + path)
+
+        return app
@@ -16,3 +16,98 @@ class Uptime(BaseModel):
     started: datetime = Field(..., description="The UTC timestamp when the server started.")
     uptime_seconds: float = Field(..., description="The number of seconds since the server started.")
     uptime_human: str = Field(..., description="Human-readable uptime string.")
+
+
+class JournalMetrics(BaseModel):
+    overflow: str = Field(..., description="Policy applied when the journal queue is full.")
+    queued: int = Field(..., description="Number of records waiting to be written.")
+    capacity: int = Field(..., description="Maximum number of records waiting to be written.")
+    submitted: int = Field(..., description="Number of records submitted.")
+    written: int = Field(..., description="Number of records written.")
+    dropped: int = Field(..., description="Number of records dropped because the queue was full.")
+    failed: int = Field(..., description="Number of records that could not be written.")
+    latency_last: float = Field(..., description="Duration (seconds) of the latest batch write.")
+    latency_mean: float = Field(..., description="Mean duration (seconds) of batch writes.")
+    latency_max: float = Field(..., description="Maximum duration (seconds) of batch writes.")
+
+
+class CacheMetrics(BaseModel):
+    entries: int = Field(..., description="Number of cached responses.")
+    size: int = Field(..., description="Total size (bytes) of cached responses.")
+    capacity: int = Field(..., description="Maximum total size (bytes) of cached responses.")
+    hits: int = Field(..., description="Number of requests answered with a fresh cached response.")
+    stale: int = Field(..., description="Number of requests answered with a stale cached response.")
+    misses: int = Field(..., description="Number of cacheable requests sent upstream.")
+    evictions: int = Field(..., description="Number of responses evicted to stay within capacity.")
+    refreshes: int = Field(..., description="Number of background refreshes of stale responses.")
+
+
+class CoalesceMetrics(BaseModel):
+    requests: int = Field(..., description="Number of coalescable requests.")
+    coalesced: int = Field(..., description="Number of requests that shared another request's upstream response.")
+    inflight: int = Field(..., description="Number of distinct requests currently in flight.")
+    routes: dict[str, int] = Field(..., description="Number of coalesced requests per route pattern.")
+
+
+class BatchMetrics(BaseModel):
+    window: float = Field(..., description="Time (seconds) that a snapshot batch stays open.")
+    requests: int = Field(..., description="Number of snapshot requests.")
+    batches: int = Field(..., description="Number of upstream snapshot requests.")
+    pending: int = Field(..., description="Number of requests in the open batch.")
+
+
+class RateMetrics(BaseModel):
+    rate: float | None = Field(..., description="Global request rate (requests per second).")
+    queued: int = Field(..., description="Number of requests waiting for a rate limit slot.")
+    waiting: dict[str, int] = Field(..., description="Number of requests waiting in each priority class.")
+    granted: dict[str, int] = Field(
+        ..., description="Number of global rate limit slots granted to each priority class."
+    )
+    waited: int = Field(..., description="Number of requests that had to wait for a rate limit slot.")
+    wait_mean: float = Field(..., description="Mean wait (seconds) of requests that had to wait.")
+    wait_max: float = Field(..., description="Longest wait (seconds) for a rate limit slot.")
+    limit: float = Field(..., description="Current global rate limit (requests per second).")
+    throttled: int = Field(..., description="Number of upstream responses that were throttled (429).")
+    reduced: dict[str, float] = Field(
+        ..., description="Current rate limit (requests per second) of limits cut below their configured rate."
+    )
+
+
+class ConcurrencyMetrics(BaseModel):
+    limit: int = Field(..., description="Current limit on concurrent upstream requests.")
+    inflight: int = Field(..., description="Number of upstream requests in flight.")
+    queued: int = Field(..., description="Number of requests waiting for an upstream slot.")
+    requests: int = Field(..., description="Number of upstream requests.")
+    waited: int = Field(..., description="Number of requests that had to wait for an upstream slot.")
+    rtt: float | None = Field(..., description="Recent upstream round trip time (seconds).")
+    rtt_long: float | None = Field(..., description="Long term average upstream round trip time (seconds).")
+
+
+class PhaseMetrics(BaseModel):
+    requests: int = Field(..., description="Number of upstream requests.")
+    connections: int = Field(..., description="Number of requests that opened a new connection.")
+    pool: float = Field(..., description="Mean wait (seconds) for a connection from the pool.")
+    connect: float = Field(..., description="Mean time (seconds) opening connections (DNS and TCP).")
+    tls: float = Field(..., description="Mean time (seconds) in TLS handshakes.")
+    send: float = Field(..., description="Mean time (seconds) sending requests.")
+    server: float = Field(..., description="Mean wait (seconds) for response headers (upstream processing time).")
+    receive: float = Field(..., description="Mean time (seconds) reading response bodies.")
+
+
+class PoolMetrics(BaseModel):
+    connections: int | None = Field(..., description="Number of upstream connections (null if unavailable).")
+    active: int | None = Field(..., description="Number of connections handling requests (null if unavailable).")
+    idle: int | None = Field(..., description="Number of idle connections (null if unavailable).")
+    inflight: int = Field(..., description="Number of upstream requests in progress.")
+    waiting: int = Field(..., description="Number of upstream requests waiting for a connection.")
+    endpoints: dict[str, PhaseMetrics] = Field(..., description="Mean phase timings, keyed by route template.")
+
+
+class ClientMetrics(BaseModel):
+    weight: float = Field(..., description="Share of rate limit slots when clients are competing.")
+    quota: float | None = Field(..., description="Quota (requests per second) or null if there's no quota.")
+    requests: int = Field(..., description="Number of rate limited requests.")
+    waited: int = Field(..., description="Number of requests that had to wait for a rate limit slot.")
+    wait_mean: float = Field(..., description="Mean wait (seconds) of requests that had to wait.")
+    wait_max: float = Field(..., description="Longest wait (seconds) for a rate limit slot.")
+    last: datetime = Field(..., description="Time of the last request.")
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import time
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpcore
+import httpx
+
+from . import rate
+from .const import PREWARM_MAXIMUM, PREWARM_TIMEOUT, RATE_HISTORY
+from .models import PhaseMetrics, PoolMetrics
+from .rate import Priority, adapt, enforce_rate_limit
+
+# Phases of an upstream request.
+PHASES = ("pool", "connect", "tls", "send", "server", "receive")
+
+# Trace events that show that a request has been given a connection.
+_CONNECTED = ("connect_tcp.started", "send_connection_init.started", "send_request_headers.started")
+
+
+class Trace:
+    """
+    Phase timings for an upstream request.
+
+    This is a callback for the httpcore trace extension (pass {"trace": trace}
+    as the request extensions). The phases are:
+
+    - pool: waiting for a connection from the pool;
+    - connect: opening a new connection (DNS and TCP);
+    - tls: TLS handshake;
+    - send: sending the request;
+    - server: waiting for the response headers (upstream processing time); and
+    - receive: reading the response body.
+
+    Phases that don't happen (for example connect and tls when a connection is
+    reused) are zero.
+    """
+
+    __slots__ = ("route", "start", "marks", "phases")
+
+    def __init__(self, route: str):
+        self.route = route
+        self.start = time.perf_counter()
+        # Time of the first occurrence of each event.
+        self.marks: dict[str, float] = {}
+        self.phases: dict[str, float] | None = None
+        _traces.add(self)
+
+    async def __call__(self, event: str, info: dict[str, Any]) -> None:
+        # Event names are "<prefix>.<name>.<stage>" (for example "http11.send_request_headers.started").
+        self.marks.setdefault(event.partition(".")[2], time.perf_counter())
+
+    @property
+    def connected(self) -> bool:
+        return any(event in self.marks for event in _CONNECTED)
+
+    def _span(self, start: str, end: str) -> float:
+        if start in self.marks and end in self.marks:
+            return max(self.marks[end] - self.marks[start], 0.0)
+        return 0.0
+
+    def close(self) -> dict[str, float]:
+        """
+        Finish the trace and add the phase timings to the totals for the endpoint.
+
+        Can be called more than once.
+
+        Returns:
+            Duration (seconds) of each phase.
+        """
+        if self.phases is None:
+            _traces.discard(self)
+            connected = [self.marks[event] for event in _CONNECTED if event in self.marks]
+            self.phases = {
+                "pool": min(connected) - self.start if connected else 0.0,
+                "connect": self._span("connect_tcp.started", "connect_tcp.complete"),
+                "tls": self._span("start_tls.started", "start_tls.complete"),
+                "send": self._span("send_request_headers.started", "send_request_body.complete"),
+                "server": self._span("send_request_body.complete", "receive_response_headers.complete"),
+                "receive": self._span("receive_response_body.started", "receive_response_body.complete"),
+            }
+            if (stats := _stats.get(self.route)) is None:
+                stats = _stats[self.route] = _PhaseStats()
+            stats.add(self.phases, "connect_tcp.started" in self.marks)
+        return self.phases
+
+
+class _PhaseStats:
+    __slots__ = ("requests", "connections", "totals", "last")
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self.last = time.time()
+
+    def add(self, phases: dict[str, float], connected: bool) -> None:
+        self.requests += 1
+        self.last = time.time()
+        self.connections += connected
+        for phase, duration in phases.items():
+            self.totals[phase] += duration
+
+    def metrics(self) -> PhaseMetrics:
+        return PhaseMetrics(
+            requests=self.requests,
+            connections=self.connections,
+            **{phase: total / self.requests for phase, total in self.totals.items()},
+        )
+
+
+# Traces of requests in progress.
+_traces: set[Trace] = set()
+# Phase totals for each endpoint (route template).
+_stats: dict[str, _PhaseStats] = {}
+
+
+def clear() -> None:
+    _stats.clear()
+
+
+def prune(now: float | None = None) -> None:
+    """
+    Remove endpoints without any requests in the rate history.
+    """
+    if now is None:
+        now = time.time()
+
+    for route in [route for route, stats in _stats.items() if now - stats.last > RATE_HISTORY]:
+        logging.debug("Prune phase stats (%s).", route)
+        del _stats[route]
+
+
+def phases() -> dict[str, PhaseMetrics]:
+    """
+    Mean phase timings for each endpoint.
+    """
+    return {route: stats.metrics() for route, stats in _stats.items()}
+
+
+def _connections(client: httpx.AsyncClient | None) -> list[httpcore.AsyncConnectionInterface] | None:
+    """
+    Open connections in the upstream connection pool.
+    """
+    # The connection pool isn't part of the public httpx API, so it might not be
+    # available (for example with a mock transport).
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if not isinstance(pool, httpcore.AsyncConnectionPool):
+        return None
+    # Closed connections are removed by the pool when it's next used.
+    return [connection for connection in pool.connections if not connection.is_closed()]
+
+
+def pool_metrics(client: httpx.AsyncClient | None) -> PoolMetrics:
+    """
+    Connection pool gauges and phase timings.
+    """
+    connections = _connections(client)
+    idle = sum(connection.is_idle() for connection in connections) if connections is not None else None
+    waiting = sum(not trace.connected for trace in _traces)
+    return PoolMetrics(
+        connections=len(connections) if connections is not None else None,
+        active=len(connections) - idle if connections is not None and idle is not None else None,
+        idle=idle,
+        inflight=len(_traces),
+        waiting=waiting,
+        endpoints=phases(),
+    )
+
+
+async def close_idle(client: httpx.AsyncClient | None) -> int:
+    """
+    Close idle upstream connections (for example before prewarming after a reset,
+    so that fresh connections are opened rather than reusing the old ones).
+
+    Returns:
+        The number of connections closed.
+    """
+    closed = 0
+    for connection in _connections(client) or []:
+        # Check again because other requests can run while a connection is closing.
+        if connection.is_idle():
+            await connection.aclose()
+            closed += 1
+    if closed:
+        logging.info(f"🧹 Closed {closed} idle upstream connections.")
+    return closed
+
+
+async def prewarm(client: httpx.AsyncClient, url: str, connections: int) -> int:
+    """
+    Open upstream connections before requests arrive.
+
+    Concurrent HEAD requests to the upstream base URL make the client open (and
+    complete the TLS handshake for) this many connections, which are then kept
+    alive in the pool. With HTTP/2 a single connection is enough because
+    requests are multiplexed over it.
+
+    The requests count against the global rate limit (at low priority) like any
+    other upstream request, and at most PREWARM_MAXIMUM connections are opened,
+    so prewarming doesn't use up the burst allowance.
+
+    Args:
+        client: Upstream client.
+        url: Upstream base URL.
+        connections: Number of connections to open.
+
+    Returns:
+        The number of connections opened.
+    """
+
+    if connections > PREWARM_MAXIMUM:
+        logging.warning(f"🚨 Open at most {PREWARM_MAXIMUM} upstream connections (not {connections}).")
+        connections = PREWARM_MAXIMUM
+    route = urlsplit(url).path or "/"
+
+    async def _head() -> bool:
+        await enforce_rate_limit("prewarm", priority=Priority.LOW)
+        await rate.record(route)
+        try:
+            response = await client.head(url, timeout=PREWARM_TIMEOUT)
+        except Exception as error:
+            logging.debug(f"Prewarm request failed: {error!r}")
+            return False
+        adapt(route, response.status_code, response.headers)
+        return True
+
+    start = time.perf_counter()
+    opened = sum(await asyncio.gather(*(_head() for _ in range(connections))))
+    duration = time.perf_counter() - start
+
+    if opened < connections:
+        logging.warning(f"🚨 Opened {opened} of {connections} upstream connections ({url}).")
+    else:
+        logging.info(f"🔥 Opened {opened} upstream connections in {duration:.3f} s ({url}).")
+    return opened
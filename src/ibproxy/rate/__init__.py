@@ -1,15 +1,42 @@
-from .limit import enforce_rate_limit
-from .log import DEFAULT_WINDOW, latest, log, rate, rate_loop, record, times
+from .client import Client, clients, get_client, identify
+from .concurrency import AdaptiveLimit
+from .limit import (
+    adapt,
+    concurrency_limit,
+    enforce_rate_limit,
+    granted,
+    queue,
+    snapshot,
+    waiting,
+)
+from .log import DEFAULT_WINDOW, clear, count, ewma, latest, log, rate, rate_loop, record, series
+from .priority import Priority, priority
 
 WINDOW = DEFAULT_WINDOW
 
 __all__ = [
+    "AdaptiveLimit",
+    "adapt",
+    "Client",
+    "clear",
+    "clients",
+    "concurrency_limit",
+    "count",
     "enforce_rate_limit",
+    "ewma",
+    "get_client",
+    "granted",
+    "identify",
     "latest",
     "log",
+    "Priority",
+    "priority",
+    "queue",
     "rate",
     "rate_loop",
     "record",
-    "times",
+    "series",
+    "snapshot",
+    "waiting",
     "WINDOW",
 ]
@@ -0,0 +1,97 @@
+import hashlib
+import logging
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+
+from ..const import CLIENT_HEADER, CLIENT_KEY_HEADER, CLIENT_RULES, RATE_HISTORY
+from .limit import LeakyBucket
+
+
+@dataclass
+class Client:
+    """
+    A consumer of the proxy, with its share of the rate limit, quota and usage.
+    """
+
+    name: str
+    # Share of rate limit slots when clients are competing.
+    weight: float = 1.0
+    # Quota. Requests wait for a slot in this bucket as well as the global bucket.
+    bucket: LeakyBucket | None = None
+    # Usage counters.
+    requests: int = 0
+    waited: int = 0
+    total: float = 0.0
+    longest: float = 0.0
+    last: float = field(default_factory=time.time)
+
+    @classmethod
+    def from_rules(cls, name: str, rules: list[tuple[str, float, float | None, float | None]]) -> "Client":
+        """
+        Create a client using the first matching rule.
+        """
+        for pattern, weight, rate, burst in rules:
+            if fnmatch(name, pattern):
+                return cls(name, weight, LeakyBucket(rate, burst or 1) if rate else None)
+        return cls(name)
+
+    def add(self, wait_time: float) -> None:
+        self.requests += 1
+        self.last = time.time()
+        if wait_time:
+            self.waited += 1
+            self.total += wait_time
+            self.longest = max(self.longest, wait_time)
+
+
+# Clients seen since startup.
+_clients: dict[str, Client] = {}
+
+
+def identify(headers: dict[str, str], address: str | None) -> str:
+    """
+    Identify the client sending a request.
+
+    Uses the client header, then the API key header (hashed so that it isn't
+    exposed) and finally the source address.
+
+    Args:
+        headers: Request headers (lower case names).
+        address: Source address.
+    """
+    if name := headers.get(CLIENT_HEADER.lower(), "").strip():
+        return name
+    if key := headers.get(CLIENT_KEY_HEADER.lower(), "").strip():
+        return "key:" + hashlib.sha256(key.encode()).hexdigest()[:12]
+    return address or "unknown"
+
+
+def get_client(name: str) -> Client:
+    """
+    Get a client by name (created on first use).
+    """
+    if (found := _clients.get(name)) is None:
+        found = _clients[name] = Client.from_rules(name, CLIENT_RULES)
+    return found
+
+
+def clients() -> list[Client]:
+    return list(_clients.values())
+
+
+def prune(now: float | None = None) -> None:
+    """
+    Remove clients without any requests in the rate history (unless they have requests waiting).
+    """
+    if now is None:
+        now = time.time()
+
+    for name, client in list(_clients.items()):
+        if client.bucket is not None:
+            if client.bucket.queued:
+                continue
+            client.bucket.prune()
+        if now - client.last > RATE_HISTORY:
+            logging.debug("Prune client (%s).", name)
+            del _clients[name]
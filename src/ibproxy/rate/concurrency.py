@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass
+
+from ..const import (
+    CONCURRENCY_INITIAL,
+    CONCURRENCY_MAX,
+    CONCURRENCY_MIN,
+    CONCURRENCY_SMOOTHING,
+    CONCURRENCY_TOLERANCE,
+    CONCURRENCY_WINDOW,
+)
+from ..models import ConcurrencyMetrics
+
+
+@dataclass
+class AdaptiveLimit:
+    """
+    Adaptive limit on the number of concurrent upstream requests.
+
+    The limit is sized from measured round trip times (RTTs) using a gradient
+    algorithm. The gradient is the ratio of the long term RTT (an average over
+    many requests) to the short term RTT. When upstream slows down the gradient
+    drops below one and the limit shrinks. When latency is stable the limit grows
+    by a headroom of sqrt(limit), but only if the limit is actually being used.
+
+    Requests beyond the limit wait (first in, first out) for a request to finish.
+    """
+
+    initial: int = CONCURRENCY_INITIAL
+    minimum: int = CONCURRENCY_MIN
+    maximum: int = CONCURRENCY_MAX
+    # Ratio of short term to long term RTT that's tolerated before the limit shrinks.
+    tolerance: float = CONCURRENCY_TOLERANCE
+    # Weight of each new limit estimate.
+    smoothing: float = CONCURRENCY_SMOOTHING
+    # Number of requests in the long term RTT average.
+    window: int = CONCURRENCY_WINDOW
+
+    def __post_init__(self) -> None:
+        self.limit = float(self.initial)
+        self.inflight = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+        # Short and long term RTT (seconds).
+        self.short: float | None = None
+        self.long: float | None = None
+        self.requests = 0
+        self.waited = 0
+
+    async def acquire(self) -> None:
+        """
+        Wait for a slot. Each slot must be released.
+        """
+        self.requests += 1
+        if self.inflight < int(self.limit) and not self.waiters:
+            self.inflight += 1
+            return
+
+        self.waited += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        try:
+            # The slot is handed over by the request that releases it.
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                if future in self.waiters:
+                    self.waiters.remove(future)
+            else:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.waiters and self.inflight < int(self.limit):
+            future = self.waiters.popleft()
+            # Skip requests that were cancelled while waiting.
+            if not future.done():
+                self.inflight += 1
+                future.set_result(None)
+
+    def sample(self, rtt: float) -> None:
+        """
+        Update the limit from a measured round trip time (seconds).
+        """
+        if self.short is None or self.long is None:
+            self.short = self.long = rtt
+        else:
+            self.short = (self.short + rtt) / 2
+            self.long += (rtt - self.long) / self.window
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long / self.short)) if self.short else 1.0
+        if gradient == 1.0 and self.inflight < self.limit / 2:
+            # Don't grow a limit that isn't being used.
+            return
+
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        limit = min(self.maximum, max(self.minimum, (1 - self.smoothing) * self.limit + self.smoothing * estimate))
+        if int(limit) != int(self.limit):
+            logging.debug(f"🚦 Upstream concurrency limit: {int(limit)} (RTT {self.short:.3f} s).")
+        self.limit = limit
+        self._wake()
+
+    def metrics(self) -> ConcurrencyMetrics:
+        return ConcurrencyMetrics(
+            limit=int(self.limit),
+            inflight=self.inflight,
+            queued=sum(not future.done() for future in self.waiters),
+            requests=self.requests,
+            waited=self.waited,
+            rtt=self.short,
+            rtt_long=self.long,
+        )
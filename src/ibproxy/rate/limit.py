@@ -1,9 +1,48 @@
 import asyncio
+import heapq
+import itertools
 import logging
 import time
-from threading import RLock
+from collections import Counter, deque
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import TYPE_CHECKING
 
-from ..const import RATE_LIMIT, RATE_LIMIT_BURST
+from ..const import (
+    PRIORITY_SHARES,
+    PRIORITY_WINDOW,
+    RATE_COOLDOWN,
+    RATE_DECREASE,
+    RATE_FLOOR,
+    RATE_INCREASE,
+    RATE_LIMIT,
+    RATE_LIMIT_BURST,
+    RATE_RULES,
+)
+from ..util import retry_after
+from .priority import Priority
+
+if TYPE_CHECKING:
+    from .client import Client
+
+# Request waiting for a slot: finish tag, arrival order and future.
+Waiter = tuple[float, int, asyncio.Future[None]]
+
+
+@dataclass(frozen=True)
+class BucketSnapshot:
+    """
+    State of a bucket at a point in time.
+    """
+
+    rate: float
+    ceiling: float
+    burst: float
+    tokens: float
+    waiting: int
+    throttled: int
 
 
 class LeakyBucket:
@@ -13,21 +52,200 @@ class LeakyBucket:
     Uses a token-bucket algorithm where tokens are generated at a fixed rate.
     Each request consumes one token. If no tokens are available, the the request is rate-limited.
     Supports burst capacity to allow temporary spikes above the sustained rate.
+
+    The rate adapts to upstream throttling: it's cut multiplicatively when requests
+    are throttled and recovers additively with each successful response, up to the
+    configured rate (ceiling).
+
+    A bucket belongs to the event loop. State is only changed between awaits, so
+    no locks are needed. Readers should use snapshot().
     """
 
-    def __init__(self, rate: float, burst: float):
+    def __init__(self, rate: float, burst: float, shares: dict[str, float] | None = None):
         """
         Initialize the leaky bucket.
 
         Args:
             rate: Refill rate (requests per second)
             burst: Maximum tokens available (burst capacity)
+            shares: Minimum share of recent slots for each priority class (default: PRIORITY_SHARES)
         """
         self.rate = rate
+        self.ceiling = rate
         self.burst = burst
         self.tokens = burst
-        self.last_refill = time.time()
-        self.lock = RLock()
+        self.last_refill = time.monotonic()
+        self.shares = {Priority(k): v for k, v in (PRIORITY_SHARES if shares is None else shares).items()}
+        # Requests waiting for a slot in each priority class. Each is a heap ordered by
+        # finish tag (weighted fair queueing across clients) and then arrival.
+        self.queues: dict[Priority, list[Waiter]] = {priority: [] for priority in Priority}
+        self.queued = 0
+        self.arrivals = itertools.count()
+        # Virtual time (finish tag of the last slot granted) and last finish tag for each client.
+        self.virtual = 0.0
+        self.finish: dict[str, float] = {}
+        # Priority classes of recent slots.
+        self.recent: deque[Priority] = deque(maxlen=PRIORITY_WINDOW)
+        self.granted: Counter[Priority] = Counter()
+        self.timer: asyncio.TimerHandle | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # Number of throttled responses and time (monotonic) of the last rate cut.
+        self.throttled = 0
+        self.cut = -float("inf")
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+
+        # Calculate tokens generated since last refill.
+        elapsed = now - self.last_refill
+        refill = elapsed * self.rate
+
+        # Add generated tokens (capped at burst).
+        self.tokens = min(self.burst, self.tokens + refill)
+        self.last_refill = now
+
+    def waiting(self) -> int:
+        return self.queued
+
+    def _grant(self, priority: Priority) -> None:
+        self.tokens -= 1
+        self.recent.append(priority)
+        self.granted[priority] += 1
+
+    def _next(self) -> Priority | None:
+        """
+        Choose the priority class for the next slot.
+
+        This is the highest class with requests waiting, unless a lower class with
+        requests waiting has had less than its minimum share of recent slots.
+        """
+        waiting = [priority for priority in Priority if self.queues[priority]]
+        for priority in waiting:
+            if self.recent.count(priority) < self.shares.get(priority, 0) * len(self.recent):
+                return priority
+        return waiting[0] if waiting else None
+
+    def _schedule(self) -> None:
+        """
+        Dispatch waiting requests when the next token is available.
+        """
+        loop = asyncio.get_running_loop()
+        if self.timer is not None and self.loop is not loop:
+            # Left over from another event loop.
+            self.timer.cancel()
+            self.timer = None
+        if self.timer is None and self.waiting():
+            delay = max(1 - self.tokens, 0.0) / self.rate
+            self.timer = loop.call_later(delay, self._dispatch)
+            self.loop = loop
+
+    def _dispatch(self) -> None:
+        self.timer = None
+        self._refill()
+        while self.tokens >= 1 and (priority := self._next()) is not None:
+            tag, _, future = heapq.heappop(self.queues[priority])
+            self.queued -= 1
+            # Skip requests that were cancelled while waiting.
+            if not future.done():
+                self._grant(priority)
+                self.virtual = max(self.virtual, tag)
+                future.set_result(None)
+        self._schedule()
+
+    async def slot(self, priority: Priority = Priority.NORMAL, client: str = "", weight: float = 1.0) -> float:
+        """
+        Wait for a slot (one token).
+
+        Requests are granted slots in order of priority. Within a priority class,
+        slots are shared between clients in proportion to their weights (weighted
+        fair queueing) and a client's requests are granted in order of arrival.
+        Each waiting request is woken once, when its slot is granted.
+
+        Args:
+            priority: Priority class.
+            client: Client name.
+            weight: Client weight.
+
+        Returns:
+            Time (seconds) waited.
+        """
+        self._refill()
+        if self.tokens >= 1 and not self.queued:
+            self._grant(priority)
+            return 0.0
+
+        future = asyncio.get_running_loop().create_future()
+        tag = max(self.virtual, self.finish.get(client, 0.0)) + 1 / weight
+        self.finish[client] = tag
+        heapq.heappush(self.queues[priority], (tag, next(self.arrivals), future))
+        self.queued += 1
+        self._schedule()
+
+        start = time.monotonic()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                queue = self.queues[priority]
+                remaining = [waiter for waiter in queue if waiter[2] is not future]
+                self.queued -= len(queue) - len(remaining)
+                queue[:] = remaining
+                heapq.heapify(queue)
+            else:
+                # Slot was granted but won't be used.
+                self.tokens = min(self.burst, self.tokens + 1)
+            raise
+        return time.monotonic() - start
+
+    def prune(self) -> None:
+        """
+        Remove finish tags of clients that are idle.
+
+        A tag that isn't ahead of virtual time has no effect on scheduling, so the
+        client can be dropped and it will get the same tag when it next waits.
+        """
+        for client in [client for client, tag in self.finish.items() if tag <= self.virtual]:
+            del self.finish[client]
+
+    def throttle(self, delay: float | None = None) -> None:
+        """
+        React to a throttled request.
+
+        Cuts the rate (unless it was cut recently) and drops the burst. If a delay
+        is given (Retry-After) then no slots are granted until it has elapsed.
+        """
+        self._refill()
+        self.throttled += 1
+        now = time.monotonic()
+        if now - self.cut >= RATE_COOLDOWN:
+            self.rate = max(self.ceiling * RATE_FLOOR, self.rate * RATE_DECREASE)
+            self.cut = now
+        if delay:
+            self.tokens = min(self.tokens, 1 - delay * self.rate)
+        else:
+            self.tokens = min(self.tokens, 0)
+
+    def recover(self) -> None:
+        """
+        Increase the rate (up to the ceiling) after a successful request.
+        """
+        if self.rate < self.ceiling:
+            self._refill()
+            self.rate = min(self.ceiling, self.rate + self.ceiling * RATE_INCREASE)
+
+    def snapshot(self) -> "BucketSnapshot":
+        """
+        Current state, without changing it.
+        """
+        elapsed = time.monotonic() - self.last_refill
+        return BucketSnapshot(
+            rate=self.rate,
+            ceiling=self.ceiling,
+            burst=self.burst,
+            tokens=min(self.burst, self.tokens + elapsed * self.rate),
+            waiting=self.queued,
+            throttled=self.throttled,
+        )
 
     async def acquire(self, tokens: float = 1.0) -> tuple[bool, float]:
         """
@@ -41,46 +259,199 @@ class LeakyBucket:
             - acquired: True if tokens were available, False if rate-limited;
             - wait_time: Seconds to wait before retry if rate-limited, else 0.
         """
-        with self.lock:
-            now = time.time()
+        self._refill()
 
-            # Calculate tokens generated since last refill.
-            elapsed = now - self.last_refill
-            refill = elapsed * self.rate
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            logging.debug(f"⏳ Rate limit: acquired {tokens}, {self.tokens:.2f} remaining.")
+            return True, 0.0
+        else:
+            tokens_needed = tokens - self.tokens
+            wait_time = tokens_needed / self.rate
+            logging.debug(f"⏳ Rate limit: insufficient tokens (wait {wait_time:.3f} s).")
+            return False, wait_time
 
-            # Add generated tokens (capped at burst).
-            self.tokens = min(self.burst, self.tokens + refill)
-            self.last_refill = now
 
-            if self.tokens >= tokens:
-                self.tokens -= tokens
-                logging.debug(f"⏳ Rate limit: acquired {tokens}, {self.tokens:.2f} remaining.")
-                return True, 0.0
-            else:
-                tokens_needed = tokens - self.tokens
-                wait_time = tokens_needed / self.rate
-                logging.debug(f"⏳ Rate limit: insufficient tokens (wait {wait_time:.3f} s).")
-                return False, wait_time
+@dataclass
+class Limit:
+    """
+    Pacing and concurrency limits for endpoints matching a path pattern.
+    """
+
+    pattern: str
+    bucket: LeakyBucket | None = None
+    semaphore: asyncio.Semaphore | None = None
+
+    @classmethod
+    def from_rule(cls, pattern: str, rate: float | None, burst: float | None, concurrency: int | None) -> "Limit":
+        return cls(
+            pattern=pattern,
+            bucket=LeakyBucket(rate, burst or 1) if rate else None,
+            semaphore=asyncio.Semaphore(concurrency) if concurrency else None,
+        )
 
 
 # Global leaky bucket instance
 _bucket = LeakyBucket(RATE_LIMIT, RATE_LIMIT_BURST)
 
+# Endpoint limits. These apply in addition to the global limit.
+_limits = [Limit.from_rule(*rule) for rule in RATE_RULES]
+
+
+def prune() -> None:
+    """
+    Remove finish tags of idle clients from the global and endpoint buckets.
+    """
+    for bucket in [_bucket, *(limit.bucket for limit in _limits)]:
+        if bucket is not None:
+            bucket.prune()
+
+
+def match(path: str) -> Limit | None:
+    """
+    Get the limit for an endpoint (first matching pattern).
+    """
+    for limit in _limits:
+        if fnmatch(path, limit.pattern):
+            return limit
+    return None
+
+
+@asynccontextmanager
+async def concurrency_limit(path: str) -> AsyncIterator[None]:
+    """
+    Hold a slot for a request to an endpoint with a concurrency limit.
+
+    Waits for a slot if all are in use. Does nothing for other endpoints.
+    """
+    limit = match(path)
+    if limit is None or limit.semaphore is None:
+        yield
+        return
+
+    if limit.semaphore.locked():
+        logging.warning(f"⏳ Concurrency limit reached for {limit.pattern}.")
+    async with limit.semaphore:
+        yield
+
+
+@dataclass
+class Queue:
+    """
+    Statistics for requests that waited for rate limit slots.
+    """
+
+    # Number of requests that had to wait.
+    waited: int = 0
+    # Total and maximum time (seconds) waited.
+    total: float = 0.0
+    longest: float = 0.0
+
+    def add(self, wait_time: float) -> None:
+        self.waited += 1
+        self.total += wait_time
+        self.longest = max(self.longest, wait_time)
+
 
-async def enforce_rate_limit(id: str) -> None:
+_queue = Queue()
+
+
+async def enforce_rate_limit(
+    id: str,
+    path: str | None = None,
+    priority: Priority = Priority.NORMAL,
+    client: "Client | None" = None,
+) -> None:
     """
-    Enforce the global rate limit using the leaky bucket algorithm.
+    Enforce the client, endpoint and global rate limits using the leaky bucket algorithm.
+
+    Each request waits for a slot in each relevant bucket. Slots are granted by
+    priority class and then shared fairly between clients. The client quota slot
+    is obtained first, then the endpoint slot and finally the global slot, so
+    requests waiting for a quota or a slow endpoint don't hold global slots that
+    other requests could use.
 
-    This function blocks until a token is available, implementing backpressure
-    for requests that exceed the sustained rate limit.
+    Args:
+        id: Request ID.
+        path: URL path. Endpoint limits are only applied if given.
+        priority: Priority class.
+        client: Client sending the request.
 
     Raises:
-        No exceptions, but will sleep as needed to enforce the rate limit.
+        No exceptions, but will wait as needed to enforce the rate limit.
+    """
+    limit = match(path) if path else None
+    buckets = [_bucket] if limit is None or limit.bucket is None else [limit.bucket, _bucket]
+    if client and client.bucket:
+        buckets.insert(0, client.bucket)
+    name, weight = (client.name, client.weight) if client else ("", 1.0)
+
+    waited = 0.0
+    for bucket in buckets:
+        waited += await bucket.slot(priority, name, weight)
+
+    if client:
+        client.add(waited)
+    if waited:
+        logging.warning(f"⏳ [{id}] Rate limit exceeded (waited {waited:.3f} s, {priority.value} priority).")
+        _queue.add(waited)
+
+
+def adapt(path: str, status_code: int, headers: Mapping[str, str]) -> None:
+    """
+    Adapt the rate limits to an upstream response.
+
+    Throttled (429) responses cut the rate of the endpoint bucket (if the endpoint
+    has its own limit) or the global bucket and honour Retry-After. Successful
+    responses let the rates recover.
+
+    Args:
+        path: URL path.
+        status_code: Upstream status code.
+        headers: Upstream response headers.
+    """
+    limit = match(path)
+    bucket = limit.bucket if limit and limit.bucket else _bucket
+    if status_code == 429:
+        delay = retry_after(headers.get("retry-after"))
+        bucket.throttle(delay)
+        logging.warning(
+            f"🐢 Upstream throttled {path}: rate limit now {bucket.rate:.3g} req/s"
+            + (f" (retry after {delay:.0f} s)." if delay else ".")
+        )
+    elif status_code < 400:
+        bucket.recover()
+        if bucket is not _bucket:
+            _bucket.recover()
+
+
+def queue() -> Queue:
+    return _queue
+
+
+def waiting() -> Counter[Priority]:
+    """
+    Number of requests waiting for rate limit slots in each priority class.
+    """
+    counts: Counter[Priority] = Counter()
+    for bucket in [_bucket, *(limit.bucket for limit in _limits if limit.bucket)]:
+        for priority, queue in bucket.queues.items():
+            counts[priority] += len(queue)
+    return counts
+
+
+def granted() -> Counter[Priority]:
+    """
+    Number of global rate limit slots granted to each priority class.
     """
-    acquired, wait_time = await _bucket.acquire(tokens=1.0)
+    return Counter(_bucket.granted)
 
-    if not acquired:
-        logging.warning(f"⏳ [{id}] Rate limit exceeded (wait {wait_time:.3f} s).")
-        await asyncio.sleep(wait_time)
-        # Recursively call to acquire after waiting.
-        await enforce_rate_limit(id)
+
+def snapshot() -> dict[str, BucketSnapshot]:
+    """
+    State of the global bucket ("*") and endpoint buckets.
+    """
+    return {
+        "*": _bucket.snapshot(),
+        **{limit.pattern: limit.bucket.snapshot() for limit in _limits if limit.bucket},
+    }
@@ -1,18 +1,12 @@
 import asyncio
 import logging
+import math
 import time
-from collections import defaultdict, deque
+from collections.abc import Callable
 from datetime import UTC, datetime
-from threading import RLock
 
-from ..const import RATE_LOG_INTERVAL
-
-times: dict[str, deque[float]] = defaultdict(deque)
-
-# Use a re-entrant lock to allow functions that have acquired the lock to call
-# other functions that also acquire the lock.
-#
-lock = RLock()
+from ..const import RATE_EWMA, RATE_HISTORY, RATE_LOG_INTERVAL, RATE_RESOLUTION
+from . import client, limit
 
 # Sliding window in seconds used to compute rates. This value is exposed and
 # can be overridden via ibproxy.rate.WINDOW for tests.
@@ -34,27 +28,111 @@ def _window() -> float:
 # https://www.interactivebrokers.com/campus/ibkr-api-page/web-api-trading/#pacing-limitations-8.
 #
 # There's a global limit of 50 requests per second. However, there are specific
-# limits applied to some endpoints that are more restrictive.
+# limits applied to some endpoints that are more restrictive. These are enforced
+# locally using the rules in RATE_RULES (see ibproxy.rate.limit).
 
-# TODO: Could we use https://github.com/ZhuoZhuoCrayon/throttled-py?
 
+class Series:
+    """
+    Request counts in fixed time slots, stored in a ring buffer.
 
-async def prune(queue: deque[float] | None = None, now: float | None = None) -> None:
+    Each slot covers RATE_RESOLUTION seconds and records the number of requests
+    and the first and last request times. The ring covers RATE_HISTORY seconds,
+    so memory is bounded however many requests there are. Counts over a window
+    are accurate to within one slot.
+
+    An exponentially weighted moving average (EWMA) of the rate is updated with
+    each request.
     """
-    Prune old timestamps from the deques.
 
-    Args:
-        dq (deque[float] | None): The deque to prune. If None, prunes all deques.
+    __slots__ = ("slots", "counts", "firsts", "lasts", "last", "ewma")
+
+    size = math.ceil(RATE_HISTORY / RATE_RESOLUTION) + 1
+
+    def __init__(self) -> None:
+        # Slot number (time / resolution) currently held in each position.
+        self.slots = [-1] * self.size
+        self.counts = [0] * self.size
+        self.firsts = [0.0] * self.size
+        self.lasts = [0.0] * self.size
+        # Latest request time.
+        self.last: float | None = None
+        # EWMA rate (requests per second) at the latest request time.
+        self.ewma = 0.0
+
+    def add(self, now: float) -> None:
+        slot = int(now // RATE_RESOLUTION)
+        i = slot % self.size
+        if self.slots[i] != slot:
+            # Reuse an expired slot.
+            self.slots[i] = slot
+            self.counts[i] = 0
+            self.firsts[i] = now
+        self.counts[i] += 1
+        self.lasts[i] = now
+
+        if self.last is not None:
+            self.ewma *= math.exp(-max(now - self.last, 0.0) / RATE_EWMA)
+        self.ewma += 1 / RATE_EWMA
+        self.last = now if self.last is None else max(self.last, now)
+
+    def window(self, window: float, now: float) -> tuple[int, float | None, float | None]:
+        """
+        Requests in the window ending now.
+
+        Returns:
+            Tuple of (count, first, last) where first and last are the first and last
+            request times (None if there are no requests).
+        """
+        start = int((now - min(window, RATE_HISTORY)) // RATE_RESOLUTION)
+        end = int(now // RATE_RESOLUTION)
+        count = 0
+        first = last = None
+        for slot in range(start, end + 1):
+            i = slot % self.size
+            if self.slots[i] == slot and self.counts[i]:
+                count += self.counts[i]
+                if first is None:
+                    first = self.firsts[i]
+                last = self.lasts[i]
+        return count, first, last
+
+    def rate(self, now: float) -> float:
+        """
+        EWMA rate (requests per second), decayed to now.
+        """
+        if self.last is None:
+            return 0.0
+        return self.ewma * math.exp(-max(now - self.last, 0.0) / RATE_EWMA)
+
+    def idle(self, now: float) -> bool:
+        return self.last is None or now - self.last > RATE_HISTORY
+
+
+# Counts for each endpoint and over all endpoints.
+series: dict[str, Series] = {}
+total = Series()
+
+
+def clear() -> None:
+    series.clear()
+    total.__init__()  # type: ignore[misc]
+
+
+def _series(endpoint: str | None) -> Series | None:
+    return total if endpoint is None else series.get(endpoint)
+
+
+async def prune(now: float | None = None) -> None:
+    """
+    Remove endpoints without any requests in the history.
     """
     if now is None:
         now = time.time()
 
-    with lock:
-        window = _window()
-        for dq in [queue] if queue else times.values():
-            while dq and dq[0] < now - window:
-                logging.debug("Prune timestamp (%.3f).", dq[0])
-                dq.popleft()
+    for endpoint in [endpoint for endpoint, counts in series.items() if counts.idle(now)]:
+        logging.debug("Prune endpoint (%s).", endpoint)
+        del series[endpoint]
 
 
 async def record(endpoint: str) -> datetime:
@@ -66,12 +144,10 @@ async def record(endpoint: str) -> datetime:
     """
     now = time.time()
 
-    with lock:
-        # Add the current time to the deque.
-        dq = times[endpoint]
-        dq.append(now)
-
-    await prune(dq, now)
+    if (counts := series.get(endpoint)) is None:
+        counts = series[endpoint] = Series()
+    counts.add(now)
+    total.add(now)
 
     return datetime.fromtimestamp(now, tz=UTC)
 
@@ -83,16 +159,36 @@ def latest(endpoint: str | None = None) -> float | None:
     Args:
         endpoint (str | None): The API endpoint to get the latest timestamp for. If None, gets the overall latest timestamp.
     """
-    with lock:
-        if endpoint is None:
-            # Consolidate times over all paths.
-            return max((dq[-1] for dq in times.values() if dq), default=None)
-        else:
-            dq = times[endpoint]
-            return dq[-1] if dq else None
+    counts = _series(endpoint)
+    return counts.last if counts else None
+
+
+def count(endpoint: str | None = None, window: float | None = None) -> int:
+    """
+    Number of requests in the sliding window.
+
+    Args:
+        endpoint (str | None): The API endpoint. If None, counts over all endpoints.
+        window (float | None): Window (seconds). Defaults to the rate window.
+    """
+    counts = _series(endpoint)
+    if counts is None:
+        return 0
+    return counts.window(_window() if window is None else window, time.time())[0]
 
 
-async def rate(endpoint: str | None = None) -> tuple[float | None, float | None]:
+def ewma(endpoint: str | None = None) -> float:
+    """
+    Exponentially weighted moving average of the request rate (requests per second).
+
+    Args:
+        endpoint (str | None): The API endpoint. If None, the rate over all endpoints.
+    """
+    counts = _series(endpoint)
+    return counts.rate(time.time()) if counts else 0.0
+
+
+async def rate(endpoint: str | None = None, window: float | None = None) -> tuple[float | None, float | None]:
     """
     Compute sliding-window average requests per second.
 
@@ -101,46 +197,28 @@ async def rate(endpoint: str | None = None) -> tuple[float | None, float | None]
     would require a bit more work and since this is possibly being done
     frequently it's probably not worth the extra time.
 
-    🚨 This function does not prune the times to the window duration. This is
-    only done when new times are added to the queue. So it's possible to get
-    averages times that are longer than the window duration.
+    The cost doesn't depend on the number of requests or endpoints.
 
     Args:
         endpoint (str | None): The API endpoint to compute the rate for. If None, computes the overall rate.
+        window (float | None): Window (seconds). Defaults to the rate window.
     """
-    with lock:
-        if endpoint is None:
-            # Prune all queues because there might be old timestamps in some.
-            #
-            # This is necessary because we are consolidating times over all
-            # paths and some of them might not have been called (and hence
-            # pruned recently).
-            #
-            await prune()
-            #
-            # Consolidate times over all paths.
-            dq = [t for sublist in times.values() for t in sublist]
-            dq.sort()
-        else:
-            dq = times[endpoint]  # type: ignore[assignment]
-
-        logging.debug("Timestamps: %s", list(dq))
-
-        n = len(dq)
-
-        if not dq or n < 2:
-            # Not enough data to compute a rate.
-            elapsed = 0.0
-        else:
-            # Time difference between the first and last timestamps.
-            elapsed = dq[-1] - dq[0]
-
-        # Number of requests per second.
-        rate = n / elapsed if elapsed > 0 else None
-        # Average period between requests (approximation).
-        period = 1 / rate if rate is not None else None
-
-        return rate, period
+    counts = _series(endpoint)
+    n, first, last = counts.window(_window() if window is None else window, time.time()) if counts else (0, None, None)
+
+    if n < 2 or first is None or last is None:
+        # Not enough data to compute a rate.
+        elapsed = 0.0
+    else:
+        # Time difference between the first and last timestamps.
+        elapsed = last - first
+
+    # Number of requests per second.
+    rate = n / elapsed if elapsed > 0 else None
+    # Average period between requests (approximation).
+    period = 1 / rate if rate is not None else None
+
+    return rate, period
 
 
 def format(rate: float | None) -> str:
@@ -159,7 +237,19 @@ async def log(endpoint: str | None = None) -> None:
     logging.info(f"⌚ Request rate (last {window} s): {format(rps)} Hz / {format(period)} s | ({endpoint or 'global'})")
 
 
-async def rate_loop() -> None:
+async def rate_loop(*prunes: Callable[[float], None]) -> None:
+    """
+    Periodically log the request rate and remove idle endpoints and clients.
+
+    Args:
+        prunes: Functions that remove other state that's idle at a given time.
+    """
     while True:
         await asyncio.sleep(RATE_LOG_INTERVAL)
         await log()
+        now = time.time()
+        await prune(now)
+        client.prune(now)
+        limit.prune()
+        for other in prunes:
+            other(now)
@@ -0,0 +1,31 @@
+from enum import Enum
+from fnmatch import fnmatch
+
+from ..const import PRIORITY_RULES
+
+
+class Priority(str, Enum):
+    """
+    Priority class for rate limit slots. Listed from highest to lowest.
+    """
+
+    HIGH = "high"  # Order placement, modification and cancellation.
+    NORMAL = "normal"  # Default
+    LOW = "low"  # Bulk market data and scanners.
+
+
+def priority(path: str, header: str | None = None) -> Priority:
+    """
+    Get the priority class for a request.
+
+    A valid priority header takes precedence over the route rules.
+    """
+    if header:
+        try:
+            return Priority(header.strip().lower())
+        except ValueError:
+            pass
+    for pattern, value in PRIORITY_RULES:
+        if fnmatch(path, pattern):
+            return Priority(value)
+    return Priority.NORMAL
@@ -0,0 +1,310 @@
+"""
+Replay recorded journal traffic.
+
+There are two commands:
+
+- send: replay journal records against a running proxy, either with the
+  recorded timing (optionally sped up) or with a fixed concurrency; and
+- serve: run a stand-in upstream that answers with the recorded responses.
+
+Together these allow throughput and latency to be measured offline with real
+traffic shapes. For example:
+
+    ibproxy-replay serve --port 9001
+    ibproxy --upstream http://127.0.0.1:9001/ --disable-journal
+    ibproxy-replay send --speed 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+from .const import API_HOST, API_PORT, JOURNAL_DIR, MOCK_PORT
+from .journal import iter_journal
+from .util import percentile
+
+
+@dataclass
+class Call:
+    """
+    A recorded request/response.
+    """
+
+    timestamp: float
+    method: str
+    path: str
+    params: dict[str, str]
+    body: Any
+    status_code: int
+    content_type: str | None
+    data: Any
+    duration: float
+    # Content type of the request body.
+    body_type: str | None = None
+
+    @classmethod
+    def from_record(cls, record: dict[str, Any]) -> "Call":
+        request, response = record["request"], record["response"]
+        headers = {k.lower(): v for k, v in (request.get("headers") or {}).items()}
+        return cls(
+            timestamp=datetime.fromisoformat(record["timestamp"]).timestamp() if record["timestamp"] else 0.0,
+            method=request["method"],
+            path=urlsplit(request["url"]).path,
+            params=request["params"] or {},
+            body=request["body"],
+            status_code=response["status_code"],
+            content_type=response["content_type"],
+            data=response.get("data"),
+            duration=record["duration"] or 0.0,
+            body_type=headers.get("content-type"),
+        )
+
+    def request(self) -> dict[str, Any]:
+        """
+        Body and content type arguments for replaying the request.
+
+        Bodies that weren't JSON (for example forms) are journaled as text and are
+        sent as they were recorded.
+        """
+        arguments: dict[str, Any] = {}
+        if isinstance(self.body, str | bytes):
+            arguments["content"] = self.body
+        elif self.body is not None:
+            arguments["json"] = self.body
+        if self.body_type and self.body is not None:
+            arguments["headers"] = {"Content-Type": self.body_type}
+        return arguments
+
+    @property
+    def content(self) -> bytes:
+        if isinstance(self.data, str) and not (self.content_type or "").startswith("application/json"):
+            return self.data.encode("utf-8")
+        return b"" if self.data is None else json.dumps(self.data).encode("utf-8")
+
+
+def load(directory: Path, path: str | None = None, limit: int | None = None, data: bool = True) -> list[Call]:
+    """
+    Load recorded calls from a journal in chronological order.
+
+    Args:
+        directory: Journal directory.
+        path: Only load calls whose URL path matches this glob pattern.
+        limit: Maximum number of calls.
+        data: Whether to load response bodies.
+    """
+    calls = []
+    for record in iter_journal(directory, data=data):
+        call = Call.from_record(record)
+        if path is None or fnmatch(call.path, path):
+            calls.append(call)
+            if limit is not None and len(calls) >= limit:
+                break
+    calls.sort(key=lambda call: call.timestamp)
+    return calls
+
+
+# SEND =========================================================================
+
+
+@dataclass
+class Result:
+    started: float = 0.0
+    finished: float = 0.0
+    latencies: list[float] = field(default_factory=list)
+    statuses: Counter[int | str] = field(default_factory=Counter)
+
+    def summary(self) -> dict[str, Any]:
+        elapsed = self.finished - self.started
+        count = len(self.latencies)
+        return {
+            "requests": count,
+            "elapsed": elapsed,
+            "throughput": count / elapsed if elapsed > 0 else None,
+            "latency": {
+                "mean": sum(self.latencies) / count if count else None,
+                "p50": percentile(self.latencies, 50),
+                "p90": percentile(self.latencies, 90),
+                "p99": percentile(self.latencies, 99),
+                "max": max(self.latencies, default=None),
+            },
+            "status": {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+        }
+
+
+async def _send(client: httpx.AsyncClient, call: Call, result: Result) -> None:
+    start = time.perf_counter()
+    try:
+        response = await client.request(
+            call.method,
+            call.path,
+            params=call.params,
+            **call.request(),
+        )
+        await response.aread()
+        result.statuses[response.status_code] += 1
+    except httpx.HTTPError as error:
+        result.statuses[type(error).__name__] += 1
+    result.latencies.append(time.perf_counter() - start)
+
+
+async def send(
+    calls: list[Call],
+    proxy: str,
+    speed: float = 1.0,
+    concurrency: int | None = None,
+) -> Result:
+    """
+    Replay calls against a proxy.
+
+    Args:
+        calls: Recorded calls in chronological order.
+        proxy: Base URL for the proxy.
+        speed: Speed-up factor applied to the recorded inter-arrival times.
+        concurrency: If given, ignore recorded timing and keep this many requests in flight.
+    """
+    result = Result()
+    limits = httpx.Limits(max_connections=concurrency) if concurrency else httpx.Limits()
+    async with httpx.AsyncClient(base_url=proxy, timeout=60, limits=limits) as client:
+        result.started = time.perf_counter()
+        if concurrency:
+            queue: asyncio.Queue[Call] = asyncio.Queue()
+            for call in calls:
+                queue.put_nowait(call)
+
+            async def worker() -> None:
+                while not queue.empty():
+                    await _send(client, queue.get_nowait(), result)
+
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        else:
+            origin = calls[0].timestamp if calls else 0.0
+            tasks = []
+            for call in calls:
+                delay = (call.timestamp - origin) / speed - (time.perf_counter() - result.started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(_send(client, call, result)))
+            await asyncio.gather(*tasks)
+        result.finished = time.perf_counter()
+    return result
+
+
+# SERVE ========================================================================
+
+
+def _key(method: str, path: str, params: dict[str, str] | None = None) -> tuple[str, str, tuple[tuple[str, str], ...]]:
+    return method, path, tuple(sorted((params or {}).items()))
+
+
+def upstream(calls: list[Call], latency: bool = False) -> FastAPI:
+    """
+    Create a stand-in upstream that answers with recorded responses.
+
+    Requests are matched on method, path and parameters, falling back to method
+    and path. Where there are multiple recorded responses they are returned in
+    rotation.
+
+    Args:
+        calls: Recorded calls.
+        latency: Whether to delay each response by the recorded duration.
+    """
+    responses: dict[tuple[str, str, tuple[tuple[str, str], ...]], list[Call]] = defaultdict(list)
+    for call in calls:
+        responses[_key(call.method, call.path, call.params)].append(call)
+        responses[_key(call.method, call.path)].append(call)
+    served: Counter[tuple[str, str, tuple[tuple[str, str], ...]]] = Counter()
+
+    app = FastAPI(title="IBKR Replay Upstream")
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])  # type: ignore[untyped-decorator, unused-ignore]
+    async def replay(path: str, request: Request) -> Response:
+        key = _key(request.method, "/" + path, dict(request.query_params))
+        if key not in responses:
+            key = _key(request.method, "/" + path)
+        if not (candidates := responses.get(key)):
+            return Response(content=b"File not found", status_code=404, media_type="text/plain")
+
+        call = candidates[served[key] % len(candidates)]
+        served[key] += 1
+        if latency:
+            await asyncio.sleep(call.duration)
+        return Response(content=call.content, status_code=call.status_code, media_type=call.content_type)
+
+    return app
+
+
+# ==============================================================================
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay journal traffic against the proxy.")
+    parser.add_argument(
+        "--journal",
+        type=Path,
+        default=JOURNAL_DIR,
+        help=f"Journal directory (default: {JOURNAL_DIR}).",
+    )
+    parser.add_argument("--path", help="Only replay calls whose URL path matches this glob pattern.")
+    parser.add_argument("--limit", type=int, help="Maximum number of calls.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    send_parser = commands.add_parser("send", help="Replay calls against a running proxy.")
+    send_parser.add_argument(
+        "--proxy",
+        default=f"http://{API_HOST}:{API_PORT}",
+        help=f"Proxy URL (default: http://{API_HOST}:{API_PORT}).",
+    )
+    timing = send_parser.add_mutually_exclusive_group()
+    timing.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Speed-up factor applied to recorded inter-arrival times (default: 1).",
+    )
+    timing.add_argument(
+        "--concurrency",
+        type=int,
+        help="Ignore recorded timing and keep this many requests in flight.",
+    )
+    send_parser.add_argument("--output", type=Path, help="Write summary to this JSON file.")
+
+    serve_parser = commands.add_parser("serve", help="Run a stand-in upstream with recorded responses.")
+    serve_parser.add_argument("--port", type=int, default=MOCK_PORT, help=f"Port (default: {MOCK_PORT}).")
+    serve_parser.add_argument(
+        "--latency",
+        action="store_true",
+        help="Delay each response by the recorded duration.",
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)8s] %(message)s")
+
+    calls = load(args.journal, path=args.path, limit=args.limit, data=args.command == "serve")
+    logging.info(f"Loaded {len(calls)} calls from {args.journal}.")
+
+    if args.command == "send":
+        result = asyncio.run(send(calls, args.proxy, speed=args.speed, concurrency=args.concurrency))
+        summary = json.dumps(result.summary(), indent=2)
+        print(summary)
+        if args.output:
+            args.output.write_text(summary)
+    else:
+        uvicorn.run(upstream(calls, latency=args.latency), host=API_HOST, port=args.port)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    main()
@@ -0,0 +1,146 @@
+import re
+from pathlib import Path
+
+import yaml
+
+# Route templates for the IBKR Web API. Parameters are in braces. Literal segments
+# take precedence over parameters, so "/v1/api/iserver/account/orders" isn't
+# matched by "/v1/api/iserver/account/{accountId}/orders".
+#
+# https://www.interactivebrokers.com/campus/ibkr-api-page/webapi-ref/
+#
+ROUTES = [
+    # Account.
+    "/v1/api/iserver/account/{accountId}/summary",
+    "/v1/api/iserver/account/{accountId}/summary/{section}",
+    "/v1/api/acesws/{accountId}/signatures-and-owners",
+    # Alerts.
+    "/v1/api/iserver/account/{accountId}/alert",
+    "/v1/api/iserver/account/{accountId}/alert/activate",
+    "/v1/api/iserver/account/{accountId}/alert/{alertId}",
+    "/v1/api/iserver/account/{accountId}/alerts",
+    "/v1/api/iserver/account/alert/{alertId}",
+    # Contracts.
+    "/v1/api/iserver/contract/{conid}/info",
+    "/v1/api/iserver/contract/{conid}/info-and-rules",
+    "/v1/api/iserver/contract/{conid}/algos",
+    "/v1/api/trsrv/secdef/schedule/{conid}",
+    # Market data.
+    "/v1/api/iserver/marketdata/{conid}/unsubscribe",
+    "/v1/api/md/regsnapshot/{conid}",
+    # Notifications.
+    "/v1/api/fyi/settings/{typecode}",
+    "/v1/api/fyi/deliveryoptions/{deviceId}",
+    "/v1/api/fyi/notifications/{notificationId}",
+    # Orders.
+    "/v1/api/iserver/account/{accountId}/orders",
+    "/v1/api/iserver/account/{accountId}/orders/whatif",
+    "/v1/api/iserver/account/{accountId}/order/{orderId}",
+    "/v1/api/iserver/account/order/status/{orderId}",
+    "/v1/api/iserver/reply/{replyId}",
+    # Portfolio.
+    "/v1/api/portfolio/{accountId}/meta",
+    "/v1/api/portfolio/{accountId}/summary",
+    "/v1/api/portfolio/{accountId}/ledger",
+    "/v1/api/portfolio/{accountId}/allocation",
+    "/v1/api/portfolio/{accountId}/combo/positions",
+    "/v1/api/portfolio/{accountId}/positions/invalidate",
+    "/v1/api/portfolio/{accountId}/positions/{pageId}",
+    "/v1/api/portfolio/{accountId}/position/{conid}",
+    "/v1/api/portfolio/positions/{conid}",
+    "/v1/api/portfolio2/{accountId}/positions",
+    # Watchlists.
+    "/v1/api/iserver/watchlist/{watchlistId}",
+]
+
+# Segments of unknown paths that look like identifiers.
+IDENTIFIERS = [
+    (re.compile(r"\d+"), "{id}"),
+    (re.compile(r"[A-Z]{1,3}\d{4,}"), "{accountId}"),
+    (re.compile(r"[0-9a-fA-F-]{16,}"), "{id}"),
+]
+
+
+class _Node:
+    __slots__ = ("literals", "parameter", "template")
+
+    def __init__(self) -> None:
+        self.literals: dict[str, _Node] = {}
+        self.parameter: _Node | None = None
+        self.template: str | None = None
+
+
+class Routes:
+    """
+    Map request paths to route templates.
+
+    Templates are stored in a trie of path segments, so lookup time depends on
+    the number of segments rather than the number of templates. Paths that don't
+    match a template have segments that look like identifiers (numbers, account
+    IDs and hex strings) replaced. This keeps the number of distinct keys for
+    rates, limits and metrics bounded.
+    """
+
+    def __init__(self, templates: list[str] | None = None):
+        self.root = _Node()
+        for template in ROUTES if templates is None else templates:
+            self.add(template)
+
+    def add(self, template: str) -> None:
+        node = self.root
+        for segment in template.strip("/").split("/"):
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.parameter is None:
+                    node.parameter = _Node()
+                node = node.parameter
+            else:
+                node = node.literals.setdefault(segment, _Node())
+        node.template = "/" + template.strip("/")
+
+    def _find(self, node: _Node, segments: list[str], i: int) -> str | None:
+        if i == len(segments):
+            return node.template
+        if (child := node.literals.get(segments[i])) is not None:
+            if (found := self._find(child, segments, i + 1)) is not None:
+                return found
+        if node.parameter is not None:
+            return self._find(node.parameter, segments, i + 1)
+        return None
+
+    def template(self, path: str) -> str:
+        """
+        Get the route template for a path.
+        """
+        segments = path.strip("/").split("/")
+        if (found := self._find(self.root, segments, 0)) is not None:
+            return found
+        return "/" + "/".join(_generalise(segment) for segment in segments)
+
+
+def _generalise(segment: str) -> str:
+    for pattern, replacement in IDENTIFIERS:
+        if pattern.fullmatch(segment):
+            return replacement
+    return segment
+
+
+_routes = Routes()
+
+
+def template(path: str) -> str:
+    """
+    Get the route template for a path (for example "/v1/api/iserver/contract/265598/info"
+    becomes "/v1/api/iserver/contract/{conid}/info").
+    """
+    return _routes.template(path)
+
+
+def load_routes(path: Path) -> None:
+    """
+    Add route templates from a YAML file containing a list of templates.
+
+    These are added to the built-in templates.
+    """
+    with open(path) as f:
+        for route in yaml.safe_load(f) or []:
+            _routes.add(route)
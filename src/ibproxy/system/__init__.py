@@ -2,7 +2,7 @@
 
 from fastapi import APIRouter
 
-from . import health, reset, status, uptime
+from . import batch, cache, clients, coalesce, health, journal, pool, rate, reset, status, upstream, uptime
 
 router = APIRouter(tags=["system"])
 
@@ -11,3 +11,11 @@ router.include_router(status.router, prefix="/status")
 router.include_router(reset.router, prefix="/reset")
 router.include_router(uptime.router, prefix="/uptime")
 router.include_router(health.router, prefix="/health")
+router.include_router(journal.router, prefix="/journal")
+router.include_router(cache.router, prefix="/cache")
+router.include_router(coalesce.router, prefix="/coalesce")
+router.include_router(batch.router, prefix="/batch")
+router.include_router(rate.router, prefix="/rate")
+router.include_router(clients.router, prefix="/clients")
+router.include_router(upstream.router, prefix="/upstream")
+router.include_router(pool.router, prefix="/pool")
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..batch import SnapshotBatcher
+from ..models import BatchMetrics
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Snapshot Batching Metrics",
+    description="Number of market data snapshot requests and the upstream batches they were merged into.",
+    response_model=BatchMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def batch(request: Request) -> BatchMetrics:
+    batcher: SnapshotBatcher | None = getattr(request.app.state, "batcher", None)
+    if batcher is None:
+        raise HTTPException(status_code=404, detail="Snapshot batching is disabled.")
+
+    return batcher.metrics()
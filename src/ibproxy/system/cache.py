@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..cache import ResponseCache
+from ..models import CacheMetrics
+
+router = APIRouter()
+
+
+def _cache(request: Request) -> ResponseCache:
+    cache: ResponseCache | None = getattr(request.app.state, "cache", None)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Cache is disabled.")
+    return cache
+
+
+@router.get(
+    "",
+    summary="Cache Metrics",
+    description="Size, hit rate and evictions for the response cache.",
+    response_model=CacheMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def cache(request: Request) -> CacheMetrics:
+    return _cache(request).metrics()
+
+
+@router.delete(
+    "",
+    summary="Clear Cache",
+    description="Remove all cached responses.",
+    response_model=CacheMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def clear(request: Request) -> CacheMetrics:
+    cache = _cache(request)
+    cache.clear()
+    return cache.metrics()
@@ -0,0 +1,29 @@
+from datetime import UTC, datetime
+
+from fastapi import APIRouter
+
+from ..models import ClientMetrics
+from ..rate import clients as get_clients
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Client Metrics",
+    description="Weight, quota and usage for each client, keyed by client name.",
+    response_model=dict[str, ClientMetrics],
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def clients() -> dict[str, ClientMetrics]:
+    return {
+        client.name: ClientMetrics(
+            weight=client.weight,
+            quota=client.bucket.rate if client.bucket else None,
+            requests=client.requests,
+            waited=client.waited,
+            wait_mean=client.total / client.waited if client.waited else 0.0,
+            wait_max=client.longest,
+            last=datetime.fromtimestamp(client.last, UTC),
+        )
+        for client in get_clients()
+    }
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..coalesce import Coalescer
+from ..models import CoalesceMetrics
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Coalescing Metrics",
+    description="Number of requests that shared an identical in-flight upstream request.",
+    response_model=CoalesceMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def coalesce(request: Request) -> CoalesceMetrics:
+    coalescer: Coalescer | None = getattr(request.app.state, "coalescer", None)
+    if coalescer is None:
+        raise HTTPException(status_code=404, detail="Coalescing is disabled.")
+
+    return coalescer.metrics()
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..journal import JournalWriter
+from ..models import JournalMetrics
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Journal Metrics",
+    description="Queue depth, throughput and write latency for the request/response journal.",
+    response_model=JournalMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def journal(request: Request) -> JournalMetrics:
+    writer: JournalWriter | None = getattr(request.app.state, "journal", None)
+    if writer is None:
+        raise HTTPException(status_code=404, detail="Journal is disabled.")
+
+    return writer.metrics()
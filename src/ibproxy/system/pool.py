@@ -0,0 +1,17 @@
+from fastapi import APIRouter, Request
+
+from ..models import PoolMetrics
+from ..pool import pool_metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Upstream Connection Pool Metrics",
+    description="Upstream connections (active and idle), requests waiting for a connection and mean phase timings "
+    "(pool wait, connect, TLS, send, server and receive) for each endpoint.",
+    response_model=PoolMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def pool(request: Request) -> PoolMetrics:
+    return pool_metrics(getattr(request.app.state, "client", None))
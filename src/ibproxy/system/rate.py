@@ -0,0 +1,32 @@
+from fastapi import APIRouter
+
+from ..models import RateMetrics
+from ..rate import Priority, granted, queue, rate, snapshot, waiting
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Rate Limit Metrics",
+    description="Request rate, adaptive rate limits and the requests waiting for rate limit slots in each priority class.",
+    response_model=RateMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def rate_metrics() -> RateMetrics:
+    rps, _ = await rate()
+    stats = queue()
+    counts = waiting()
+    slots = granted()
+    buckets = snapshot()
+    return RateMetrics(
+        rate=rps,
+        queued=sum(counts.values()),
+        waiting={priority.value: counts[priority] for priority in Priority},
+        granted={priority.value: slots[priority] for priority in Priority},
+        waited=stats.waited,
+        wait_mean=stats.total / stats.waited if stats.waited else 0.0,
+        wait_max=stats.longest,
+        limit=buckets["*"].rate,
+        throttled=sum(bucket.throttled for bucket in buckets.values()),
+        reduced={pattern: bucket.rate for pattern, bucket in buckets.items() if bucket.rate < bucket.ceiling},
+    )
@@ -6,6 +6,7 @@ from starlette.datastructures import State
 from tenacity import RetryError, retry, stop_after_attempt, wait_exponential
 
 from ..models import SystemStatus
+from ..pool import close_idle
 from .status import get_system_status
 
 router = APIRouter()
@@ -31,6 +32,8 @@ async def _reconnect(state: State) -> SystemStatus:
         state: An application state object containing:
             - gate: An asyncio.Event used to control request flow (clear to block, set to allow)
             - auth: An authentication/connection manager with logout() and connect() methods
+            - client: Upstream client
+            - prewarm: Coroutine function that opens upstream connections (or None)
 
     Returns:
         The result of get_system_status() if reconnection is successful.
@@ -61,6 +64,12 @@ async def _reconnect(state: State) -> SystemStatus:
         except Exception:
             logging.error("🚨 Authentication failed!")
 
+        # Open fresh upstream connections before requests resume. Idle connections are
+        # closed first, otherwise the prewarm requests would just reuse them.
+        if state.prewarm:
+            await close_idle(state.client)
+            await state.prewarm()
+
         return await get_system_status()
     except RuntimeError as error:
         raise HTTPException(status_code=502, detail=str(error)) from error
@@ -0,0 +1,20 @@
+from fastapi import APIRouter, HTTPException, Request
+
+from ..models import ConcurrencyMetrics
+from ..rate import AdaptiveLimit
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    summary="Upstream Concurrency Metrics",
+    description="Current adaptive limit on concurrent upstream requests, requests in flight and queue length.",
+    response_model=ConcurrencyMetrics,
+)  # type: ignore[untyped-decorator, unused-ignore]
+async def upstream(request: Request) -> ConcurrencyMetrics:
+    limiter: AdaptiveLimit | None = getattr(request.app.state, "limiter", None)
+    if limiter is None:
+        raise HTTPException(status_code=404, detail="Adaptive concurrency limit is disabled.")
+
+    return limiter.metrics()
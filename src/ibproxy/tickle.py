@@ -7,6 +7,7 @@ import httpx
 
 from . import rate
 from .const import DATETIME_FMT
+from .mock import MockAuth
 from .system.status import get_system_status
 from .util import cpu_percent, disk_percent, ram_percent, swap_percent
 
@@ -72,7 +73,9 @@ async def tickle_loop(app: object) -> None:
         try:
             auth = app.state.auth  # type: ignore[attr-defined]
             logging.debug(f"🆔 Authentication object ID: {id(auth)}")
-            await log_status()
+            # The status page is on the live IBKR site, so skip it with mock authentication.
+            if not isinstance(auth, MockAuth):
+                await log_status()
             should, delay = await should_tickle()
             if should:
                 await auth.tickle()
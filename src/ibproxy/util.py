@@ -1,7 +1,11 @@
 import asyncio
 import logging
-import psutil
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import urlencode
+
+import psutil
 
 
 def logging_level(logger: logging.Logger | None = None) -> int:
@@ -38,4 +42,69 @@ async def disk_percent(path: Path = Path("/")) -> float:
     """
     Return the current disk utilization for the given path as a percentage.
     """
-    return await asyncio.to_thread(lambda: psutil.disk_usage(path).percent)
\ No newline at end of file
+    return await asyncio.to_thread(lambda: psutil.disk_usage(path).percent)
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """
+    Return the q-th percentile (0-100) of values using linear interpolation.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def request_key(path: str, params: dict[str, str]) -> str:
+    """
+    Normalised key for a request. Parameter order doesn't matter.
+    """
+    return f"{path}?{urlencode(sorted(params.items()))}" if params else path
+
+
+def retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header (seconds or HTTP date) into a delay in seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=UTC)
+        delay = (when - datetime.now(UTC)).total_seconds()
+    return max(delay, 0.0)
+
+
+def accepts(accept_encoding: str | None, encoding: str) -> bool:
+    """
+    Check whether an Accept-Encoding header allows a content encoding.
+    """
+    if not accept_encoding:
+        return False
+    wildcard = False
+    for item in accept_encoding.lower().split(","):
+        name, _, parameters = item.partition(";")
+        name = name.strip()
+        quality = 1.0
+        for parameter in parameters.split(";"):
+            key, _, value = parameter.partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name == encoding.lower():
+            return quality > 0
+        if name == "*":
+            wildcard = quality > 0
+    return wildcard
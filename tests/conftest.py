@@ -8,6 +8,10 @@ from fastapi import Request
 from fastapi.testclient import TestClient
 
 import ibproxy.main as appmod
+from ibproxy.cache import ResponseCache
+from ibproxy.coalesce import Coalescer
+from ibproxy.journal import JournalWriter
+from ibproxy.rate import Client, Priority
 
 REQUEST_ID = "test-req-id"
 
@@ -20,10 +24,13 @@ def disable_rate_limit(monkeypatch):
     This is particularly important for tests that freeze time.
     """
 
-    async def _noop_enforce(_id: str) -> None:
+    async def _noop_enforce(
+        _id: str, path: str | None = None, priority: Priority | None = None, client: Client | None = None
+    ) -> None:
         return
 
     monkeypatch.setattr(appmod, "enforce_rate_limit", _noop_enforce)
+    monkeypatch.setattr(appmod, "adapt", lambda path, status_code, headers: None)
 
 
 @pytest.fixture
@@ -47,6 +54,15 @@ def client(monkeypatch) -> TestClient:
     http_client = httpx.AsyncClient()
     appmod.app.state.client = http_client
 
+    # Journal, cache, coalescing, batching, the concurrency limit and prewarming are
+    # disabled unless enabled by a fixture or test.
+    appmod.app.state.journal = None
+    appmod.app.state.cache = None
+    appmod.app.state.coalescer = None
+    appmod.app.state.batcher = None
+    appmod.app.state.limiter = None
+    appmod.app.state.prewarm = None
+
     client = TestClient(appmod.app)
     try:
         yield client
@@ -58,6 +74,42 @@ def client(monkeypatch) -> TestClient:
             loop.close()
 
 
+@pytest.fixture
+def journal(client, tmp_path) -> JournalWriter:
+    """
+    Journal writer for tests.
+
+    The background task isn't started, so entries accumulate in the queue until
+    the writer is stopped.
+    """
+    writer = JournalWriter(tmp_path)
+    appmod.app.state.journal = writer
+    try:
+        yield writer
+    finally:
+        appmod.app.state.journal = None
+
+
+@pytest.fixture
+def cache(client) -> ResponseCache:
+    cache = ResponseCache()
+    appmod.app.state.cache = cache
+    try:
+        yield cache
+    finally:
+        appmod.app.state.cache = None
+
+
+@pytest.fixture
+def coalescer(client) -> Coalescer:
+    coalescer = Coalescer()
+    appmod.app.state.coalescer = coalescer
+    try:
+        yield coalescer
+    finally:
+        appmod.app.state.coalescer = None
+
+
 @pytest.fixture
 def dummy_response() -> httpx.Response:
     return httpx.Response(
@@ -114,6 +166,12 @@ def mock_request() -> Request:
         request.app.state.gate = gate
 
         request.app.state.client = httpx.AsyncClient()
+        request.app.state.journal = None
+        request.app.state.cache = None
+        request.app.state.coalescer = None
+        request.app.state.batcher = None
+        request.app.state.limiter = None
+        request.app.state.prewarm = None
 
         return request
 
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import UTC, datetime
+
+import httpx
+import pytest
+
+import ibproxy.main as appmod
+from ibproxy.batch import SnapshotBatcher
+from ibproxy.rate import Client, Priority
+
+SNAPSHOT = "/v1/api/iserver/marketdata/snapshot"
+
+
+def _snapshot(params: dict[str, str]) -> list[dict]:
+    fields = params["fields"].split(",")
+    return [
+        {"conid": int(conid), "conidEx": conid, "6119": "serverId", **{field: f"{conid}:{field}" for field in fields}}
+        for conid in params["conids"].split(",")
+    ]
+
+
+def _response(params: dict[str, str], status_code: int = 200) -> httpx.Response:
+    request = httpx.Request("GET", f"https://api.test{SNAPSHOT}", params=params)
+    if status_code != 200:
+        return httpx.Response(status_code, text="Service Unavailable", request=request)
+    return httpx.Response(200, json=_snapshot(params), request=request)
+
+
+def test_match():
+    assert SnapshotBatcher.match("GET", SNAPSHOT, {"conids": "1, 2", "fields": "31"}) == (["1", "2"], ["31"])
+    assert SnapshotBatcher.match("GET", SNAPSHOT, {"conids": "1", "fields": "31", "since": "0"}) is None
+    assert SnapshotBatcher.match("GET", SNAPSHOT, {"conids": "", "fields": "31"}) is None
+    assert SnapshotBatcher.match("POST", SNAPSHOT, {"conids": "1", "fields": "31"}) is None
+    assert SnapshotBatcher.match("GET", "/v1/api/iserver/accounts", {"conids": "1", "fields": "31"}) is None
+
+
+def test_run_merges_requests():
+    batcher = SnapshotBatcher(window=0.01)
+    sent = []
+
+    async def send(params):
+        sent.append(params)
+        return _response(params), datetime.now(UTC), 0.1
+
+    async def _run():
+        return await asyncio.gather(
+            batcher.run(["1"], ["31"], send),
+            batcher.run(["2", "1"], ["84"], send),
+            batcher.run(["3"], ["31", "84"], send),
+        )
+
+    first, second, third = [response.json() for response, _, _ in asyncio.run(_run())]
+
+    assert sent == [{"conids": "1,2,3", "fields": "31,84"}]
+    assert first == [{"conid": 1, "conidEx": "1", "6119": "serverId", "31": "1:31"}]
+    assert [item["conid"] for item in second] == [2, 1]
+    assert all("31" not in item for item in second)
+    assert third == [{"conid": 3, "conidEx": "3", "6119": "serverId", "31": "3:31", "84": "3:84"}]
+    assert batcher.metrics().requests == 3
+    assert batcher.metrics().batches == 1
+
+
+def test_run_splits_full_batch():
+    batcher = SnapshotBatcher(window=0.01, size=2)
+    sent = []
+
+    async def send(params):
+        sent.append(params["conids"])
+        return _response(params), datetime.now(UTC), 0.1
+
+    async def _run():
+        return await asyncio.gather(*(batcher.run([str(conid)], ["31"], send) for conid in range(1, 5)))
+
+    asyncio.run(_run())
+    assert sent == ["1,2", "3,4"]
+
+
+def test_run_error_shared():
+    batcher = SnapshotBatcher(window=0.01)
+
+    async def send(params):
+        return _response(params, 503), datetime.now(UTC), 0.1
+
+    async def _run():
+        return await asyncio.gather(batcher.run(["1"], ["31"], send), batcher.run(["2"], ["31"], send))
+
+    assert [response.status_code for response, _, _ in asyncio.run(_run())] == [503, 503]
+
+
+def test_run_leader_cancelled_during_window():
+    batcher = SnapshotBatcher(window=10)
+    sent = []
+
+    async def send(params):
+        sent.append(params)
+        return _response(params), datetime.now(UTC), 0.1
+
+    async def _run():
+        leader = asyncio.create_task(batcher.run(["1"], ["31"], send))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(batcher.run(["2"], ["84"], send))
+        await asyncio.sleep(0)
+        # For example the client disconnected while the batch was open.
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(follower, 1)
+
+    # The follower sends its own request.
+    response, _, _ = asyncio.run(_run())
+    assert sent == [{"conids": "2", "fields": "84"}]
+    assert response.json() == [{"conid": 2, "conidEx": "2", "6119": "serverId", "84": "2:84"}]
+    assert batcher.pending is None
+
+
+@pytest.mark.parametrize("window", [0.05, None])
+def test_proxy_batches_snapshots(client, monkeypatch, window):
+    appmod.app.state.batcher = SnapshotBatcher(window) if window else None
+
+    tokens = []
+
+    async def _enforce(
+        id: str, path: str | None = None, priority: Priority | None = None, client: Client | None = None
+    ) -> None:
+        tokens.append(id)
+
+    monkeypatch.setattr(appmod, "enforce_rate_limit", _enforce)
+    monkeypatch.setattr(appmod, "UPSTREAM", "http://mock/")
+
+    def _upstream(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=_snapshot(dict(request.url.params)))
+
+    async def _run():
+        appmod.app.state.client = httpx.AsyncClient(transport=httpx.MockTransport(_upstream))
+        transport = httpx.ASGITransport(app=appmod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as proxy:
+            return await asyncio.gather(
+                *(proxy.get(SNAPSHOT, params={"conids": str(conid), "fields": "31"}) for conid in range(1, 6))
+            )
+
+    responses = asyncio.run(_run())
+
+    assert [response.json()[0]["conid"] for response in responses] == [1, 2, 3, 4, 5]
+    assert len(tokens) == (1 if window else 5)
+
+
+def test_batch_endpoint(client):
+    appmod.app.state.batcher = SnapshotBatcher(0.05)
+    assert client.get("/batch").json() == {"window": 0.05, "requests": 0, "batches": 0, "pending": 0}
+
+
+def test_batch_endpoint_disabled(client):
+    assert client.get("/batch").status_code == 404
@@ -0,0 +1,153 @@
+import httpx
+import pytest
+import respx
+from freezegun import freeze_time
+
+import ibproxy.main as appmod
+from ibproxy.cache import CacheRule, ResponseCache
+from ibproxy.rate import Client, Priority
+
+UPSTREAM = "http://127.0.0.1:9001/"
+STOCKS = "/v1/api/trsrv/stocks"
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(appmod, "UPSTREAM", UPSTREAM)
+    with respx.mock(base_url=UPSTREAM.rstrip("/")) as router:
+        yield router
+
+
+def test_key_is_normalised():
+    assert ResponseCache.key(STOCKS, {"symbols": "AAPL", "a": "1"}) == ResponseCache.key(
+        STOCKS, {"a": "1", "symbols": "AAPL"}
+    )
+    assert ResponseCache.key(STOCKS, {}) == STOCKS
+
+
+def test_rule():
+    cache = ResponseCache()
+    assert cache.rule("GET", STOCKS).ttl == 3600
+    assert cache.rule("GET", "/v1/api/iserver/contract/265598/info") is not None
+    assert cache.rule("POST", STOCKS) is None
+    assert cache.rule("GET", "/v1/api/iserver/accounts") is None
+
+
+def test_lru_eviction():
+    rule = CacheRule("*", ttl=60)
+    cache = ResponseCache(capacity=250)
+    for key in "abc":
+        cache.put(key, rule, b"x" * 100, 200, {}, None)
+
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.evictions == 1
+
+    # Access moves entry to the end.
+    cache.get("b")
+    cache.put("d", rule, b"x" * 100, 200, {}, None)
+    assert list(cache.entries) == ["b", "d"]
+    assert cache.size == 200
+
+
+def test_no_store():
+    cache = ResponseCache()
+    cache.put("a", CacheRule("*", ttl=60), b"{}", 200, {"cache-control": "no-store"}, None)
+    assert cache.get("a") is None
+
+
+def test_ttl_and_stale():
+    cache = ResponseCache()
+    with freeze_time("2025-08-19 10:00:00") as frozen:
+        cache.put("a", CacheRule("*", ttl=60, stale=60), b"{}", 200, {}, None)
+        assert cache.get("a").fresh()
+        frozen.tick(90)
+        cached = cache.get("a")
+        assert cached is not None and not cached.fresh()
+        frozen.tick(60)
+        assert cache.get("a") is None
+
+    assert (cache.hits, cache.stale, cache.misses) == (1, 1, 1)
+    assert not cache.entries
+
+
+def test_proxy_cache_hit(client, cache, upstream, monkeypatch):
+    route = upstream.get(STOCKS).mock(return_value=httpx.Response(200, json={"AAPL": []}))
+
+    calls = []
+
+    async def _enforce(
+        id: str, path: str | None = None, priority: Priority | None = None, client: Client | None = None
+    ) -> None:
+        calls.append(id)
+
+    monkeypatch.setattr(appmod, "enforce_rate_limit", _enforce)
+
+    miss = client.get(STOCKS, params={"symbols": "AAPL", "x": "1"})
+    hit = client.get(STOCKS, params={"x": "1", "symbols": "AAPL"})
+
+    assert miss.headers["X-Cache"] == "MISS"
+    assert hit.headers["X-Cache"] == "HIT"
+    assert hit.json() == {"AAPL": []}
+    assert route.call_count == 1
+    # Cache hits don't count towards the rate limit.
+    assert len(calls) == 1
+
+    # Uncached endpoints don't have the header.
+    upstream.get("/v1/api/iserver/accounts").mock(return_value=httpx.Response(200, json=[]))
+    assert "X-Cache" not in client.get("/v1/api/iserver/accounts").headers
+
+
+def test_proxy_cache_ignores_errors(client, cache, upstream):
+    route = upstream.get(STOCKS).mock(return_value=httpx.Response(500, json={}))
+
+    assert client.get(STOCKS).status_code == 502
+    assert client.get(STOCKS).status_code == 502
+    assert route.call_count == 2
+
+    # Other non-200 responses are returned but not stored.
+    route.mock(return_value=httpx.Response(204))
+    for _ in range(2):
+        response = client.get(STOCKS)
+        assert response.status_code == 204
+        assert response.headers["X-Cache"] == "BYPASS"
+    assert route.call_count == 4
+
+
+def test_proxy_stale_while_revalidate(client, cache, upstream):
+    route = upstream.get(STOCKS).mock(
+        side_effect=[httpx.Response(200, json={"v": 1}), httpx.Response(200, json={"v": 2})]
+    )
+
+    with freeze_time("2025-08-19 10:00:00") as frozen:
+        assert client.get(STOCKS).json() == {"v": 1}
+        frozen.tick(3600 + 1)
+
+        stale = client.get(STOCKS)
+        assert stale.headers["X-Cache"] == "STALE"
+        assert stale.json() == {"v": 1}
+        # Refreshed in the background after the stale response was sent.
+        assert route.call_count == 2
+
+        fresh = client.get(STOCKS)
+        assert fresh.headers["X-Cache"] == "HIT"
+        assert fresh.json() == {"v": 2}
+
+    assert cache.refreshes == 1
+    assert not cache.refreshing
+
+
+def test_cache_endpoint(client, cache, upstream):
+    upstream.get(STOCKS).mock(return_value=httpx.Response(200, json={}))
+    client.get(STOCKS)
+    client.get(STOCKS)
+
+    data = client.get("/cache").json()
+    assert data["entries"] == 1
+    assert data["hits"] == 1
+    assert data["misses"] == 1
+
+    assert client.delete("/cache").json()["entries"] == 0
+
+
+def test_cache_endpoint_disabled(client):
+    assert client.get("/cache").status_code == 404
@@ -0,0 +1,157 @@
+import asyncio
+import time
+
+import pytest
+import respx
+
+import ibproxy.main as appmod
+import ibproxy.rate.client as clientmod
+import ibproxy.rate.limit as limitmod
+from ibproxy.const import RATE_HISTORY
+from ibproxy.rate import Client, Priority, get_client, identify
+from ibproxy.rate.limit import LeakyBucket
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(clientmod, "_clients", {})
+    monkeypatch.setattr(limitmod, "_limits", [])
+
+
+def test_identify():
+    assert identify({"x-client-id": "strategy"}, "10.0.0.1") == "strategy"
+    assert identify({"x-client-id": "strategy", "x-api-key": "secret"}, "10.0.0.1") == "strategy"
+    # API key isn't exposed.
+    name = identify({"x-api-key": "secret"}, "10.0.0.1")
+    assert name.startswith("key:") and "secret" not in name
+    assert name == identify({"x-api-key": "secret"}, "10.0.0.2")
+    assert identify({}, "10.0.0.1") == "10.0.0.1"
+    assert identify({}, None) == "unknown"
+
+
+def test_rules():
+    rules = [("batch-*", 0.5, 2, 4), ("*", 1.0, None, None)]
+
+    batch = Client.from_rules("batch-1", rules)
+    assert batch.weight == 0.5
+    assert batch.bucket.rate == 2 and batch.bucket.burst == 4
+
+    other = Client.from_rules("web", rules)
+    assert other.weight == 1.0 and other.bucket is None
+
+    # Same client is returned for the same name.
+    assert get_client("web") is get_client("web")
+
+
+def test_fair_queueing(monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1))
+    noisy, quiet = Client("noisy"), Client("quiet")
+
+    order = []
+
+    async def _request(consumer):
+        await limitmod.enforce_rate_limit("id", "/v1/api/iserver/accounts", Priority.NORMAL, consumer)
+        order.append(consumer.name)
+
+    async def _run():
+        await limitmod.enforce_rate_limit("id")
+        tasks = [asyncio.create_task(_request(noisy)) for _ in range(10)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(_request(quiet)) for _ in range(2)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    # Quiet client doesn't have to wait behind all of the noisy client's requests.
+    assert [i for i, name in enumerate(order) if name == "quiet"] == [1, 3]
+    assert noisy.requests == 10 and quiet.requests == 2
+    assert noisy.waited == 10 and noisy.longest >= quiet.longest
+
+
+def test_weights(monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1))
+    heavy, light = Client("heavy", weight=3), Client("light", weight=1)
+
+    order = []
+
+    async def _request(consumer):
+        await limitmod.enforce_rate_limit("id", None, Priority.NORMAL, consumer)
+        order.append(consumer.name)
+
+    async def _run():
+        await limitmod.enforce_rate_limit("id")
+        tasks = [asyncio.create_task(_request(consumer)) for consumer in [heavy, light] for _ in range(8)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    # Slots are shared in proportion to weight while both clients are waiting.
+    assert order[:8].count("heavy") == 6
+
+
+def test_quota(monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1000))
+    limited = Client("limited", bucket=LeakyBucket(50, 1))
+
+    async def _run():
+        start = time.perf_counter()
+        for _ in range(3):
+            await limitmod.enforce_rate_limit("id", None, Priority.NORMAL, limited)
+        return time.perf_counter() - start
+
+    assert asyncio.run(_run()) >= 0.035
+    # Other clients aren't affected.
+    asyncio.run(limitmod.enforce_rate_limit("id", None, Priority.NORMAL, Client("other")))
+    assert limited.waited == 2
+
+
+def test_prune(monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1))
+    idle, waiting = get_client("idle"), get_client("waiting")
+    get_client("active")
+
+    async def _run():
+        await asyncio.gather(*(limitmod.enforce_rate_limit("id", None, Priority.NORMAL, idle) for _ in range(3)))
+
+    asyncio.run(_run())
+    assert "idle" in limitmod._bucket.finish
+
+    now = time.time()
+    idle.last = waiting.last = now - RATE_HISTORY - 1
+    waiting.bucket = LeakyBucket(1, 1)
+    waiting.bucket.queued = 1
+    clientmod.prune(now)
+    limitmod.prune()
+    # Clients with requests waiting aren't removed.
+    assert {consumer.name for consumer in clientmod.clients()} == {"active", "waiting"}
+    assert not limitmod._bucket.finish
+
+
+def test_client_headers_not_forwarded(client, monkeypatch):
+    consumers = []
+
+    async def _enforce(id, path=None, priority=Priority.NORMAL, client=None):
+        consumers.append(client)
+
+    monkeypatch.setattr(appmod, "enforce_rate_limit", _enforce)
+
+    with respx.mock(assert_all_called=True) as mock:
+        route = mock.get("https://api.test/v1/api/portfolio/accounts").respond(200, json=[])
+        response = client.get("/v1/api/portfolio/accounts", headers={"X-Client-ID": "strategy", "X-API-Key": "secret"})
+
+    assert response.status_code == 200
+    assert [consumer.name for consumer in consumers] == ["strategy"]
+    assert "x-client-id" not in route.calls.last.request.headers
+    assert "x-api-key" not in route.calls.last.request.headers
+
+
+def test_clients_endpoint(client):
+    consumer = get_client("strategy")
+    consumer.add(0.5)
+    consumer.add(0.0)
+
+    response = client.get("/clients")
+    assert response.status_code == 200
+    metrics = response.json()["strategy"]
+    assert metrics["requests"] == 2
+    assert metrics["waited"] == 1
+    assert metrics["wait_mean"] == pytest.approx(0.5)
+    assert metrics["quota"] is None
@@ -0,0 +1,150 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ibproxy.main as appmod
+from ibproxy.coalesce import Coalescer
+from ibproxy.mock import MockUpstream, Profile
+from ibproxy.rate import Client, Priority
+
+ACCOUNTS = "/v1/api/iserver/accounts"
+
+
+def test_match():
+    coalescer = Coalescer()
+    assert coalescer.match("GET", "/v1/api/portfolio/U123/summary") == "/v1/api/portfolio/*/summary"
+    # Large responses aren't coalesced, so they can be streamed.
+    assert coalescer.match("GET", "/v1/api/portfolio/U123/positions/0") is None
+    assert coalescer.match("GET", "/v1/api/iserver/marketdata/history") is None
+    assert coalescer.match("POST", ACCOUNTS) is None
+    assert coalescer.match("GET", "/v1/api/iserver/reauthenticate") is None
+
+
+def test_key_is_normalised():
+    assert Coalescer.key("GET", ACCOUNTS, {"b": "2", "a": "1"}) == Coalescer.key("GET", ACCOUNTS, {"a": "1", "b": "2"})
+    assert Coalescer.key("GET", ACCOUNTS, {"a": "1"}) != Coalescer.key("GET", ACCOUNTS, {"a": "2"})
+
+
+def test_run_shares_result():
+    coalescer = Coalescer()
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return object()
+
+    async def _run():
+        return await asyncio.gather(*(coalescer.run("key", "pattern", send) for _ in range(5)))
+
+    results = asyncio.run(_run())
+
+    assert calls == 1
+    assert len({id(result) for result, _ in results}) == 1
+    assert [shared for _, shared in results] == [False, True, True, True, True]
+    assert coalescer.metrics().coalesced == 4
+    assert coalescer.metrics().routes == {"pattern": 4}
+    assert not coalescer.inflight
+
+
+def test_run_shares_exception():
+    coalescer = Coalescer()
+
+    async def send():
+        await asyncio.sleep(0.01)
+        raise httpx.ConnectError("Boom")
+
+    async def _run():
+        return await asyncio.gather(*(coalescer.run("key", "pattern", send) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, httpx.ConnectError) for result in asyncio.run(_run()))
+    assert not coalescer.inflight
+
+
+def test_run_leader_cancelled():
+    coalescer = Coalescer()
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def _run():
+        leader = asyncio.create_task(coalescer.run("key", "pattern", send))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(coalescer.run("key", "pattern", send))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    # The follower sends the request itself.
+    assert asyncio.run(_run()) == (2, False)
+
+
+def test_run_leader_cancelled_followers():
+    coalescer = Coalescer()
+    calls = 0
+
+    async def send():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def _run():
+        leader = asyncio.create_task(coalescer.run("key", "pattern", send))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(coalescer.run("key", "pattern", send)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await asyncio.gather(*followers)
+
+    # One follower takes over as leader and the others share its result.
+    assert asyncio.run(_run()) == [(2, False), (2, True), (2, True)]
+    assert calls == 2
+    assert not coalescer.inflight
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_proxy_coalesces(client, monkeypatch, enabled):
+    if enabled:
+        appmod.app.state.coalescer = Coalescer()
+
+    tokens = []
+
+    async def _enforce(
+        id: str, path: str | None = None, priority: Priority | None = None, client: Client | None = None
+    ) -> None:
+        tokens.append(id)
+
+    monkeypatch.setattr(appmod, "enforce_rate_limit", _enforce)
+    monkeypatch.setattr(appmod, "UPSTREAM", "http://mock/")
+
+    mock = MockUpstream(profiles=[Profile(latency=0.05, jitter=0)])
+
+    async def _run():
+        appmod.app.state.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app()))
+        transport = httpx.ASGITransport(app=appmod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://proxy") as proxy:
+            return await asyncio.gather(*(proxy.get(ACCOUNTS) for _ in range(5)))
+
+    responses = asyncio.run(_run())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.content for response in responses}) == 1
+    assert len({response.headers["X-Request-ID"] for response in responses}) == 5
+    assert len(tokens) == mock.stats()["*"]["requests"] == (1 if enabled else 5)
+
+
+def test_coalesce_endpoint(client, coalescer):
+    response = client.get("/coalesce")
+    assert response.status_code == 200
+    assert response.json() == {"requests": 0, "coalesced": 0, "inflight": 0, "routes": {}}
+
+
+def test_coalesce_endpoint_disabled(client):
+    assert client.get("/coalesce").status_code == 404
@@ -0,0 +1,166 @@
+import gzip
+import zlib
+
+import httpx
+import pytest
+from fastapi import FastAPI, Response
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+import ibproxy.middleware.compress as compressmod
+from ibproxy.middleware.compress import Codec, CompressionMiddleware
+
+BODY = b'{"conid": 265598, "symbol": "AAPL"}' * 100
+
+
+def _app(**kwargs) -> tuple[FastAPI, CompressionMiddleware]:
+    app = FastAPI()
+
+    @app.get("/body/{size}")
+    async def body(size: int) -> Response:
+        return Response(content=(BODY * (size // len(BODY) + 1))[:size], media_type="application/json")
+
+    @app.get("/encoded")
+    async def encoded() -> Response:
+        return Response(
+            content=gzip.compress(BODY), media_type="application/json", headers={"Content-Encoding": "gzip"}
+        )
+
+    @app.get("/events")
+    async def events() -> Response:
+        return Response(content=BODY, media_type="text/event-stream")
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():
+            for _ in range(3):
+                yield BODY
+
+        return StreamingResponse(chunks(), media_type="application/json")
+
+    middleware = CompressionMiddleware(app, **kwargs)
+    return app, middleware
+
+
+def _client(**kwargs) -> tuple[TestClient, CompressionMiddleware]:
+    app, middleware = _app(**kwargs)
+    return TestClient(middleware), middleware
+
+
+def _raw(client: TestClient, path: str, accept_encoding: str = "gzip") -> tuple[httpx.Response, bytes]:
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_compresses_body():
+    client, _ = _client()
+    response, raw = _raw(client, f"/body/{len(BODY)}")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-length"] == str(len(raw))
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert gzip.decompress(raw) == BODY
+
+
+@pytest.mark.parametrize(
+    "path, accept_encoding",
+    [
+        # Too small.
+        ("/body/50", "gzip"),
+        # Already encoded.
+        ("/encoded", "gzip"),
+        # Excluded content type.
+        ("/events", "gzip"),
+        # Client doesn't accept compression.
+        (f"/body/{len(BODY)}", "identity"),
+    ],
+)
+def test_not_compressed(path, accept_encoding):
+    app, middleware = _app()
+    expected, expected_raw = _raw(TestClient(app), path, accept_encoding)
+    response, raw = _raw(TestClient(middleware), path, accept_encoding)
+
+    assert response.headers.get("content-encoding") == expected.headers.get("content-encoding")
+    assert raw == expected_raw
+
+
+def test_compresses_stream():
+    client, _ = _client()
+    response, raw = _raw(client, "/stream")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw) == BODY * 3
+
+
+def test_stream_chunks_are_flushed():
+    encoder = compressmod.CODECS["gzip"].encoder(5)
+    decompressor = zlib.decompressobj(wbits=31)
+    for _ in range(3):
+        assert decompressor.decompress(encoder.compress(BODY)) == BODY
+    assert decompressor.decompress(encoder.finish()) == b""
+    assert decompressor.eof
+
+
+@pytest.mark.parametrize("size, level", [(100, 1), (64 * 1024, 1), (64 * 1024 + 1, 5)])
+def test_level_by_size(size, level):
+    _, middleware = _app()
+    codec = compressmod.CODECS["gzip"]
+    assert middleware.level(codec, size) == level
+    # Streamed bodies use the last tier.
+    assert middleware.level(codec, None) == 5
+
+
+def test_large_bodies_use_thread_pool(monkeypatch):
+    client, middleware = _client(thread_size=len(BODY))
+    submitted = []
+    submit = middleware.executor.submit
+    monkeypatch.setattr(middleware.executor, "submit", lambda fn, *args: submitted.append(fn) or submit(fn, *args))
+
+    _, raw = _raw(client, "/body/200")
+    assert gzip.decompress(raw) == (BODY * 2)[:200]
+    assert not submitted
+
+    _, raw = _raw(client, f"/body/{len(BODY)}")
+    assert gzip.decompress(raw) == BODY
+    assert len(submitted) == 1
+
+    # Each chunk of a stream.
+    _, raw = _raw(client, "/stream")
+    assert gzip.decompress(raw) == BODY * 3
+    assert len(submitted) == 4
+
+
+def test_negotiates_preferred_encoding(monkeypatch):
+    # Stand-in for an optional codec.
+    deflate = Codec("deflate", lambda data, level: zlib.compress(data, level), lambda level: None)
+    monkeypatch.setitem(compressmod.CODECS, "deflate", deflate)
+    client, middleware = _client(encodings=["deflate", "gzip"], levels={"deflate": [(None, 6)], "gzip": [(None, 1)]})
+
+    response, raw = _raw(client, f"/body/{len(BODY)}", "gzip, deflate")
+    assert response.headers["content-encoding"] == "deflate"
+    assert zlib.decompress(raw) == BODY
+
+    response, raw = _raw(client, f"/body/{len(BODY)}", "gzip, deflate;q=0")
+    assert response.headers["content-encoding"] == "gzip"
+
+    assert middleware.negotiate("br") is None
+
+
+def test_unavailable_encodings_are_skipped():
+    _, middleware = _app(encodings=["unknown", "gzip"])
+    assert middleware.encodings == ["gzip"]
+
+
+@pytest.mark.parametrize("name, module", [("br", "brotli"), ("zstd", "zstandard")])
+def test_optional_codecs(name, module):
+    pytest.importorskip(module)
+    from ibproxy.journal.reader import decompress
+
+    client, _ = _client()
+    response, raw = _raw(client, f"/body/{len(BODY)}", name)
+    assert response.headers["content-encoding"] == name
+    assert decompress(raw, name) == BODY
+
+    response, raw = _raw(client, "/stream", name)
+    assert decompress(raw, name) == BODY * 3
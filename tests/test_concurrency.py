@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+import respx
+
+import ibproxy.main as appmod
+from ibproxy.rate import AdaptiveLimit
+
+
+def test_acquire_release():
+    limiter = AdaptiveLimit(initial=2, minimum=1)
+    order = []
+
+    async def _request(i):
+        await limiter.acquire()
+        try:
+            order.append(i)
+            await asyncio.sleep(0.01)
+        finally:
+            limiter.release()
+
+    async def _run():
+        tasks = [asyncio.create_task(_request(i)) for i in range(5)]
+        await asyncio.sleep(0.001)
+        assert limiter.inflight == 2
+        assert limiter.metrics().queued == 3
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    # Waiting requests get slots in order of arrival.
+    assert order == [0, 1, 2, 3, 4]
+    assert limiter.inflight == 0
+    assert limiter.waited == 3
+
+
+def test_cancel_waiting():
+    limiter = AdaptiveLimit(initial=1, minimum=1)
+
+    async def _run():
+        await limiter.acquire()
+        task = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        limiter.release()
+
+    asyncio.run(_run())
+    assert limiter.inflight == 0
+    assert not limiter.waiters
+
+
+def test_shrinks_when_latency_rises():
+    limiter = AdaptiveLimit(initial=20, minimum=4)
+    limiter.inflight = 20
+    for _ in range(20):
+        limiter.sample(0.1)
+    assert limiter.limit > 20
+
+    high = limiter.limit
+    for _ in range(20):
+        limiter.sample(1.0)
+    assert limiter.limit < high
+    assert limiter.limit >= 4
+
+
+def test_grows_only_when_used():
+    limiter = AdaptiveLimit(initial=20, maximum=30)
+    for _ in range(50):
+        limiter.sample(0.1)
+    # Only a few requests in flight, so no need for a higher limit.
+    assert limiter.limit == 20
+
+    limiter.inflight = 20
+    for _ in range(100):
+        limiter.sample(0.1)
+    assert limiter.limit == 30
+
+
+def test_upstream_endpoint(client):
+    assert client.get("/upstream").status_code == 404
+
+    appmod.app.state.limiter = AdaptiveLimit()
+    with respx.mock(assert_all_called=True) as mock:
+        mock.get("https://api.test/v1/api/iserver/accounts").respond(200, json={})
+        assert client.get("/v1/api/iserver/accounts").status_code == 200
+
+    response = client.get("/upstream")
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["limit"] == 20
+    assert metrics["inflight"] == 0
+    assert metrics["queued"] == 0
+    assert metrics["requests"] == 1
+    assert metrics["rtt"] is not None
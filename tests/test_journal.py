@@ -0,0 +1,326 @@
+import asyncio
+import gzip
+import json
+import threading
+import zlib
+
+import pytest
+
+from ibproxy.journal import (
+    JournalEntry,
+    JournalWriter,
+    Overflow,
+    SegmentWriter,
+    iter_journal,
+    iter_records,
+    read_record,
+    segments,
+)
+
+REQUEST = {"id": "abc123", "url": "https://api.test/v1/api/test", "method": "GET", "params": {}, "body": None}
+
+
+def _entry(
+    id: str = "abc123",
+    body: bytes = b'{"ok": true}',
+    content_type: str | None = "application/json",
+    content_encoding: str | None = None,
+):
+    entry = JournalEntry(
+        {**REQUEST, "id": id}, status_code=200, content_type=content_type, content_encoding=content_encoding
+    )
+    # Feed the body in small chunks.
+    for i in range(0, len(body), 4):
+        entry.write(body[i : i + 4])
+    entry.close(0.25)
+    return entry
+
+
+def test_entry_round_trip(tmp_path):
+    segment = SegmentWriter(tmp_path)
+    path, offset = segment.write(_entry(body=b'{"conids": [1, 2, 3]}'))
+    segment.close()
+
+    record = read_record(path, offset)
+
+    assert record["request"] == REQUEST
+    assert record["response"]["status_code"] == 200
+    assert record["response"]["size"] == 21
+    assert record["response"]["data"] == {"conids": [1, 2, 3]}
+    assert record["duration"] == 0.25
+    assert record["phases"] is None
+
+
+def test_entry_phases(tmp_path):
+    entry = JournalEntry(REQUEST, status_code=200, content_type="application/json")
+    entry.close(0.25, {"pool": 0.0, "connect": 0.0, "tls": 0.0, "send": 0.01, "server": 0.2, "receive": 0.04})
+    segment = SegmentWriter(tmp_path)
+    path, offset = segment.write(entry)
+    segment.close()
+
+    assert read_record(path, offset)["phases"]["server"] == 0.2
+
+
+def test_entry_empty_json_body_is_none(tmp_path):
+    segment = SegmentWriter(tmp_path)
+    path, offset = segment.write(_entry(body=b""))
+    segment.close()
+
+    assert read_record(path, offset)["response"]["data"] is None
+
+
+@pytest.mark.parametrize("content_type", ["text/html; charset=utf-8", None])
+def test_entry_text_body(tmp_path, content_type):
+    text = 'File "not" found: ⚠️\n'
+    segment = SegmentWriter(tmp_path)
+    # Chunks will split a multi-byte character.
+    path, offset = segment.write(_entry(body=text.encode("utf-8"), content_type=content_type))
+    segment.close()
+
+    assert read_record(path, offset)["response"]["data"] == text
+
+
+@pytest.mark.parametrize(
+    "content_encoding, compress",
+    [
+        ("gzip", gzip.compress),
+        # Several gzip members.
+        ("gzip", lambda data: gzip.compress(data[:10]) + gzip.compress(data[10:])),
+        ("deflate", zlib.compress),
+        ("deflate", lambda data: zlib.compress(data, wbits=-15)),
+    ],
+)
+def test_entry_encoded_body(tmp_path, content_encoding, compress):
+    body = json.dumps({"conids": list(range(100))}).encode()
+    encoded = compress(body)
+    segment = SegmentWriter(tmp_path)
+    path, offset = segment.write(_entry(body=encoded, content_encoding=content_encoding))
+    path, after = segment.write(_entry(id="def456"))
+    segment.close()
+
+    record = read_record(path, offset)
+    assert record["response"]["content_encoding"] == content_encoding
+    assert record["response"]["size"] == len(encoded)
+    assert record["response"]["data"] == json.loads(body)
+    # Bodies can still be skipped.
+    assert [record["request"]["id"] for _, record in iter_records(path, data=False)] == ["abc123", "def456"]
+
+
+def test_entry_gzip_body_stored_as_is():
+    encoded = gzip.compress(b'{"ok": true}')
+    entry = _entry(body=encoded, content_encoding="gzip")
+
+    entry.buffer.seek(0)
+    assert entry.buffer.read() == encoded
+    assert entry.stored == len(encoded)
+
+
+def test_segment_is_gzip(tmp_path):
+    segment = SegmentWriter(tmp_path)
+    segment.write(_entry("a", b'{"a": 1}'))
+    path, _ = segment.write(_entry("b", b'{"b": 2}'))
+    segment.close()
+
+    # Segment is a valid multi-member gzip file.
+    content = gzip.decompress(path.read_bytes()).decode("utf-8")
+    assert '{"a": 1}' in content
+    assert '{"b": 2}' in content
+
+
+def test_segment_offsets(tmp_path):
+    segment = SegmentWriter(tmp_path)
+    locations = [segment.write(_entry(id, json.dumps({"id": id}).encode())) for id in "abc"]
+    segment.close()
+
+    # All records in one segment.
+    assert len({path for path, _ in locations}) == 1
+
+    for id, (path, offset) in zip("abc", locations):
+        assert read_record(path, offset)["response"]["data"] == {"id": id}
+
+    records = list(iter_records(locations[0][0], data=False))
+    assert [offset for offset, _ in records] == [offset for _, offset in locations]
+    assert all("data" not in record["response"] for _, record in records)
+
+
+def test_segment_rolls_on_size(tmp_path):
+    segment = SegmentWriter(tmp_path, size=1)
+    first, _ = segment.write(_entry("a"))
+    second, offset = segment.write(_entry("b"))
+    segment.close()
+
+    # Same interval, next sequence number.
+    assert first != second
+    assert offset == 0
+    assert first.name.endswith("-00.json.gz")
+    assert second.name.endswith("-01.json.gz")
+    assert len(list(tmp_path.glob("*/*.json.gz"))) == 2
+    assert [record["request"]["id"] for record in iter_journal(tmp_path)] == ["a", "b"]
+
+
+def test_segment_skips_full_segments(tmp_path):
+    segment = SegmentWriter(tmp_path, size=1)
+    first, _ = segment.write(_entry("a"))
+    segment.close()
+
+    # After a restart, a full segment isn't reopened.
+    segment = SegmentWriter(tmp_path, size=1)
+    second, _ = segment.write(_entry("b"))
+    segment.close()
+
+    assert second.name.endswith("-01.json.gz")
+
+
+def test_segments_order(tmp_path):
+    names = ["20250822-123400-10.json.gz", "20250822-123400-02.json.gz", "20250822-123400.json.gz"]
+    names += ["20250822-123500-00.json.gz", "20250822-123400-100.json.gz"]
+    for name in names:
+        (tmp_path / "20250822").mkdir(exist_ok=True)
+        (tmp_path / "20250822" / name).touch()
+
+    assert [path.name for path in segments(tmp_path)] == [
+        "20250822-123400.json.gz",
+        "20250822-123400-02.json.gz",
+        "20250822-123400-10.json.gz",
+        "20250822-123400-100.json.gz",
+        "20250822-123500-00.json.gz",
+    ]
+
+
+def test_segment_rolls_on_interval(tmp_path, monkeypatch):
+    now = [1_000_030.0]
+    monkeypatch.setattr("ibproxy.journal.segment.time.time", lambda: now[0])
+
+    segment = SegmentWriter(tmp_path, interval=60)
+    first, _ = segment.write(_entry("a"))
+    now[0] += 60
+    second, _ = segment.write(_entry("b"))
+    segment.close()
+
+    assert first != second
+    assert first.name == "19700112-134700-00.json.gz"
+    assert second.name == "19700112-134800-00.json.gz"
+    assert [record["request"]["id"] for record in iter_journal(tmp_path)] == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_entries(tmp_path):
+    writer = JournalWriter(tmp_path, batch_size=3, flush_interval=10)
+    writer.start()
+
+    for id in "abcd":
+        await writer.submit(_entry(id))
+    # Give the writer time to handle the first (full) batch.
+    for _ in range(10):
+        await asyncio.sleep(0.01)
+    written = [record["request"]["id"] for record in iter_journal(tmp_path)]
+    assert written == ["a", "b", "c"]
+
+    # Remaining entries are written when the writer stops.
+    await writer.stop()
+    assert [record["request"]["id"] for record in iter_journal(tmp_path)] == ["a", "b", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_writer_complete_compresses_on_journal_thread(tmp_path, monkeypatch):
+    writer = JournalWriter(tmp_path)
+    entry = JournalEntry(REQUEST, status_code=200, content_type="application/json")
+    entry.write(b'{"conids": [1, 2, 3]}')
+    # Chunks are spooled without being compressed.
+    assert entry.buffer.tell() == 0
+
+    threads = []
+    close = entry.close
+    monkeypatch.setattr(entry, "close", lambda *args: threads.append(threading.current_thread().name) or close(*args))
+    await writer.complete(entry, 0.25, {"server": 0.2})
+    await writer.stop()
+
+    assert threads[0].startswith("journal")
+    ((_, record),) = iter_records(writer.segments.path)
+    assert record["response"]["data"] == {"conids": [1, 2, 3]}
+    assert record["duration"] == 0.25
+    assert record["phases"] == {"server": 0.2}
+
+
+@pytest.mark.asyncio
+async def test_writer_flushes_after_interval(tmp_path):
+    writer = JournalWriter(tmp_path, flush_interval=0.01)
+    writer.start()
+
+    await writer.submit(_entry("a"))
+    await asyncio.sleep(0.1)
+
+    assert [record["request"]["id"] for record in iter_journal(tmp_path)] == ["a"]
+    await writer.stop()
+
+
+async def _fill(writer: JournalWriter, ids: str) -> list[str]:
+    """Submit entries to a writer that isn't running and then return the IDs that were written."""
+    for id in ids:
+        await writer.submit(_entry(id))
+    await writer.stop()
+    return [record["request"]["id"] for record in iter_journal(writer.directory)]
+
+
+@pytest.mark.asyncio
+async def test_writer_drop_newest(tmp_path):
+    writer = JournalWriter(tmp_path, queue_size=2, overflow=Overflow.DROP_NEWEST)
+
+    assert await _fill(writer, "abcd") == ["a", "b"]
+    assert writer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_drop_oldest(tmp_path):
+    writer = JournalWriter(tmp_path, queue_size=2, overflow=Overflow.DROP_OLDEST)
+
+    assert await _fill(writer, "abcd") == ["c", "d"]
+    assert writer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_sample(tmp_path):
+    writer = JournalWriter(tmp_path, queue_size=4, overflow=Overflow.SAMPLE, sample_rate=3)
+
+    # Everything is kept until the queue is half full, then only every third entry.
+    assert await _fill(writer, "abcdefgh") == ["a", "b", "e", "h"]
+    assert writer.dropped == 4
+
+
+@pytest.mark.asyncio
+async def test_writer_block(tmp_path):
+    writer = JournalWriter(tmp_path, queue_size=2, overflow=Overflow.BLOCK)
+    for id in "ab":
+        await writer.submit(_entry(id))
+
+    # Queue is full, so the next submit waits until the writer makes space.
+    blocked = asyncio.create_task(writer.submit(_entry("c")))
+    await asyncio.sleep(0.01)
+    assert not blocked.done()
+
+    writer.start()
+    await blocked
+    await writer.stop()
+
+    assert [record["request"]["id"] for record in iter_journal(tmp_path)] == ["a", "b", "c"]
+    assert writer.dropped == 0
+
+
+@pytest.mark.asyncio
+async def test_writer_metrics(tmp_path):
+    writer = JournalWriter(tmp_path, queue_size=2, overflow=Overflow.DROP_NEWEST)
+    for id in "abc":
+        await writer.submit(_entry(id))
+
+    metrics = writer.metrics()
+    assert metrics.queued == 2
+    assert metrics.submitted == 3
+    assert metrics.dropped == 1
+    assert metrics.written == 0
+
+    await writer.stop()
+
+    metrics = writer.metrics()
+    assert metrics.queued == 0
+    assert metrics.written == 2
+    assert metrics.latency_max >= metrics.latency_mean > 0
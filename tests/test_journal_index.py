@@ -0,0 +1,126 @@
+import asyncio
+import json
+import sys
+from datetime import UTC, datetime
+
+import pytest
+
+from ibproxy.journal import JournalEntry, JournalIndex, JournalWriter
+from ibproxy.journal.cli import main, status_range
+
+RECORDS = [
+    # (id, timestamp, method, path, status)
+    ("a1", "2025-08-19T10:00:00", "GET", "/v1/api/iserver/accounts", 200),
+    ("b2", "2025-08-19T11:00:00", "POST", "/v1/api/iserver/account/U123/orders", 500),
+    ("c3", "2025-08-19T12:00:00", "POST", "/v1/api/iserver/account/U123/orders", 200),
+    ("d4", "2025-08-20T09:00:00", "POST", "/v1/api/iserver/account/U456/orders", 503),
+    ("e5", "2025-08-20T10:00:00", "GET", "/v1/api/portfolio/U123/positions/0", 404),
+]
+
+
+def _entry(id, timestamp, method, path, status_code) -> JournalEntry:
+    entry = JournalEntry(
+        {"id": id, "url": f"https://api.test{path}", "method": method, "params": {}, "body": None},
+        status_code=status_code,
+        content_type="application/json",
+        timestamp=datetime.fromisoformat(timestamp).replace(tzinfo=UTC),
+    )
+    entry.write(json.dumps({"id": id}).encode())
+    entry.close(0.1)
+    return entry
+
+
+@pytest.fixture
+def journal(tmp_path):
+    async def _write():
+        writer = JournalWriter(tmp_path)
+        for record in RECORDS:
+            await writer.submit(_entry(*record))
+        await writer.stop()
+
+    asyncio.run(_write())
+    return tmp_path
+
+
+def _ids(records) -> list[str]:
+    return [record.id for record in records]
+
+
+def test_writer_indexes_records(journal):
+    index = JournalIndex(journal)
+
+    assert _ids(index.query()) == ["a1", "b2", "c3", "d4", "e5"]
+
+    (record,) = index.query(id="c3")
+    assert record.method == "POST"
+    assert record.path == "/v1/api/iserver/account/U123/orders"
+    assert record.status_code == 200
+    assert index.read(record)["response"]["data"] == {"id": "c3"}
+
+
+def test_query_filters(journal):
+    index = JournalIndex(journal)
+
+    orders = "/v1/api/iserver/account/*/orders"
+    assert _ids(index.query(method="post", path=orders, status=(500, 599))) == ["b2", "d4"]
+    assert _ids(index.query(since=datetime(2025, 8, 20, tzinfo=UTC))) == ["d4", "e5"]
+    assert _ids(index.query(until=datetime(2025, 8, 19, 11, tzinfo=UTC))) == ["a1"]
+    assert _ids(index.query(status=(404, 404))) == ["e5"]
+    assert _ids(index.query(limit=2)) == ["a1", "b2"]
+
+
+def test_rebuild(journal):
+    (journal / "index.sqlite").unlink()
+
+    index = JournalIndex(journal)
+    assert index.query() == []
+    assert index.rebuild() == len(RECORDS)
+    assert _ids(index.query()) == ["a1", "b2", "c3", "d4", "e5"]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("5xx", (500, 599)), ("4XX", (400, 499)), ("404", (404, 404))],
+)
+def test_status_range(value, expected):
+    assert status_range(value) == expected
+
+
+def test_cli_summary(journal, monkeypatch, capsys):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "ibproxy-journal",
+            "--journal",
+            str(journal),
+            "--path",
+            "*/orders",
+            "--status",
+            "5xx",
+            "--since",
+            "2025-08-19",
+        ],
+    )
+    main()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert "b2" in lines[0] and "500" in lines[0]
+    assert "d4" in lines[1] and "503" in lines[1]
+
+
+def test_cli_full(journal, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["ibproxy-journal", "--journal", str(journal), "--id", "e5", "--full"])
+    main()
+
+    (line,) = capsys.readouterr().out.splitlines()
+    record = json.loads(line)
+    assert record["request"]["id"] == "e5"
+    assert record["response"]["data"] == {"id": "e5"}
+
+
+def test_cli_missing_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["ibproxy-journal", "--journal", str(tmp_path)])
+    with pytest.raises(SystemExit):
+        main()
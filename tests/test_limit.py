@@ -0,0 +1,333 @@
+import asyncio
+import time
+from datetime import UTC, datetime, timedelta
+from email.utils import format_datetime
+
+import pytest
+import respx
+
+import ibproxy.main as appmod
+import ibproxy.rate.limit as limitmod
+from ibproxy.rate import Priority, priority
+from ibproxy.rate.limit import LeakyBucket, Limit
+from ibproxy.util import retry_after
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    """
+    Replace the global bucket and endpoint limits.
+    """
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1000))
+    limits = [
+        Limit.from_rule("/v1/api/iserver/account/orders", 50, 1, None),
+        Limit.from_rule("/v1/api/iserver/marketdata/history", None, None, 2),
+    ]
+    monkeypatch.setattr(limitmod, "_limits", limits)
+    return limits
+
+
+def test_bucket_slot():
+    bucket = LeakyBucket(rate=100, burst=2)
+
+    async def _run():
+        assert await bucket.slot() == 0
+        assert await bucket.slot() == 0
+        # Bucket is empty, so wait for the next token.
+        assert await bucket.slot() == pytest.approx(0.01, abs=0.005)
+
+    asyncio.run(_run())
+    assert bucket.granted[Priority.NORMAL] == 3
+
+
+def test_match():
+    assert limitmod.match("/v1/api/iserver/account/orders").bucket.rate == pytest.approx(0.2)
+    assert limitmod.match("/v1/api/iserver/marketdata/history").semaphore is not None
+    assert limitmod.match("/v1/api/fyi/unreadnumber").pattern == "/v1/api/fyi/*"
+    # Order placement isn't subject to the order status limit.
+    assert limitmod.match("/v1/api/iserver/account/U123/orders") is None
+
+
+def test_endpoint_rate_limit(limits):
+    async def _run():
+        start = time.perf_counter()
+        for _ in range(3):
+            await limitmod.enforce_rate_limit("id", "/v1/api/iserver/account/orders")
+        return time.perf_counter() - start
+
+    # First request uses the burst, the next two wait for the endpoint bucket.
+    assert asyncio.run(_run()) >= 0.035
+    # Other endpoints only use the global bucket.
+    asyncio.run(limitmod.enforce_rate_limit("id", "/v1/api/iserver/accounts"))
+
+
+def test_global_slot_not_held_while_waiting(limits, monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(0.001, 1))
+    limits[0].bucket.tokens = 0
+
+    async def _run():
+        task = asyncio.create_task(limitmod.enforce_rate_limit("id", "/v1/api/iserver/account/orders"))
+        await asyncio.sleep(0.005)
+        # Still waiting for the endpoint bucket and global slot not reserved.
+        assert not task.done()
+        assert limitmod._bucket.tokens == pytest.approx(1, abs=0.01)
+        await task
+
+    asyncio.run(_run())
+    assert limitmod._bucket.tokens == pytest.approx(0, abs=0.01)
+
+
+def test_fifo(limits, monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(100, 1))
+    monkeypatch.setattr(limitmod, "_queue", limitmod.Queue())
+
+    order = []
+
+    async def _request(i):
+        await limitmod.enforce_rate_limit(str(i), "/v1/api/iserver/accounts")
+        order.append(i)
+
+    async def _run():
+        tasks = [asyncio.create_task(_request(i)) for i in range(5)]
+        await asyncio.sleep(0.001)
+        assert limitmod.waiting()[Priority.NORMAL] == 4
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+
+    # Requests are granted in order of arrival.
+    assert order == [0, 1, 2, 3, 4]
+    assert limitmod.waiting()[Priority.NORMAL] == 0
+    assert limitmod.queue().waited == 4
+    assert limitmod.queue().longest == pytest.approx(0.04, abs=0.01)
+
+
+def test_priority_order(limits, monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(1000, 1, shares={}))
+
+    order = []
+
+    async def _request(name, priority):
+        await limitmod.enforce_rate_limit(name, "/v1/api/iserver/accounts", priority)
+        order.append(name)
+
+    async def _run():
+        # Uses the only token.
+        await limitmod.enforce_rate_limit("first")
+        tasks = [
+            asyncio.create_task(_request("low", Priority.LOW)),
+            asyncio.create_task(_request("normal", Priority.NORMAL)),
+            asyncio.create_task(_request("high", Priority.HIGH)),
+        ]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    assert order == ["high", "normal", "low"]
+    assert limitmod.granted() == {Priority.NORMAL: 2, Priority.HIGH: 1, Priority.LOW: 1}
+
+
+def test_minimum_share():
+    bucket = LeakyBucket(rate=1000, burst=1, shares={"low": 0.25})
+
+    order = []
+
+    async def _request(priority):
+        await bucket.slot(priority)
+        order.append(priority)
+
+    async def _run():
+        await bucket.slot(Priority.HIGH)
+        tasks = [asyncio.create_task(_request(Priority.HIGH)) for _ in range(7)]
+        tasks += [asyncio.create_task(_request(Priority.LOW)) for _ in range(2)]
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_run())
+    # Low priority requests get a share of slots while high priority requests are waiting.
+    assert order.index(Priority.LOW) < 7
+    assert order[-1] == Priority.HIGH
+
+
+def test_priority():
+    assert priority("/v1/api/iserver/account/U123/orders") == Priority.HIGH
+    assert priority("/v1/api/iserver/marketdata/snapshot") == Priority.LOW
+    assert priority("/v1/api/portfolio/accounts") == Priority.NORMAL
+    # Header overrides the rules. Invalid values are ignored.
+    assert priority("/v1/api/iserver/marketdata/snapshot", "High") == Priority.HIGH
+    assert priority("/v1/api/iserver/marketdata/snapshot", "urgent") == Priority.LOW
+
+
+def test_priority_header_not_forwarded(client, monkeypatch):
+    priorities = []
+
+    async def _enforce(id, path=None, priority=Priority.NORMAL, client=None):
+        priorities.append(priority)
+
+    monkeypatch.setattr(appmod, "enforce_rate_limit", _enforce)
+
+    with respx.mock(assert_all_called=True) as mock:
+        route = mock.get("https://api.test/v1/api/iserver/marketdata/snapshot").respond(200, json=[])
+        response = client.get("/v1/api/iserver/marketdata/snapshot", headers={"X-Priority": "high"})
+
+    assert response.status_code == 200
+    assert priorities == [Priority.HIGH]
+    assert "x-priority" not in route.calls.last.request.headers
+
+
+def test_cancel_releases_slot(limits, monkeypatch):
+    monkeypatch.setattr(limitmod, "_bucket", LeakyBucket(10, 1))
+
+    async def _run():
+        await limitmod.enforce_rate_limit("a")
+        task = asyncio.create_task(limitmod.enforce_rate_limit("b"))
+        await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(_run())
+    assert limitmod._bucket.tokens == pytest.approx(0, abs=0.05)
+
+
+def test_throttle_and_recover():
+    bucket = LeakyBucket(rate=10, burst=10)
+
+    bucket.throttle()
+    assert bucket.rate == pytest.approx(5)
+    assert bucket.tokens == pytest.approx(0, abs=0.01)
+    # Throttled responses that arrive together only cut the rate once.
+    bucket.throttle()
+    assert bucket.rate == pytest.approx(5)
+    assert bucket.throttled == 2
+
+    # Rate recovers additively, up to the configured rate.
+    bucket.recover()
+    assert bucket.rate == pytest.approx(5.1)
+    for _ in range(100):
+        bucket.recover()
+    assert bucket.rate == 10
+
+
+def test_throttle_floor():
+    bucket = LeakyBucket(rate=10, burst=10)
+    for _ in range(10):
+        bucket.cut = -float("inf")
+        bucket.throttle()
+    assert bucket.rate == pytest.approx(1)
+
+
+def test_throttle_retry_after():
+    bucket = LeakyBucket(rate=100, burst=10)
+    bucket.throttle(0.05)
+
+    async def _run():
+        return await bucket.slot()
+
+    # No slots until Retry-After has elapsed.
+    assert asyncio.run(_run()) == pytest.approx(0.05, abs=0.02)
+
+
+def test_adapt(limits):
+    endpoint = limits[0].bucket
+
+    limitmod.adapt("/v1/api/iserver/account/orders", 429, {"retry-after": "1"})
+    assert endpoint.rate == pytest.approx(25)
+    assert limitmod._bucket.rate == 1000
+
+    limitmod.adapt("/v1/api/iserver/accounts", 429, {})
+    buckets = limitmod.snapshot()
+    assert buckets["*"].rate == pytest.approx(500)
+    assert buckets["/v1/api/iserver/account/orders"].rate == pytest.approx(25)
+    assert buckets["/v1/api/iserver/account/orders"].ceiling == 50
+    assert sum(bucket.throttled for bucket in buckets.values()) == 2
+
+    limitmod.adapt("/v1/api/iserver/account/orders", 200, {})
+    assert endpoint.rate == pytest.approx(25.5)
+    assert limitmod._bucket.rate == pytest.approx(510)
+    # Errors other than throttling don't change the rate.
+    limitmod.adapt("/v1/api/iserver/accounts", 500, {})
+    assert limitmod._bucket.rate == pytest.approx(510)
+
+
+def test_snapshot():
+    bucket = LeakyBucket(rate=100, burst=10)
+
+    async def _run():
+        for _ in range(10):
+            await bucket.slot()
+        task = asyncio.create_task(bucket.slot())
+        await asyncio.sleep(0)
+        state = bucket.snapshot()
+        await task
+        return state
+
+    state = asyncio.run(_run())
+    assert state.waiting == 1
+    assert state.tokens < 1
+    # Snapshot doesn't change the bucket.
+    tokens = bucket.tokens
+    bucket.snapshot()
+    assert bucket.tokens == tokens
+    assert bucket.waiting() == 0
+
+
+def test_retry_after():
+    assert retry_after("5") == 5
+    assert retry_after(None) is None
+    assert retry_after("soon") is None
+    assert retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    later = format_datetime(datetime.now(UTC) + timedelta(seconds=30), usegmt=True)
+    assert retry_after(later) == pytest.approx(30, abs=2)
+
+
+def test_throttled_response(client, monkeypatch):
+    adapted = []
+    monkeypatch.setattr(appmod, "adapt", lambda *args: adapted.append(args))
+
+    with respx.mock(assert_all_called=True) as mock:
+        mock.get("https://api.test/v1/api/iserver/accounts").respond(
+            429, json={"error": "Too many requests"}, headers={"Retry-After": "3"}
+        )
+        response = client.get("/v1/api/iserver/accounts")
+
+    assert response.status_code == 502
+    assert response.headers["retry-after"] == "3"
+    ((path, status_code, headers),) = adapted
+    assert (path, status_code, headers["retry-after"]) == ("/v1/api/iserver/accounts", 429, "3")
+
+
+def test_rate_endpoint(client):
+    response = client.get("/rate")
+    assert response.status_code == 200
+    assert set(response.json()) == {
+        "rate",
+        "queued",
+        "waiting",
+        "granted",
+        "waited",
+        "wait_mean",
+        "wait_max",
+        "limit",
+        "throttled",
+        "reduced",
+    }
+    assert set(response.json()["waiting"]) == {"high", "normal", "low"}
+
+
+def test_concurrency_limit(limits):
+    active = 0
+    peak = 0
+
+    async def _request():
+        nonlocal active, peak
+        async with limitmod.concurrency_limit("/v1/api/iserver/marketdata/history"):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def _run():
+        limits[1].semaphore = asyncio.Semaphore(2)
+        await asyncio.gather(*(_request() for _ in range(5)))
+
+    asyncio.run(_run())
+    assert peak == 2
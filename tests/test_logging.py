@@ -8,7 +8,7 @@ import ibproxy.main as ibproxy
 
 
 @pytest.mark.asyncio
-@patch("ibproxy.main.httpx.AsyncClient.request")
+@patch("ibproxy.main.httpx.AsyncClient.send")
 async def test_proxy_logs_headers_and_params(
     mock_http_request, caplog: pytest.LogCaptureFixture, dummy_response, mock_request
 ):
@@ -36,7 +36,7 @@ async def test_proxy_logs_headers_and_params(
 
 
 def test_proxy_logs_request(caplog: pytest.LogCaptureFixture, dummy_response, client: TestClient):
-    with patch("ibproxy.main.httpx.AsyncClient.request", return_value=dummy_response):
+    with patch("ibproxy.main.httpx.AsyncClient.send", return_value=dummy_response):
         caplog.set_level("INFO")
         response = client.get("/test")
         assert response.status_code == 200
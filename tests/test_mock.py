@@ -0,0 +1,111 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import ibproxy.main as appmod
+from ibproxy.mock import MockAuth, MockUpstream, Profile, load_profiles, payload
+
+
+@pytest.fixture
+def mock():
+    return MockUpstream(profiles=[Profile(latency=0)], seed=42)
+
+
+def test_payload():
+    data = payload(10_000)
+    assert 10_000 <= len(data) < 10_200
+    assert data.startswith(b"[{") and data.endswith(b"}]")
+
+
+def test_match():
+    mock = MockUpstream()
+    assert mock.match("/v1/api/iserver/marketdata/history").concurrency == 5
+    assert mock.match("/v1/api/portfolio/U123/positions/0").size == 50_000
+    assert mock.match("/v1/api/unknown").pattern == "*"
+
+
+def test_rate(mock):
+    mock.profiles = [Profile(latency=0, rate=1, burst=2)]
+    client = TestClient(mock.app())
+
+    statuses = [client.get("/v1/api/iserver/accounts").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+
+    response = client.get("/v1/api/iserver/accounts")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+
+    assert client.get("/mock/stats").json() == {"*": {"requests": 4, "throttled": 2, "errors": 0}}
+
+
+def test_penalty(mock):
+    mock.profiles = [Profile(latency=0, rate=1, burst=1, penalty=10)]
+    client = TestClient(mock.app())
+
+    assert client.get("/").status_code == 200
+    response = client.get("/")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "10"
+
+
+def test_gzip(mock):
+    mock.profiles = [Profile(latency=0, size=10_000, gzip=True)]
+    client = TestClient(mock.app())
+
+    response = client.get("/")
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < 10_000
+    assert response.content == payload(10_000)
+
+
+def test_errors(mock):
+    mock.profiles = [Profile(latency=0, error_rate=1)]
+    client = TestClient(mock.app())
+
+    assert client.get("/").status_code == 503
+
+
+def test_concurrency(mock):
+    mock.profiles = [Profile(latency=0.05, jitter=0, concurrency=2)]
+
+    async def _run():
+        return await asyncio.gather(*(mock.handle("GET", "/") for _ in range(3)))
+
+    statuses = sorted(response.status_code for response in asyncio.run(_run()))
+    assert statuses == [200, 200, 429]
+
+
+def test_load_profiles(tmp_path):
+    path = tmp_path / "profiles.yaml"
+    path.write_text("- pattern: /v1/api/iserver/*\n  rate: 5\n  latency: 0.1\n")
+
+    profiles = load_profiles(path)
+    assert profiles[0] == Profile("/v1/api/iserver/*", rate=5, latency=0.1)
+    assert profiles[-1].pattern == "*"
+
+
+def test_mock_auth():
+    auth = MockAuth()
+
+    async def _run():
+        await auth.connect()
+        await auth.tickle()
+        return await auth.status()
+
+    assert asyncio.run(_run()).connected
+    assert auth.is_connected()
+    assert auth.tickles == 1
+
+
+def test_proxy_to_mock(client, monkeypatch):
+    mock = MockUpstream(profiles=[Profile(latency=0, size=1_000)], seed=42)
+    monkeypatch.setattr(appmod, "UPSTREAM", "http://mock/")
+    appmod.app.state.auth = MockAuth()
+    appmod.app.state.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=mock.app()))
+
+    response = client.get("/v1/api/iserver/accounts")
+    assert response.status_code == 200
+    assert len(response.json()) > 1
+    assert mock.stats()["*"]["requests"] == 1
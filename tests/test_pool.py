@@ -0,0 +1,280 @@
+import logging
+from unittest.mock import Mock, patch
+
+import httpcore
+import httpx
+import pytest
+import respx
+
+import ibproxy.const as constmod
+import ibproxy.main as appmod
+import ibproxy.pool as poolmod
+import ibproxy.rate as ratemod
+import ibproxy.rate.limit as limitmod
+from ibproxy.pool import PHASES, Trace, close_idle, pool_metrics, prewarm
+from ibproxy.rate import Priority
+from ibproxy.rate.limit import LeakyBucket
+
+from .conftest import DummyAuth
+
+URL = "https://api.test/"
+
+
+@pytest.fixture(autouse=True)
+def bucket(monkeypatch) -> LeakyBucket:
+    bucket = LeakyBucket(1000, 1000)
+    monkeypatch.setattr(limitmod, "_bucket", bucket)
+    ratemod.clear()
+    yield bucket
+    ratemod.clear()
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_prewarm_opens_connections():
+    route = respx.head(URL).mock(return_value=httpx.Response(200))
+
+    async with httpx.AsyncClient() as client:
+        assert await prewarm(client, URL, 5) == 5
+
+    assert route.call_count == 5
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_prewarm_failures(caplog: pytest.LogCaptureFixture):
+    respx.head(URL).mock(side_effect=[httpx.Response(404), httpx.ConnectError("boom"), httpx.ConnectError("boom")])
+
+    async with httpx.AsyncClient() as client:
+        # Any response means that the connection was opened.
+        assert await prewarm(client, URL, 3) == 1
+
+    assert "Opened 1 of 3 upstream connections" in caplog.text
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_prewarm_is_rate_limited(bucket):
+    respx.head(URL).mock(return_value=httpx.Response(429))
+
+    async with httpx.AsyncClient() as client:
+        await prewarm(client, URL, 2)
+
+    # Slots in the global bucket at low priority.
+    assert bucket.granted == {Priority.LOW: 2}
+    assert ratemod.count("/") == 2
+    # Upstream throttling cuts the global rate.
+    assert bucket.throttled == 2
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_prewarm_maximum(caplog: pytest.LogCaptureFixture):
+    route = respx.head(URL).mock(return_value=httpx.Response(200))
+
+    async with httpx.AsyncClient() as client:
+        assert await prewarm(client, URL, constmod.PREWARM_MAXIMUM + 10) == constmod.PREWARM_MAXIMUM
+
+    assert route.call_count == constmod.PREWARM_MAXIMUM
+    assert f"Open at most {constmod.PREWARM_MAXIMUM} upstream connections" in caplog.text
+
+
+def _args(**kwargs) -> Mock:
+    return Mock(
+        debug=False,
+        port=constmod.API_PORT,
+        config="config.yaml",
+        stream=False,
+        upstream=None,
+        routes=None,
+        mock_auth=False,
+        journal_overflow="block",
+        tickle_mode="off",
+        tickle_interval=0.01,
+        **{"http2": False, "prewarm": 0, **kwargs},
+    )
+
+
+@pytest.mark.asyncio
+@respx.mock
+@patch("ibproxy.main.ibauth.auth_from_yaml")
+async def test_lifespan_prewarms(mock_auth_from_yaml, monkeypatch):
+    route = respx.head(URL).mock(return_value=httpx.Response(200))
+    monkeypatch.setattr(appmod, "UPSTREAM", URL)
+    mock_auth_from_yaml.return_value = DummyAuth()
+    appmod.app.state.args = _args(prewarm=4)
+
+    async with appmod.lifespan(appmod.app):
+        assert route.call_count == 4
+        # Repeated after a reset.
+        await appmod.app.state.prewarm()
+        assert route.call_count == 8
+
+
+@pytest.mark.asyncio
+@respx.mock
+@patch("ibproxy.main.ibauth.auth_from_yaml")
+async def test_lifespan_without_prewarm(mock_auth_from_yaml, monkeypatch):
+    route = respx.head(URL).mock(return_value=httpx.Response(200))
+    monkeypatch.setattr(appmod, "UPSTREAM", URL)
+    mock_auth_from_yaml.return_value = DummyAuth()
+    appmod.app.state.args = _args(prewarm=0)
+
+    async with appmod.lifespan(appmod.app):
+        assert appmod.app.state.prewarm is None
+    assert not route.called
+
+
+@patch("ibproxy.main.uvicorn.run")
+@patch("ibproxy.main.argparse.ArgumentParser.parse_args")
+def test_http2_needs_h2(mock_parse_args, mock_uvicorn, caplog: pytest.LogCaptureFixture):
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        pass
+    else:
+        pytest.skip("h2 is installed.")
+
+    mock_parse_args.return_value = _args(http2=True)
+    caplog.set_level(logging.ERROR)
+
+    with pytest.raises(SystemExit):
+        appmod.main()
+    mock_uvicorn.assert_not_called()
+
+
+@pytest.fixture(autouse=True)
+def _clear_phases():
+    poolmod.clear()
+    yield
+    poolmod.clear()
+
+
+def _client(*responses: bytes) -> httpx.AsyncClient:
+    """
+    Client with a real connection pool on a mock network (so trace events are emitted).
+    """
+    client = httpx.AsyncClient()
+    client._transport._pool = httpcore.AsyncConnectionPool(network_backend=httpcore.AsyncMockBackend(list(responses)))
+    return client
+
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+
+
+@pytest.mark.asyncio
+async def test_trace_phases():
+    trace = Trace("/v1/api/test")
+    assert trace.connected is False
+
+    # Timestamps are the time when each event is first seen.
+    times = iter(range(1, 20))
+    with patch("ibproxy.pool.time.perf_counter", lambda: float(next(times))):
+        trace.start = 0.0
+        for event in [
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.send_request_body.started",
+            "http11.send_request_body.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+            "http11.receive_response_body.started",
+            "http11.receive_response_body.complete",
+            "http11.response_closed.started",
+        ]:
+            await trace(event, {})
+
+    assert trace.connected is True
+    phases = trace.close()
+    assert phases == {"pool": 1.0, "connect": 1.0, "tls": 1.0, "send": 3.0, "server": 2.0, "receive": 1.0}
+    # Closing again doesn't count the request twice.
+    assert trace.close() is phases
+
+    metrics = poolmod.phases()["/v1/api/test"]
+    assert metrics.requests == 1
+    assert metrics.connections == 1
+    assert metrics.send == 3.0
+
+
+def test_trace_without_events():
+    # Mock transports don't emit trace events.
+    phases = Trace("/v1/api/test").close()
+    assert phases == dict.fromkeys(PHASES, 0.0)
+    assert poolmod.phases()["/v1/api/test"].connections == 0
+
+
+def test_prune():
+    Trace("/v1/api/idle").close()
+    Trace("/v1/api/active").close()
+    poolmod._stats["/v1/api/idle"].last -= constmod.RATE_HISTORY + 1
+
+    poolmod.prune()
+    assert list(poolmod.phases()) == ["/v1/api/active"]
+
+
+@pytest.mark.asyncio
+async def test_trace_pool():
+    async with _client(RESPONSE, RESPONSE) as client:
+        for _ in range(2):
+            trace = Trace("/v1/api/test")
+            response = await client.get("http://api.test/v1/api/test", extensions={"trace": trace})
+            assert response.json() == {}
+            phases = trace.close()
+            assert all(duration >= 0.0 for duration in phases.values())
+
+        metrics = pool_metrics(client)
+        # The connection is reused.
+        assert (metrics.connections, metrics.active, metrics.idle) == (1, 0, 1)
+        assert metrics.endpoints["/v1/api/test"].requests == 2
+        assert metrics.endpoints["/v1/api/test"].connections == 1
+
+
+@pytest.mark.asyncio
+async def test_pool_metrics_waiting():
+    first = Trace("/v1/api/test")
+    await first("http11.send_request_headers.started", {})
+    second = Trace("/v1/api/test")
+
+    metrics = pool_metrics(None)
+    assert metrics.connections is None
+    assert (metrics.inflight, metrics.waiting) == (2, 1)
+
+    first.close()
+    second.close()
+    assert (pool_metrics(None).inflight, pool_metrics(None).waiting) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_close_idle():
+    async with _client(RESPONSE, RESPONSE) as client:
+        await client.get("http://api.test/v1/api/test")
+        assert pool_metrics(client).idle == 1
+
+        assert await close_idle(client) == 1
+        assert pool_metrics(client).connections == 0
+
+        # The next request opens a new connection.
+        trace = Trace("/v1/api/test")
+        await client.get("http://api.test/v1/api/test", extensions={"trace": trace})
+        trace.close()
+        assert trace.marks.keys() >= {"connect_tcp.started"}
+        assert pool_metrics(client).connections == 1
+
+    # Nothing to close without a connection pool.
+    assert await close_idle(None) == 0
+
+
+def test_pool_endpoint(client, monkeypatch):
+    Trace("/v1/api/test").close()
+    monkeypatch.setattr(appmod.app.state, "client", httpx.AsyncClient(), raising=False)
+
+    response = client.get("/pool")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["connections"], data["active"], data["idle"]) == (0, 0, 0)
+    assert data["endpoints"]["/v1/api/test"]["requests"] == 1
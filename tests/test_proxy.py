@@ -1,18 +1,26 @@
-import bz2
+import asyncio
+import gzip
 import json
 import logging
+from contextlib import AsyncExitStack
 from datetime import datetime, timezone
 from typing import Any, Dict
 from unittest.mock import AsyncMock, Mock, patch
 
 import httpx
 import pytest
+import respx
 from freezegun import freeze_time
 
 import ibproxy.const as constmod
 import ibproxy.main as appmod
 import ibproxy.rate as ratemod
+import ibproxy.rate.limit as limitmod
+from ibproxy.journal import iter_records
+from ibproxy.rate import AdaptiveLimit
+from ibproxy.rate.log import Series
 from ibproxy.system.status import STATUS_COLOURS
+from ibproxy.util import accepts
 
 
 class _MockAuth:
@@ -30,11 +38,11 @@ class _MockAuth:
 @pytest.fixture(autouse=True)
 def _clean_rate_and_auth(monkeypatch):
     # fresh rate state for each test
-    ratemod.times.clear()
+    ratemod.clear()
     # set a mock auth so routes can build the upstream URL/header
     monkeypatch.setattr(appmod.app.state, "auth", _MockAuth())
     yield
-    ratemod.times.clear()
+    ratemod.clear()
 
 
 # TODO: Can this be consolidated with mock_request() in conftest.py?
@@ -47,53 +55,32 @@ def _make_mock_httpx(
     capture: Dict[str, Any] | None = None,
 ):
     """
-    Patch httpx.AsyncClient.request to return a canned response and
+    Patch httpx.AsyncClient.send to return a canned response and
     optionally capture the forwarded request data.
     """
     if headers is None:
         headers = {
             "content-type": "application/json",
             "content-length": "999",  # bogus on purpose
-            "content-encoding": "gzip",  # bogus on purpose
         }
     if capture is None:
         capture = {}
     if not isinstance(body, bytes):
         body = body.encode("utf-8")
 
-    class MockResponse:
-        def __init__(self):
-            self.content = body
-            self.text = str(body, "utf-8")
-            self.status_code = status
-            self.request = Mock()
-            self.request.headers = headers
-            # Make response headers same as request headers.
-            self.headers = headers
-
-            self.is_error = not (200 <= self.status_code < 400)
-
-        def json(self) -> dict[str, Any]:
-            return json.loads(self.content.decode("utf-8"))
-
-        def raise_for_status(self) -> None:
-            if not (200 <= self.status_code < 400):
-                raise Exception(f"status {self.status_code}")
-
-    async def fake_request(self, *, method, url, content, headers, params, timeout=5):
+    async def fake_send(self, request, **kwargs):
         # stash what the proxy sent upstream
-        capture["method"] = method
-        capture["url"] = url
-        capture["content"] = content
-        capture["headers"] = headers
-        capture["params"] = params
-        capture["timeout"] = timeout
-        return MockResponse()
+        capture["method"] = request.method
+        capture["url"] = str(request.url.copy_with(query=None))
+        capture["content"] = request.content
+        capture["headers"] = dict(request.headers)
+        capture["params"] = dict(request.url.params)
+        return httpx.Response(status, headers=headers, content=body, request=request)
 
     # Patch just the bound method on AsyncClient
     monkeypatch.setattr(
-        "httpx.AsyncClient.request",
-        fake_request,
+        "httpx.AsyncClient.send",
+        fake_send,
         raising=True,
     )
     return capture
@@ -101,14 +88,12 @@ def _make_mock_httpx(
 
 @pytest.mark.asyncio
 @freeze_time("2025-08-22T12:34:56.789000Z")
-async def test_proxy_forwards_and_strips_headers(client, monkeypatch, tmp_path) -> None:
-    monkeypatch.setattr(appmod, "JOURNAL_DIR", tmp_path)
-
+async def test_proxy_forwards_and_strips_headers(client, journal, monkeypatch, tmp_path) -> None:
     # Patch rate.record() to avoid time dependence and to return the fixed datetime
     async def _record(_path: str) -> datetime:
         # Maintain minimal realistic rate state.
         now = datetime.now(tz=timezone.utc)
-        ratemod.times[_path].append(now.timestamp())
+        ratemod.series.setdefault(_path, Series()).add(now.timestamp())
         return now
 
     monkeypatch.setattr(ratemod, "record", _record)
@@ -121,16 +106,18 @@ async def test_proxy_forwards_and_strips_headers(client, monkeypatch, tmp_path)
 
     request_id = resp.headers.get("X-Request-ID")
 
-    assert "content-encoding" in resp.headers
-    assert "gzip" in resp.headers["content-encoding"]
+    # Bogus upstream content-length is replaced. The body is below the compression
+    # threshold so it isn't compressed.
+    assert "content-encoding" not in resp.headers
+    assert resp.headers["content-length"] == str(len(resp.content))
     assert resp.headers["content-type"].startswith("application/json")
 
     # Upstream call received expected forwarding bits
     assert captured["method"] == "GET"
     assert captured["url"].endswith("/v1/api/portfolio/DUH638336/summary")
-    # Host header must have been removed before forwarding
+    # Host header must have been removed before forwarding (httpx sets the upstream host).
     fwd_headers = {k.lower(): v for k, v in captured["headers"].items()}
-    assert "host" not in fwd_headers
+    assert fwd_headers["host"] == httpx.URL(captured["url"]).netloc.decode()
     # Our Authorization header injected
     assert fwd_headers.get("authorization") == "Bearer BEARER-TOKEN"
     # Proxy preserved custom header
@@ -138,19 +125,19 @@ async def test_proxy_forwards_and_strips_headers(client, monkeypatch, tmp_path)
     # Query params forwarded
     assert captured["params"] == {"x": "1"}
 
-    expected_file = tmp_path / "20250822" / f"20250822-123456-{request_id}.json.bz2"
+    await journal.stop()
+    expected_file = tmp_path / "20250822" / "20250822-123400-00.json.gz"
     assert expected_file.exists()
-    with bz2.open(expected_file, "rt", encoding="utf-8") as fh:
-        dump = json.load(fh)
+    ((_, dump),) = iter_records(expected_file)
+    assert dump["timestamp"] == "2025-08-22T12:34:56.789000+00:00"
+    assert dump["request"]["id"] == request_id
     assert dump["request"]["url"].endswith("/v1/api/portfolio/DUH638336/summary")
     assert dump["request"]["params"] == {"x": "1"}
     assert dump["response"]["data"] == {"ok": True}
     assert isinstance(dump["duration"], float)
 
 
-def test_proxy_handles_post_json_body(client, monkeypatch, tmp_path) -> None:
-    monkeypatch.setattr(appmod, "JOURNAL_DIR", tmp_path)
-
+def test_proxy_handles_post_json_body(client, journal, monkeypatch) -> None:
     captured = _make_mock_httpx(monkeypatch)
     payload = {"orders": [{"conid": 123, "side": "BUY"}]}
 
@@ -159,43 +146,93 @@ def test_proxy_handles_post_json_body(client, monkeypatch, tmp_path) -> None:
     # Upstream got the raw JSON bytes (content, not form-encoded)
     assert json.loads(captured["content"].decode("utf-8")) == payload
 
+    asyncio.run(journal.stop())
+    ((_, dump),) = iter_records(journal.segments.path)
+    assert dump["request"]["body"] == payload
+
+
+def test_proxy_journals_form_body(client, journal, monkeypatch) -> None:
+    _make_mock_httpx(monkeypatch)
+    limiter = appmod.app.state.limiter = AdaptiveLimit()
+
+    response = client.post("/v1/api/iserver/somepost", data={"a": "1", "b": "2"})
+    assert response.status_code == 200
+    assert limiter.inflight == 0
+
+    asyncio.run(journal.stop())
+    ((_, dump),) = iter_records(journal.segments.path)
+    assert dump["request"]["body"] == "a=1&b=2"
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_proxy_releases_limits_on_error(client, monkeypatch, stream) -> None:
+    # Fails after the upstream response has been received.
+    monkeypatch.setattr(appmod, "STREAM", stream)
+    monkeypatch.setattr(appmod, "accepts", Mock(side_effect=RuntimeError("boom")))
+    _make_mock_httpx(
+        monkeypatch,
+        body=gzip.compress(b'{"ok": true}'),
+        headers={"content-type": "application/json", "content-encoding": "gzip"},
+    )
+    limiter = appmod.app.state.limiter = AdaptiveLimit()
+    semaphore = limitmod.match("/v1/api/iserver/marketdata/history").semaphore
+    slots = semaphore._value
+
+    with pytest.raises(RuntimeError):
+        client.get("/v1/api/iserver/marketdata/history")
+
+    assert limiter.inflight == 0
+    assert semaphore._value == slots
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_closes_stack() -> None:
+    closed = []
+    stack = AsyncExitStack()
+    stack.callback(closed.append, True)
+
+    async def _body():
+        yield b"never started"
+
+    async def send(message):
+        raise RuntimeError("boom")
+
+    response = appmod._UpstreamStreamingResponse(_body(), stack=stack)
+    with pytest.raises(RuntimeError):
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, AsyncMock(), send)
+    assert closed == [True]
+
 
 @pytest.mark.asyncio
 async def test_rate_module_sliding_window(monkeypatch) -> None:
     # Control time to make the math deterministic
     t0 = 1_000_000.0
-    times = [t0, t0 + 1, t0 + 2, t0 + 7]  # last one falls outside default WINDOW for earlier entries
-
-    i = {"i": 0}
-
-    def fake_time():
-        v = times[i["i"]]
-        i["i"] += 1
-        return v
+    clock = {"now": t0}
 
     monkeypatch.setattr(ratemod, "WINDOW", 5)
-    monkeypatch.setattr("time.time", fake_time)
+    monkeypatch.setattr("time.time", lambda: clock["now"])
 
     path = "/test"
-    ratemod.times.clear()
-    await ratemod.record(path)  # t0
-    await ratemod.record(path)  # t0+1
-    await ratemod.record(path)  # t0+2
-    # Now jump ahead by 5 seconds; previous earliest should be pruned
-    await ratemod.record(path)  # t0+7
+    ratemod.clear()
+    for offset in [0, 1, 2, 7]:  # last one falls outside WINDOW for earlier entries
+        clock["now"] = t0 + offset
+        await ratemod.record(path)
 
     rps, period = await ratemod.rate(path)
     # we only have the last two timestamps in the window: [t0+2, t0+7] -> n=2, elapsed=5 => rps=0.4
     assert rps is not None and abs(rps - 0.4) < 1e-6
     assert period is not None and abs(period - 2.5) < 1e-6
+    assert ratemod.count(path) == 2
+    # Global rate is tracked separately.
+    assert await ratemod.rate() == (rps, period)
 
 
 def test_proxy_handles_request_error(client, monkeypatch) -> None:
-    # Patch AsyncClient.request to raise a RequestError
+    # Patch AsyncClient.send to raise a RequestError
     async def raise_request_error(*args, **kwargs):
         raise httpx.RequestError("boom")
 
-    monkeypatch.setattr("ibproxy.main.httpx.AsyncClient.request", raise_request_error)
+    monkeypatch.setattr("ibproxy.main.httpx.AsyncClient.send", raise_request_error)
 
     resp = client.get("/test")
 
@@ -214,7 +251,18 @@ async def test_main_runs_with_auth_and_uvicorn(
     mock_get_status.return_value = STATUS_COLOURS["#66cc33"]
 
     # Pretend --debug not passed.
-    mock_parse_args.return_value = Mock(debug=False, port=constmod.API_PORT, config="config.yaml")
+    mock_parse_args.return_value = Mock(
+        debug=False,
+        port=constmod.API_PORT,
+        config="config.yaml",
+        stream=False,
+        upstream=None,
+        routes=None,
+        mock_auth=False,
+        journal_overflow="block",
+        http2=False,
+        prewarm=0,
+    )
 
     # Fake auth object with methods.
     auth = AsyncMock()
@@ -244,18 +292,16 @@ async def test_main_runs_with_auth_and_uvicorn(
 @pytest.mark.asyncio
 @freeze_time("2025-08-29T15:00:10.000000Z")
 async def test_upstream_500_results_in_502_and_logs(
-    monkeypatch, client, caplog: pytest.LogCaptureFixture, tmp_path
+    monkeypatch, client, journal, caplog: pytest.LogCaptureFixture, tmp_path
 ) -> None:
     # Capture all logging at DEBUG level and above.
     caplog.set_level(logging.DEBUG)
 
-    monkeypatch.setattr(appmod, "JOURNAL_DIR", tmp_path)
-
     # TODO: This is repeated from another test. Factor into separate function or fixture.
     async def _record(_path: str) -> datetime:
         # Maintain minimal realistic rate state.
         now = datetime.now(tz=timezone.utc)
-        ratemod.times[_path].append(now.timestamp())
+        ratemod.series.setdefault(_path, Series()).add(now.timestamp())
         return now
 
     monkeypatch.setattr(ratemod, "record", _record)
@@ -276,10 +322,143 @@ async def test_upstream_500_results_in_502_and_logs(
 
     assert any("Upstream API error 503" in rec.message for rec in caplog.records)
 
-    expected_file = tmp_path / "20250829" / f"20250829-150010-{request_id}.json.bz2"
+    await journal.stop()
+    expected_file = tmp_path / "20250829" / "20250829-150000-00.json.gz"
     assert expected_file.exists()
-    with bz2.open(expected_file, "rt", encoding="utf-8") as fh:
-        dump = json.load(fh)
+    ((_, dump),) = iter_records(expected_file)
+    assert dump["request"]["id"] == request_id
+    assert dump["response"]["status_code"] == 503
     assert dump["request"]["url"].endswith("/v1/api/portfolio/DUH638336/summary")
     assert json.dumps(dump["response"]["data"]) == ERROR_BODY
     assert isinstance(dump["duration"], float)
+
+
+@respx.mock
+def test_proxy_streams_response(client, journal, monkeypatch) -> None:
+    monkeypatch.setattr(appmod, "STREAM", True)
+
+    positions = [{"conid": conid, "position": 100} for conid in range(1000)]
+    respx.get("https://localhost:5000/v1/api/portfolio/DUH638336/positions/0").mock(
+        return_value=httpx.Response(200, json=positions, headers={"x-upstream": "ibkr"})
+    )
+
+    resp = client.get("/v1/api/portfolio/DUH638336/positions/0")
+
+    assert resp.status_code == 200
+    assert resp.json() == positions
+    assert resp.headers["content-type"].startswith("application/json")
+    assert resp.headers["x-upstream"] == "ibkr"
+
+    request_id = resp.headers.get("X-Request-ID")
+    asyncio.run(journal.stop())
+    ((_, dump),) = iter_records(journal.segments.path)
+    assert dump["request"]["id"] == request_id
+    assert dump["response"]["status_code"] == 200
+    assert dump["response"]["data"] == positions
+
+
+@respx.mock
+def test_proxy_stream_upstream_error_results_in_502(client, monkeypatch) -> None:
+    monkeypatch.setattr(appmod, "STREAM", True)
+
+    ERROR_BODY = '{"error": "Service Unavailable", "statusCode": 503}'
+    respx.get("https://localhost:5000/v1/api/portfolio/DUH638336/summary").mock(
+        return_value=httpx.Response(503, text=ERROR_BODY, headers={"content-type": "application/json"})
+    )
+
+    resp = client.get("/v1/api/portfolio/DUH638336/summary")
+
+    assert resp.status_code == 502
+    assert resp.json() == {
+        "error": "Upstream service error.",
+        "upstream_status": 503,
+        "detail": ERROR_BODY,
+    }
+
+
+@respx.mock
+def test_proxy_uses_upstream_override(client, monkeypatch) -> None:
+    monkeypatch.setattr(appmod, "UPSTREAM", "http://127.0.0.1:9001/")
+
+    route = respx.get("http://127.0.0.1:9001/v1/api/iserver/accounts").mock(
+        return_value=httpx.Response(200, json={"accounts": []})
+    )
+
+    resp = client.get("/v1/api/iserver/accounts")
+
+    assert resp.status_code == 200
+    assert route.called
+
+
+POSITIONS = [{"conid": conid, "position": 100} for conid in range(1000)]
+POSITIONS_GZIP = gzip.compress(json.dumps(POSITIONS).encode())
+
+
+def _mock_gzip_upstream() -> None:
+    respx.get("https://localhost:5000/v1/api/portfolio/DUH638336/positions/0").mock(
+        return_value=httpx.Response(
+            200,
+            content=POSITIONS_GZIP,
+            headers={"content-type": "application/json", "content-encoding": "gzip"},
+        )
+    )
+
+
+@respx.mock
+@pytest.mark.parametrize("stream", [False, True])
+def test_proxy_passes_through_compressed_response(client, journal, monkeypatch, stream) -> None:
+    monkeypatch.setattr(appmod, "STREAM", stream)
+    _mock_gzip_upstream()
+
+    with client.stream("GET", "/v1/api/portfolio/DUH638336/positions/0") as resp:
+        raw = b"".join(resp.iter_raw())
+
+    assert resp.status_code == 200
+    # Upstream bytes are forwarded unchanged (not decoded and compressed again).
+    assert resp.headers["content-encoding"] == "gzip"
+    assert raw == POSITIONS_GZIP
+    assert resp.headers["content-length"] == str(len(POSITIONS_GZIP))
+
+    # The journal holds the encoded body and decodes it when read.
+    asyncio.run(journal.stop())
+    ((_, dump),) = iter_records(journal.segments.path)
+    assert dump["response"]["content_encoding"] == "gzip"
+    assert dump["response"]["size"] == len(POSITIONS_GZIP)
+    assert dump["response"]["data"] == POSITIONS
+
+
+@respx.mock
+@pytest.mark.parametrize("stream", [False, True])
+def test_proxy_decodes_response_if_encoding_not_accepted(client, journal, monkeypatch, stream) -> None:
+    monkeypatch.setattr(appmod, "STREAM", stream)
+    _mock_gzip_upstream()
+
+    resp = client.get("/v1/api/portfolio/DUH638336/positions/0", headers={"Accept-Encoding": "br"})
+
+    assert resp.status_code == 200
+    assert "content-encoding" not in resp.headers
+    assert resp.json() == POSITIONS
+
+    asyncio.run(journal.stop())
+    ((_, dump),) = iter_records(journal.segments.path)
+    assert dump["response"]["content_encoding"] is None
+    assert dump["response"]["data"] == POSITIONS
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, encoding, expected",
+    [
+        ("gzip, deflate", "gzip", True),
+        ("GZIP", "gzip", True),
+        ("deflate", "gzip", False),
+        ("gzip;q=0, deflate", "gzip", False),
+        ("*", "br", True),
+        ("*;q=0", "br", False),
+        ("gzip;q=0, *", "gzip", False),
+        ("br;q=0.5", "br", True),
+        ("", "gzip", False),
+        (None, "gzip", False),
+    ],
+)
+def test_accepts(accept_encoding, encoding, expected) -> None:
+    assert accepts(accept_encoding, encoding) is expected
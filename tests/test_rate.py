@@ -1,16 +1,28 @@
-from collections import deque
-
 import pytest
 
 import ibproxy.rate as ratemod
+from ibproxy.rate.log import Series, prune
 
 
 @pytest.fixture(autouse=True)
 def _clear_times():
     # Ensure a clean state for each test
-    ratemod.times.clear()
+    ratemod.clear()
     yield
-    ratemod.times.clear()
+    ratemod.clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = {"now": 1_000_000.0}
+    monkeypatch.setattr("time.time", lambda: clock["now"])
+    return clock
+
+
+async def _record(clock, endpoint, *times):
+    for now in times:
+        clock["now"] = now
+        await ratemod.record(endpoint)
 
 
 def test_latest_when_no_requests_returns_none():
@@ -20,29 +32,71 @@ def test_latest_when_no_requests_returns_none():
     assert ratemod.latest("/no-such-endpoint") is None
 
 
-def test_latest_for_endpoint_returns_last_timestamp():
+@pytest.mark.asyncio
+async def test_latest_for_endpoint_returns_last_timestamp(clock):
     # populate a single endpoint with a few timestamps
-    ratemod.times["/a"] = deque([1.0, 2.5, 3.2])
+    await _record(clock, "/a", 1.0, 2.5, 3.2)
     assert ratemod.latest("/a") == 3.2
 
     # endpoint with single value
-    ratemod.times["/b"] = deque([10.0])
+    await _record(clock, "/b", 10.0)
     assert ratemod.latest("/b") == 10.0
 
 
-def test_latest_overall_returns_max_of_endpoint_tails():
+@pytest.mark.asyncio
+async def test_latest_overall_returns_max_of_endpoint_tails(clock):
     # multiple endpoints with different last timestamps
-    ratemod.times["/a"] = deque([1.0, 2.0])
-    ratemod.times["/b"] = deque([5.5])
-    ratemod.times["/c"] = deque([3.3, 4.4, 4.9])
+    await _record(clock, "/a", 1.0, 2.0)
+    await _record(clock, "/c", 3.3, 4.4, 4.9)
+    await _record(clock, "/b", 5.5)
 
     # overall latest should be the maximum of the last entries: max(2.0, 5.5, 4.9) == 5.5
     assert ratemod.latest() == 5.5
 
 
-def test_latest_ignores_empty_deques_in_overall():
-    # Create some endpoints; one is empty
-    ratemod.times["/a"] = deque([1.0, 2.0])
-    ratemod.times["empty"] = deque()  # explicitly empty
-    # overall should still return 2.0 and not fail due to the empty deque
-    assert ratemod.latest() == 2.0
+@pytest.mark.asyncio
+async def test_count_and_window(clock):
+    await _record(clock, "/a", *[100.0 + i / 10 for i in range(50)])
+    await _record(clock, "/b", 105.0)
+
+    assert ratemod.count("/a") == 50
+    assert ratemod.count() == 51
+    assert ratemod.count("/a", window=1) == 10
+
+    # Requests drop out of the window as time passes.
+    clock["now"] = 140.0
+    assert ratemod.count() == 0
+    assert await ratemod.rate() == (None, None)
+
+
+@pytest.mark.asyncio
+async def test_ewma(clock):
+    assert ratemod.ewma() == 0.0
+    # Steady 10 requests per second.
+    await _record(clock, "/a", *[100.0 + i / 10 for i in range(3000)])
+    assert ratemod.ewma("/a") == pytest.approx(10, rel=0.01)
+    # Decays when requests stop.
+    clock["now"] += 30
+    assert ratemod.ewma() == pytest.approx(10 / 2.718, rel=0.01)
+
+
+def test_series_memory_is_bounded():
+    series = Series()
+    for i in range(100_000):
+        series.add(i / 100)
+    assert len(series.counts) == Series.size
+    # Window is limited to the history.
+    count, first, last = series.window(1e6, 1000.0)
+    assert count <= 100 * Series.size
+    assert last == pytest.approx(999.99)
+
+
+@pytest.mark.asyncio
+async def test_prune_idle_endpoints(clock):
+    await _record(clock, "/a", 100.0)
+    await _record(clock, "/b", 200.0)
+
+    await prune(250.0)
+    assert set(ratemod.series) == {"/b"}
+    # Global state isn't affected.
+    assert ratemod.latest() == 200.0
@@ -0,0 +1,160 @@
+import asyncio
+import json
+from datetime import UTC, datetime, timedelta
+
+import httpx
+import pytest
+import respx
+from fastapi.testclient import TestClient
+
+from ibproxy.journal import JournalEntry, JournalWriter
+from ibproxy.replay import Call, load, send, upstream
+
+START = datetime(2025, 8, 22, 12, 0, 0, tzinfo=UTC)
+
+RECORDS = [
+    # (offset, method, path, params, status, body)
+    (0.0, "GET", "/v1/api/iserver/accounts", {}, 200, {"accounts": ["U123"]}),
+    (0.1, "GET", "/v1/api/trsrv/stocks", {"symbols": "AAPL"}, 200, {"AAPL": [{"conid": 265598}]}),
+    (0.2, "GET", "/v1/api/trsrv/stocks", {"symbols": "MSFT"}, 200, {"MSFT": [{"conid": 272093}]}),
+    (0.3, "POST", "/v1/api/iserver/account/U123/orders", {}, 500, {"error": "boom"}),
+]
+
+
+@pytest.fixture
+def journal(tmp_path):
+    async def _write():
+        writer = JournalWriter(tmp_path, index=False)
+        for i, (offset, method, path, params, status, body) in enumerate(RECORDS):
+            entry = JournalEntry(
+                {
+                    "id": f"id{i}",
+                    "url": f"https://api.ibkr.com{path}",
+                    "method": method,
+                    "params": params,
+                    "body": {"orders": []} if method == "POST" else None,
+                },
+                status_code=status,
+                content_type="application/json",
+                timestamp=START + timedelta(seconds=offset),
+            )
+            entry.write(json.dumps(body).encode())
+            entry.close(0.05)
+            await writer.submit(entry)
+        await writer.stop()
+
+    asyncio.run(_write())
+    return tmp_path
+
+
+def test_load(journal):
+    calls = load(journal)
+
+    assert [call.path for call in calls] == [record[2] for record in RECORDS]
+    assert calls[1].params == {"symbols": "AAPL"}
+    assert calls[3].body == {"orders": []}
+    assert calls[3].timestamp - calls[0].timestamp == pytest.approx(0.3)
+    assert calls[0].data == {"accounts": ["U123"]}
+
+    assert [call.path for call in load(journal, path="*/trsrv/*")] == ["/v1/api/trsrv/stocks"] * 2
+    assert len(load(journal, limit=1)) == 1
+    assert load(journal, data=False)[0].data is None
+
+
+def test_upstream_serves_recorded_responses(journal):
+    client = TestClient(upstream(load(journal)))
+
+    response = client.get("/v1/api/trsrv/stocks", params={"symbols": "MSFT"})
+    assert response.status_code == 200
+    assert response.json() == {"MSFT": [{"conid": 272093}]}
+
+    response = client.post("/v1/api/iserver/account/U123/orders", json={"orders": []})
+    assert response.status_code == 500
+    assert response.json() == {"error": "boom"}
+
+    # Unknown parameters fall back to responses for the same path (in rotation).
+    assert client.get("/v1/api/trsrv/stocks", params={"symbols": "GOOG"}).json() == {"AAPL": [{"conid": 265598}]}
+    assert client.get("/v1/api/trsrv/stocks", params={"symbols": "GOOG"}).json() == {"MSFT": [{"conid": 272093}]}
+
+    assert client.get("/v1/api/unknown").status_code == 404
+
+
+def _calls(n: int, interval: float) -> list[Call]:
+    return [
+        Call(
+            timestamp=i * interval,
+            method="GET",
+            path="/v1/api/iserver/accounts",
+            params={},
+            body=None,
+            status_code=200,
+            content_type="application/json",
+            data=None,
+            duration=0.0,
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_send_with_timing():
+    route = respx.get("http://proxy.test/v1/api/iserver/accounts").mock(return_value=httpx.Response(200, json=[]))
+
+    # Ten calls spread over 0.9 s, replayed 10 times faster.
+    result = await send(_calls(10, 0.1), "http://proxy.test", speed=10)
+
+    assert route.call_count == 10
+    summary = result.summary()
+    assert summary["requests"] == 10
+    assert summary["status"] == {"200": 10}
+    assert 0.09 <= summary["elapsed"] < 0.5
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_send_replays_bodies(tmp_path):
+    writer = JournalWriter(tmp_path, index=False)
+    for i, (body, content_type) in enumerate([("a=1&b=2", "application/x-www-form-urlencoded"), ({"a": 1}, None)]):
+        entry = JournalEntry(
+            {
+                "id": f"id{i}",
+                "url": "https://api.ibkr.com/v1/api/iserver/form",
+                "method": "POST",
+                "headers": {"content-type": content_type} if content_type else {},
+                "params": {},
+                "body": body,
+            },
+            status_code=200,
+            content_type="application/json",
+            timestamp=START + timedelta(seconds=i),
+        )
+        entry.close(0.05)
+        await writer.submit(entry)
+    await writer.stop()
+    route = respx.post("http://proxy.test/v1/api/iserver/form").mock(return_value=httpx.Response(200, json={}))
+
+    await send(load(tmp_path), "http://proxy.test", concurrency=1)
+
+    form, parsed = [call.request for call in route.calls]
+    # Text bodies are sent as they were recorded, with the recorded content type.
+    assert form.content == b"a=1&b=2"
+    assert form.headers["content-type"] == "application/x-www-form-urlencoded"
+    assert json.loads(parsed.content) == {"a": 1}
+    assert parsed.headers["content-type"] == "application/json"
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_send_with_concurrency():
+    respx.get("http://proxy.test/v1/api/iserver/accounts").mock(
+        side_effect=[httpx.Response(200, json=[])] * 9 + [httpx.Response(502, json={})]
+    )
+
+    # Recorded timing is ignored.
+    result = await send(_calls(10, 60), "http://proxy.test", concurrency=3)
+
+    summary = result.summary()
+    assert summary["status"] == {"200": 9, "502": 1}
+    assert summary["elapsed"] < 1
+    assert summary["latency"]["p50"] <= summary["latency"]["p99"] <= summary["latency"]["max"]
@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from ibproxy.middleware.request_id import ALPHABET, RequestIdMiddleware, request_id
+
+
+def test_request_ids_are_sortable_and_unique():
+    ids = [request_id() for _ in range(10_000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    assert all(len(id) == 13 and set(id) <= set(ALPHABET) for id in ids)
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestIdMiddleware)
+
+    @app.get("/id")
+    async def get_id(request: Request) -> dict[str, str]:
+        return {"id": request.state.request_id}
+
+    @app.get("/stream")
+    async def stream() -> StreamingResponse:
+        async def chunks():
+            for i in range(3):
+                yield f"{i}".encode()
+
+        return StreamingResponse(chunks())
+
+    return app
+
+
+def test_header_matches_request_state():
+    client = TestClient(_app())
+    response = client.get("/id")
+    assert response.headers["X-Request-ID"] == response.json()["id"]
+    assert client.get("/id").headers["X-Request-ID"] > response.headers["X-Request-ID"]
+
+
+def test_streaming_passthrough():
+    messages = []
+
+    async def _run():
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": "/stream",
+            "raw_path": b"/stream",
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+        }
+
+        async def receive():
+            await asyncio.sleep(1)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        await _app()(scope, receive, send)
+
+    asyncio.run(_run())
+    # Chunks are sent as they are produced rather than being buffered.
+    assert [message["type"] for message in messages] == ["http.response.start"] + ["http.response.body"] * 4
+    assert (b"x-request-id", messages[0]["headers"][-1][1]) == messages[0]["headers"][-1]
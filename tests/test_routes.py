@@ -0,0 +1,59 @@
+import pytest
+
+import ibproxy.routes as routesmod
+from ibproxy.routes import Routes, template
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/v1/api/iserver/contract/265598/info", "/v1/api/iserver/contract/{conid}/info"),
+        ("/v1/api/portfolio/U123456/positions/0", "/v1/api/portfolio/{accountId}/positions/{pageId}"),
+        ("/v1/api/iserver/account/DU123456/orders", "/v1/api/iserver/account/{accountId}/orders"),
+        ("/v1/api/iserver/account/U1/order/987", "/v1/api/iserver/account/{accountId}/order/{orderId}"),
+        # Literal segments take precedence over parameters.
+        ("/v1/api/iserver/account/orders", "/v1/api/iserver/account/orders"),
+        ("/v1/api/iserver/account/order/status/42", "/v1/api/iserver/account/order/status/{orderId}"),
+        # Unknown paths have identifiers replaced.
+        ("/v1/api/unknown/12345/thing", "/v1/api/unknown/{id}/thing"),
+        ("/v1/api/unknown/U1234567", "/v1/api/unknown/{accountId}"),
+        ("/v1/api/iserver/accounts", "/v1/api/iserver/accounts"),
+        ("v1/api/iserver/contract/1/info", "/v1/api/iserver/contract/{conid}/info"),
+    ],
+)
+def test_template(path, expected):
+    assert template(path) == expected
+
+
+def test_backtrack():
+    routes = Routes(["/a/{x}/c", "/a/b/d"])
+    # Literal "b" doesn't lead to a match so the parameter is tried.
+    assert routes.template("/a/b/c") == "/a/{x}/c"
+    assert routes.template("/a/b/d") == "/a/b/d"
+
+
+def test_load_routes(tmp_path, monkeypatch):
+    monkeypatch.setattr(routesmod, "_routes", Routes())
+    path = tmp_path / "routes.yaml"
+    path.write_text("- /v1/api/custom/{name}/data\n")
+
+    assert template("/v1/api/custom/foo/data") == "/v1/api/custom/foo/data"
+    routesmod.load_routes(path)
+    assert template("/v1/api/custom/foo/data") == "/v1/api/custom/{name}/data"
+
+
+@pytest.mark.asyncio
+async def test_rate_keys_use_templates(client, monkeypatch):
+    import respx
+
+    import ibproxy.rate as ratemod
+
+    ratemod.clear()
+    with respx.mock() as mock:
+        mock.get(url__regex=r"https://api.test/v1/api/iserver/contract/\d+/info").respond(200, json={})
+        for conid in [265598, 8314, 76792991]:
+            assert client.get(f"/v1/api/iserver/contract/{conid}/info").status_code == 200
+
+    assert list(ratemod.series) == ["/v1/api/iserver/contract/{conid}/info"]
+    assert ratemod.count("/v1/api/iserver/contract/{conid}/info") == 3
+    ratemod.clear()
@@ -0,0 +1,23 @@
+import asyncio
+
+import ibproxy.main as appmod
+
+
+def test_journal_endpoint(client, journal):
+    response = client.get("/journal")
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["overflow"] == "block"
+    assert data["queued"] == 0
+    assert data["written"] == 0
+
+    asyncio.run(journal.stop())
+
+
+def test_journal_endpoint_disabled(client, monkeypatch):
+    monkeypatch.setattr(appmod.app.state, "journal", None)
+
+    response = client.get("/journal")
+
+    assert response.status_code == 404
@@ -119,3 +119,28 @@ def test_reset_endpoint_uses_correct_config(client, monkeypatch):
     assert response.status_code == 200
     # Auth should not be recreated; still the same object
     assert main.app.state.auth is prev_auth
+
+
+def test_reset_endpoint_prewarms_connections(client, monkeypatch):
+    """Test the /reset endpoint opens upstream connections before requests resume."""
+    from ibproxy import main
+    from ibproxy.system import reset as reset_module
+
+    main.app.state.auth = AsyncMock()
+    main.app.state.auth.status = AsyncMock(return_value=SimpleNamespace(connected=False))
+    main.app.state.prewarm = AsyncMock(side_effect=lambda: gate.append(main.app.state.gate.is_set()))
+    close_idle = AsyncMock(side_effect=lambda client: main.app.state.prewarm.assert_not_awaited())
+    monkeypatch.setattr("ibproxy.system.reset.close_idle", close_idle)
+    gate = []
+
+    dummy_status = SystemStatus(label="Normal Operations", colour="🟩")
+    monkeypatch.setattr(reset_module, "get_system_status", AsyncMock(return_value=dummy_status))
+
+    response = client.post("/reset")
+
+    assert response.status_code == 200
+    main.app.state.prewarm.assert_awaited_once()
+    # Idle connections are closed first, so that fresh connections are opened.
+    close_idle.assert_awaited_once_with(main.app.state.client)
+    # Requests were still blocked.
+    assert gate == [False]
@@ -9,6 +9,7 @@ import pytest
 import ibproxy.const as constmod
 import ibproxy.main as appmod
 import ibproxy.tickle as ticklemod
+from ibproxy.mock import MockAuth
 
 from .conftest import DummyAuth, DummyAuthFlaky
 
@@ -71,6 +72,22 @@ async def test_tickle_loop_calls_auth(monkeypatch, mock_system_metrics):
     assert auth.calls >= 2
 
 
+@pytest.mark.asyncio
+async def test_tickle_loop_mock_auth_skips_status(monkeypatch, mock_system_metrics):
+    status = AsyncMock()
+    monkeypatch.setattr(ticklemod, "get_system_status", status)
+
+    app = make_mock_app(MockAuth(), "always", 0.01)
+
+    task = asyncio.create_task(appmod.tickle_loop(app))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    status.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_tickle_loop_logs_error(monkeypatch, caplog, mock_system_metrics):
     monkeypatch.setattr(ticklemod, "TICKLE_MIN_SLEEP", 0.001)
@@ -96,7 +113,15 @@ async def test_tickle_loop_logs_error(monkeypatch, caplog, mock_system_metrics):
 @patch("ibproxy.main.argparse.ArgumentParser.parse_args")
 async def test_lifespan_starts_and_cancels(mock_parse_args, mock_auth_from_yaml, monkeypatch):
     mock_parse_args.return_value = Mock(
-        debug=False, port=constmod.API_PORT, config="config.yaml", tickle_interval=0.01, tickle_mode="always"
+        debug=False,
+        port=constmod.API_PORT,
+        config="config.yaml",
+        mock_auth=False,
+        journal_overflow="block",
+        http2=False,
+        prewarm=0,
+        tickle_interval=0.01,
+        tickle_mode="always",
     )
     appmod.app.state.args = mock_parse_args.return_value
 
@@ -127,7 +152,15 @@ async def test_lifespan_tickle_exception(
 
     # Pretend --debug not passed.
     mock_parse_args.return_value = Mock(
-        debug=False, port=constmod.API_PORT, config="config.yaml", tickle_mode="always", tickle_interval=0.01
+        debug=False,
+        port=constmod.API_PORT,
+        config="config.yaml",
+        mock_auth=False,
+        journal_overflow="block",
+        http2=False,
+        prewarm=0,
+        tickle_mode="always",
+        tickle_interval=0.01,
     )
     appmod.app.state.args = mock_parse_args.return_value
 